@@ -0,0 +1,17 @@
+"""
+Benchmarks for the NumPy board analytics.
+"""
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from terminal_mines.game_logic.analytics import BoardAnalysis, random_boards
+
+from boards import SIZES
+
+
+@pytest.mark.parametrize("size", ["easy", "expert"])
+def test_analyze_batch(benchmark, size):
+    mines = random_boards(10000, *SIZES[size], numpy.random.default_rng(0))
+    benchmark(BoardAnalysis, mines)
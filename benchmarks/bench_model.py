@@ -0,0 +1,71 @@
+"""
+Benchmarks for the Minefield hot paths.
+"""
+
+from random import Random
+
+import pytest
+
+from terminal_mines.game_logic.chunked import ChunkedMinefield
+from terminal_mines.game_logic.game_model import CellState, random_minefield
+from terminal_mines.game_logic.solver import FrontierEngine, play_moves
+
+from boards import SIZES, find_opening
+from conftest import cached_mid_game_minefield
+
+
+@pytest.mark.parametrize("size", sorted(SIZES))
+def test_construction(benchmark, size):
+    benchmark(random_minefield, *SIZES[size], seed=0)
+
+
+@pytest.mark.parametrize("size", sorted(SIZES))
+def test_reveal_cascade(benchmark, size):
+    num_mines, width, height = SIZES[size]
+
+    def setup():
+        # A sparse board so that one reveal cascades across most of it
+        minefield = random_minefield(num_mines // 10, width, height, seed=0)
+        return (minefield,) + find_opening(minefield, Random(0)), {}
+
+    benchmark.pedantic(lambda minefield, x, y: minefield.reveal_cell(x, y), setup=setup, rounds=5)
+
+
+@pytest.mark.parametrize("size", sorted(SIZES))
+def test_flag_every_mine(benchmark, size):
+    def setup():
+        minefield = random_minefield(*SIZES[size], seed=0)
+        mines = [(x, y) for x, y, cell in minefield.cords_and_cells if cell.is_mine]
+        return (minefield, mines), {}
+
+    def flag_all(minefield, mines):
+        # Each flag runs the win check and the last one wins the game
+        for x, y in mines:
+            minefield.flag_cell(x, y)
+
+    benchmark.pedantic(flag_all, setup=setup, rounds=5)
+
+
+def test_chunked_stress(benchmark):
+    def setup():
+        # A board of 10^12 cells; only the chunks the solver reaches are ever built
+        return (ChunkedMinefield(1000000, 1000000, 0.18, seed=0, max_chunks=64),), {}
+
+    def play(minefield):
+        for _, (move, changed) in zip(range(2000), play_moves(minefield, FrontierEngine(minefield, Random(0)))):
+            pass
+
+    benchmark.pedantic(play, setup=setup, rounds=3)
+
+
+@pytest.mark.parametrize("size", sorted(SIZES))
+def test_fork_and_reveal(benchmark, size):
+    minefield = cached_mid_game_minefield(size)
+    x, y = next((x, y) for x, y, cell in minefield.cords_and_cells
+                if cell.state == CellState.UNKNOWN and not cell.is_mine)
+
+    def explore():
+        # Try a move on a copy-on-write fork, as a lookahead search would; the cached board is left untouched
+        return minefield.fork().reveal_cell(x, y)
+
+    benchmark(explore)
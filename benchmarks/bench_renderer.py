@@ -0,0 +1,33 @@
+"""
+Benchmarks for the renderers. Output is sent to the null device.
+"""
+
+import pytest
+
+from terminal_mines.game_logic.renderer import render, DifferentialRenderer
+
+from boards import SIZES
+from conftest import cached_mid_game_minefield
+
+
+def move_and_render(render_func, minefield):
+    """
+    Moves the cursor one cell to the right and draws the frame, like a player holding an arrow key.
+    """
+    minefield.x = (minefield.x + 1) % minefield.width
+    render_func(minefield, [])
+
+
+@pytest.mark.parametrize("size", sorted(SIZES))
+def test_full_render(benchmark, null_stdout, size):
+    minefield = cached_mid_game_minefield(size)
+    benchmark(move_and_render, render, minefield)
+
+
+@pytest.mark.parametrize("size", sorted(SIZES))
+def test_differential_render(benchmark, null_stdout, size):
+    minefield = cached_mid_game_minefield(size)
+    differential_renderer = DifferentialRenderer()
+    differential_renderer(minefield)
+
+    benchmark(move_and_render, differential_renderer, minefield)
@@ -0,0 +1,66 @@
+"""
+Benchmarks for the solver engines.
+"""
+
+from random import Random
+
+import pytest
+
+from terminal_mines.game_logic.game_model import random_minefield
+from terminal_mines.game_logic.hints import compute_hints
+from terminal_mines.game_logic.no_guess import no_guess_minefield
+from terminal_mines.game_logic.probability import mine_probabilities
+from terminal_mines.game_logic.solver import ENGINES, FrontierEngine, pick_move, solve_headless
+
+from boards import SIZES
+from conftest import cached_mid_game_minefield
+
+# The scan engine takes seconds per move on a 1000x1000 board so the solver benchmarks stop short of it
+SOLVER_SIZES = ["easy", "expert", "200x200"]
+
+
+@pytest.mark.parametrize("size", SOLVER_SIZES)
+def test_pick_move(benchmark, size):
+    minefield = cached_mid_game_minefield(size)
+    benchmark(pick_move, minefield, Random(0))
+
+
+@pytest.mark.parametrize("patterns", [True, False], ids=["patterns", "no-patterns"])
+@pytest.mark.parametrize("size", SOLVER_SIZES)
+def test_frontier_next_moves(benchmark, size, patterns):
+    minefield = cached_mid_game_minefield(size)
+    benchmark(lambda: FrontierEngine(minefield, Random(0), patterns).next_moves())
+
+
+@pytest.mark.parametrize("size", SOLVER_SIZES)
+def test_mine_probabilities(benchmark, size):
+    minefield = cached_mid_game_minefield(size)
+    benchmark(mine_probabilities, minefield, Random(0))
+
+
+@pytest.mark.parametrize("size", SOLVER_SIZES)
+def test_compute_hints(benchmark, size):
+    minefield = cached_mid_game_minefield(size)
+    benchmark(compute_hints, minefield.width, minefield.height, minefield.state_codes(), minefield.num_mines, 0)
+
+
+@pytest.mark.parametrize("engine", sorted(ENGINES))
+@pytest.mark.parametrize("size", ["easy", "expert"])
+def test_solve_headless(benchmark, engine, size):
+    seeds = iter(range(10 ** 6))
+
+    def setup():
+        seed = next(seeds)
+        return (random_minefield(*SIZES[size], seed=seed), engine, Random(seed)), {}
+
+    benchmark.pedantic(solve_headless, setup=setup, rounds=20)
+
+
+@pytest.mark.parametrize("size", ["easy", "expert"])
+def test_no_guess_generation(benchmark, size):
+    seeds = iter(range(10 ** 6))
+
+    def setup():
+        return SIZES[size], {"rng": Random(next(seeds))}
+
+    benchmark.pedantic(no_guess_minefield, setup=setup, rounds=10)
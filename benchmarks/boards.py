@@ -0,0 +1,45 @@
+"""
+Shared board fixtures for the benchmarks. Every board is built from a fixed seed so runs can be compared.
+"""
+
+from random import Random
+
+from terminal_mines.game_logic.game_model import random_minefield
+
+# Board sizes as (number of mines, width, height)
+SIZES = {
+    "easy": (10, 8, 8),
+    "expert": (99, 16, 30),
+    "200x200": (6000, 200, 200),
+    "1000x1000": (150000, 1000, 1000)
+}
+
+
+def find_opening(minefield, rng):
+    """
+    :return: The cords of a random cell that has no neighboring mines.
+    """
+    while True:
+        x = rng.randrange(minefield.width)
+        y = rng.randrange(minefield.height)
+
+        if not minefield.get_cell(x, y).is_mine and not any(cell.is_mine for cell in minefield.neighbors(x, y)):
+            return x, y
+
+
+def mid_game_minefield(num_mines, width, height, seed=0):
+    """
+    :return: A minefield with roughly half of its safe cells revealed.
+    """
+    minefield = random_minefield(num_mines, width, height, seed=seed)
+    rng = Random(seed)
+    revealed = 0
+
+    while revealed < (width * height - num_mines) // 2:
+        x = rng.randrange(width)
+        y = rng.randrange(height)
+
+        if not minefield.get_cell(x, y).is_mine:
+            revealed += len(minefield.reveal_cell(x, y))
+
+    return minefield
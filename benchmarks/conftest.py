@@ -0,0 +1,33 @@
+"""
+Fixtures shared by the pytest-benchmark suite. Run it from the repository root with: pytest benchmarks
+"""
+
+import os
+from functools import lru_cache
+
+import pytest
+
+from terminal_mines.game_logic import renderer
+
+from boards import SIZES, mid_game_minefield
+
+
+@lru_cache(maxsize=None)
+def cached_mid_game_minefield(size):
+    """
+    Mid-game boards are slow to set up on the larger sizes so each is only built once. Benchmarks using these must not
+    change the state of any cell.
+    """
+    return mid_game_minefield(*SIZES[size], seed=0)
+
+
+@pytest.fixture
+def null_stdout(monkeypatch):
+    """
+    Sends anything the renderers draw to the null device. The terminal is reported as big enough for any board so
+    that the differential renderer doesn't fall back to full redraws.
+    """
+    with open(os.devnull, "w") as null:
+        monkeypatch.setattr("sys.stdout", null)
+        monkeypatch.setattr(renderer, "get_terminal_size", lambda: (100000, 100000))
+        yield
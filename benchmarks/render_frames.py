@@ -0,0 +1,61 @@
+"""
+Measures how long the renderers take to draw a frame of a game in progress. Output goes to a null stream so only the
+cost of building the frame is measured.
+
+Run from the repository root with: python benchmarks/render_frames.py
+"""
+
+import os
+from contextlib import redirect_stdout
+from time import perf_counter
+
+import click
+
+from terminal_mines.game_logic import renderer
+from terminal_mines.game_logic.renderer import render, DifferentialRenderer
+
+from boards import SIZES, mid_game_minefield
+
+
+def time_frames(render_func, minefield, frames):
+    """
+    Moves the cursor one cell to the right between frames like a player holding an arrow key.
+
+    :return: The mean time per frame in seconds.
+    """
+    render_func(minefield)
+    start = perf_counter()
+
+    for _ in range(frames):
+        minefield.x = (minefield.x + 1) % minefield.width
+        render_func(minefield, [])
+
+    return (perf_counter() - start) / frames
+
+
+@click.command()
+@click.option("--frames", default=200, help="Number of frames to time for each board size.")
+def main(frames):
+    results = []
+
+    with open(os.devnull, "w") as null, redirect_stdout(null):
+        for name in ("expert", "200x200"):
+            num_mines, width, height = SIZES[name]
+            minefield = mid_game_minefield(num_mines, width, height, seed=0)
+            full = time_frames(render, minefield, frames)
+
+            # The differential renderer needs a terminal tall enough for the board
+            renderer.get_terminal_size = lambda: (width * 2 + 4, height + 4)
+            differential_renderer = DifferentialRenderer()
+            differential_renderer.full_redraw(minefield)
+            differential = time_frames(differential_renderer, minefield, frames)
+
+            results.append((width, height, full, differential))
+
+    for width, height, full, differential in results:
+        click.echo("{}x{}: full redraw {:.3f}ms/frame, differential {:.3f}ms/frame".format(
+            width, height, full * 1000, differential * 1000))
+
+
+if __name__ == "__main__":
+    main()
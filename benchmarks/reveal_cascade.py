@@ -0,0 +1,101 @@
+"""
+Compares the iterative flood fill in Minefield.reveal_cell against the original recursive implementation on large,
+sparsely mined boards.
+
+Run from the repository root with: python benchmarks/reveal_cascade.py
+"""
+
+import random
+import sys
+import threading
+from time import perf_counter
+
+import click
+
+from terminal_mines.game_logic.game_model import CellState, random_minefield
+
+from boards import find_opening
+
+
+def recursive_reveal(minefield, x, y):
+    """
+    The reveal_cell implementation that shipped before the flood fill was made iterative. Game over and win handling
+    are left out since only the cascade is being measured.
+    """
+    target = minefield.get_cell(x, y)
+
+    if target.state != CellState.UNKNOWN:
+        return
+
+    neighbor_mines = len([cell for cell in minefield.neighbors(x, y) if cell.is_mine])
+
+    if neighbor_mines == 0:
+        target.state = CellState.SAFE
+
+        for neighbor_x, neighbor_y in minefield.neighboring_cords(x, y):
+            recursive_reveal(minefield, neighbor_x, neighbor_y)
+    else:
+        target.state = CellState(str(neighbor_mines))
+
+
+def time_reveal(reveal_func, size, num_mines, seed):
+    minefield = random_minefield(num_mines, size, size, seed=seed)
+    x, y = find_opening(minefield, random.Random(seed))
+
+    start = perf_counter()
+    reveal_func(minefield, x, y)
+    elapsed = perf_counter() - start
+
+    revealed = len([cell for cell in minefield.cells if cell.state != CellState.UNKNOWN])
+    return elapsed, revealed
+
+
+def run_with_deep_stack(func, *args):
+    """
+    Runs func in a thread with a large stack and recursion limit so the recursive version can finish at all.
+    """
+    result = []
+    old_limit = sys.getrecursionlimit()
+    old_stack_size = threading.stack_size(512 * 1024 * 1024)
+    sys.setrecursionlimit(10 ** 7)
+
+    try:
+        thread = threading.Thread(target=lambda: result.append(func(*args)))
+        thread.start()
+        thread.join()
+    finally:
+        sys.setrecursionlimit(old_limit)
+        threading.stack_size(old_stack_size)
+
+    if not result:
+        raise RuntimeError("the recursive reveal crashed")
+
+    return result[0]
+
+
+@click.command()
+@click.option("--size", default=1000, help="Width and height of the board.")
+@click.option("--density", default=0.01, help="Fraction of cells that are mines.")
+@click.option("--rounds", default=3, help="Number of boards to time for each implementation.")
+@click.option("--skip-recursive", is_flag=True, help="Only time the iterative implementation.")
+def main(size, density, rounds, skip_recursive):
+    num_mines = int(size * size * density)
+    click.echo("Revealing an opening on {} {}x{} boards with {} mines".format(rounds, size, size, num_mines))
+
+    implementations = [("iterative", lambda minefield, x, y: minefield.reveal_cell(x, y))]
+    if not skip_recursive:
+        implementations.append(("recursive", recursive_reveal))
+
+    for name, reveal_func in implementations:
+        timings = []
+
+        for seed in range(rounds):
+            elapsed, revealed = run_with_deep_stack(time_reveal, reveal_func, size, num_mines, seed)
+            timings.append(elapsed)
+
+        click.echo("{:>10}: best {:.3f}s, mean {:.3f}s ({} cells revealed on the last board)".format(
+            name, min(timings), sum(timings) / len(timings), revealed))
+
+
+if __name__ == "__main__":
+    main()
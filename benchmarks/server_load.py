@@ -0,0 +1,134 @@
+"""
+Opens thousands of simulated sessions against the game server and reports the latency of each kind of command.
+
+Each session connects, then sends a random mix of moves, reveals, flags and full board requests, starting a new game
+whenever one ends. The server runs in its own process so that it doesn't share the event loop with the sessions, unless
+the address of a server that is already running is given.
+
+Run from the repository root with: python benchmarks/server_load.py
+"""
+
+import asyncio
+import subprocess
+import sys
+from random import Random
+from time import perf_counter
+
+import click
+
+from boards import SIZES
+
+# How often each command is picked
+COMMAND_WEIGHTS = {"move": 4, "reveal": 3, "flag": 2, "state": 1}
+
+
+def percentile(timings, percent):
+    """
+    :return: The given percentile of a sorted list, using the nearest rank.
+    """
+    return timings[min(int(len(timings) * percent / 100), len(timings) - 1)]
+
+
+async def run_session(host, port, index, num_commands, latencies):
+    """
+    Plays one session, adding the round trip time of every command to the latencies dict.
+    """
+    rng = Random(index)
+    commands = [name for name, weight in sorted(COMMAND_WEIGHTS.items()) for _ in range(weight)]
+
+    start = perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    greeting = (await reader.readline()).split()
+    latencies["connect"].append(perf_counter() - start)
+
+    width, height = int(greeting[1]), int(greeting[2])
+
+    try:
+        for _ in range(num_commands):
+            name = rng.choice(commands)
+            if name == "state":
+                line = name
+            else:
+                line = "{} {} {}".format(name, rng.randrange(width), rng.randrange(height))
+
+            start = perf_counter()
+            writer.write(line.encode("ascii") + b"\n")
+            response = await reader.readline()
+            latencies[name].append(perf_counter() - start)
+
+            if not response:
+                raise ConnectionError("the server closed the connection")
+            elif response.startswith((b"update won", b"update lost")):
+                start = perf_counter()
+                writer.write(b"new\n")
+                await reader.readline()
+                latencies["new"].append(perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run_sessions(host, port, num_sessions, num_commands):
+    latencies = {name: [] for name in ["connect", "new"] + sorted(COMMAND_WEIGHTS)}
+    await asyncio.gather(*(run_session(host, port, index, num_commands, latencies) for index in range(num_sessions)))
+    return latencies
+
+
+def start_server(difficulty):
+    """
+    Starts a server on a free port in a new process.
+
+    :return: A tuple of the process and the port it is listening on.
+    """
+    code = "from terminal_mines.mines import main; main()"
+    process = subprocess.Popen([sys.executable, "-c", code, difficulty, "--serve", "127.0.0.1:0"],
+                               stdout=subprocess.PIPE, universal_newlines=True)
+
+    for line in process.stdout:
+        if line.startswith("Listening on "):
+            return process, int(line.rsplit(":", 1)[1])
+
+    raise RuntimeError("the server exited before it started listening")
+
+
+@click.command()
+@click.option("--sessions", default=2000, help="Number of sessions to run at once.")
+@click.option("--commands", default=50, help="Number of commands sent by each session.")
+@click.option("--size", type=click.Choice(sorted(SIZES)), default="expert", help="Board size the server hosts.")
+@click.option("--address", help="The host:port of a server that is already running. Its difficulty is used as is.")
+def main(sessions, commands, size, address):
+    process = None
+
+    if address:
+        host, _, port = address.rpartition(":")
+        host, port = host or "127.0.0.1", int(port)
+    else:
+        host = "127.0.0.1"
+        process, port = start_server(",".join(map(str, SIZES[size])))
+
+    try:
+        click.echo("Running {} sessions of {} commands against {}:{}".format(sessions, commands, host, port))
+
+        loop = asyncio.new_event_loop()
+        start = perf_counter()
+        latencies = loop.run_until_complete(run_sessions(host, port, sessions, commands))
+        elapsed = perf_counter() - start
+        loop.close()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    click.echo("{:>8} {:>8} {:>10} {:>10} {:>10}".format("command", "count", "p50 ms", "p99 ms", "max ms"))
+
+    for name, timings in latencies.items():
+        if timings:
+            timings.sort()
+            click.echo("{:>8} {:>8} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+                name, len(timings), percentile(timings, 50) * 1000, percentile(timings, 99) * 1000, timings[-1] * 1000))
+
+    total = sum(len(timings) for timings in latencies.values())
+    click.echo("{} requests in {:.2f}s ({:.0f} per second)".format(total, elapsed, total / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Measures how long the mines command takes to start. Each mode is launched in a fresh interpreter several times and the
+wall clock time until it's done is reported, along with a bare interpreter for comparison. For interactive play the
+time is taken to the first frame, with the game running in a pseudo terminal. The slowest imports, as reported by
+python -X importtime, are listed too.
+
+Run from the repository root with: python benchmarks/startup.py
+"""
+
+import os
+import subprocess
+import sys
+from statistics import median
+from time import perf_counter
+
+import click
+
+try:
+    import fcntl
+    import pty
+    import struct
+    import termios
+except ImportError:
+    pty = None
+
+MAIN = "from terminal_mines.mines import main; main()"
+
+# The command line of each headless mode that is timed until it exits
+MODES = {
+    "interpreter": ["-c", "pass"],
+    "import": ["-c", "import terminal_mines.mines"],
+    "help": ["-c", MAIN, "--help"],
+    "batch": ["-c", MAIN, "easy", "--batch", "1", "--seed", "0"],
+}
+
+# Printed on the status line under the board once the first frame has been drawn
+FRAME_MARKER = b"Flags remaining"
+
+
+def time_exit(args):
+    """
+    :return: The seconds taken by the given interpreter command line to run to completion.
+    """
+    start = perf_counter()
+    subprocess.run([sys.executable] + args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return perf_counter() - start
+
+
+def time_first_frame(difficulty):
+    """
+    Starts a game in an 80x24 pseudo terminal and quits it with ESC once the first frame is drawn. The game is killed
+    if it doesn't quit within 10 seconds.
+
+    :return: The seconds taken until the first frame was drawn.
+    """
+    controller, terminal = pty.openpty()
+    fcntl.ioctl(terminal, termios.TIOCSWINSZ, struct.pack("HHHH", 24, 80, 0, 0))
+
+    start = perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", MAIN, difficulty, "--seed", "0"], stdin=terminal,
+                               stdout=terminal, stderr=terminal)
+    output = b""
+
+    try:
+        while FRAME_MARKER not in output:
+            chunk = os.read(controller, 65536)
+            if not chunk:
+                raise RuntimeError("the game exited before drawing a frame")
+
+            output += chunk
+
+        elapsed = perf_counter() - start
+
+        # Keys pressed before the game starts reading them can be discarded so ESC is sent until the game quits
+        for _ in range(100):
+            os.write(controller, b"\x1b")
+
+            try:
+                process.wait(0.1)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+        os.close(controller)
+        os.close(terminal)
+
+    return elapsed
+
+
+def slowest_imports(count):
+    """
+    :return: A list of (microseconds, depth, module name) tuples for the slowest imports made while importing the entry
+        point, counting the imports they make in turn, along with the total for the entry point itself. Only the entry
+        point's own imports and the ones they make directly are listed.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", MODES["import"][1]], stderr=subprocess.PIPE,
+                            stdout=subprocess.DEVNULL, universal_newlines=True, check=True)
+    timings = []
+    total = 0
+
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        # Each level of nesting indents the name by two more spaces
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+
+        if name == "terminal_mines.mines":
+            total = int(cumulative)
+        elif depth in (1, 2):
+            timings.append((int(cumulative), depth, name))
+
+    return sorted(timings, reverse=True)[:count], total
+
+
+@click.command()
+@click.option("--runs", default=20, help="Number of times each mode is started.")
+@click.option("--size", default="expert", help="Difficulty of the game timed to its first frame.")
+@click.option("--imports", default=15, help="Number of the slowest imports to list.")
+def main(runs, size, imports):
+    timings = {name: [] for name in MODES}
+
+    if pty is not None:
+        timings["first frame"] = []
+    else:
+        click.echo("Skipping the first frame since pseudo terminals aren't supported on this platform")
+
+    # Interleave the modes so that they are all affected alike by anything else running on the machine
+    for _ in range(runs):
+        for name, args in MODES.items():
+            timings[name].append(time_exit(args))
+
+        if pty is not None:
+            timings["first frame"].append(time_first_frame(size))
+
+    click.echo("{:>12} {:>10} {:>10}".format("mode", "median ms", "min ms"))
+
+    for name, values in timings.items():
+        click.echo("{:>12} {:>10.1f} {:>10.1f}".format(name, median(values) * 1000, min(values) * 1000))
+
+    slowest, total = slowest_imports(imports)
+    click.echo("\nImporting terminal_mines.mines took {:.1f}ms. Slowest imports:".format(total / 1000))
+
+    for microseconds, depth, name in slowest:
+        click.echo("{:>10.1f}ms {}{}".format(microseconds / 1000, "  " * depth, name))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ with open("README.md") as file:
 setup(
     name="terminal-mines",
     version="1.3",
-    python_requires="~=3.4",
+    python_requires="~=3.5",
     license="MIT",
     author="Joel Eager",
     description="A command-line clone of Minesweeper in Python",
@@ -18,6 +18,10 @@ setup(
     install_requires=[
         "click==7.0",
     ],
+    extras_require={
+        "bench": ["pytest", "pytest-benchmark"],
+        "numpy": ["numpy>=1.17"],
+    },
     entry_points="""
         [console_scripts]
         mines=terminal_mines.mines:main
@@ -1,7 +1,44 @@
 """
 Implements the game and the necessary input/output logic for interacting with the user.
+
+The names below are imported from their modules the first time they're used, so importing one module of the package
+doesn't load the rest of it along with asyncio, multiprocessing and the like.
 """
-from .game_model import Minefield, random_minefield, GameState, CellState
-from .keyboard_listener import input_loop
-from .renderer import render
-from .solver import solve_game
+import sys
+from importlib import import_module
+
+# The module each name re-exported by the package comes from
+EXPORTS = {
+    "Minefield": "game_model",
+    "random_minefield": "game_model",
+    "load_mines": "game_model",
+    "GameState": "game_model",
+    "CellState": "game_model",
+    "ChunkedMinefield": "chunked",
+    "input_loop": "keyboard_listener",
+    "AsyncInputLoop": "async_input",
+    "render": "renderer",
+    "make_renderer": "renderer",
+    "solve_game": "solver",
+    "ENGINES": "solver",
+    "run_batch": "batch",
+}
+
+
+def __getattr__(name):
+    if name not in EXPORTS:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+    value = getattr(import_module("." + EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(EXPORTS))
+
+
+if sys.version_info < (3, 7):
+    # Module level __getattr__() needs Python 3.7
+    for _name in EXPORTS:
+        __getattr__(_name)
@@ -0,0 +1,236 @@
+"""
+Generates and analyzes thousands of boards at once as stacked NumPy arrays. Requires the optional numpy dependency.
+
+A stack of boards is a (count, height, width) array of booleans that are True for mines. The neighbor counts of every
+board are found together by convolving the stack with a 3x3 box. Openings, the connected areas of cells without
+neighboring mines that a single click reveals, are labelled by spreading labels between neighboring cells of every
+board in lockstep. From those the 3BV of each board is worked out. 3BV (Bechtel's Board Benchmark Value) is the fewest
+clicks that clear a board: one per opening plus one for each safe cell that no opening reveals.
+"""
+
+from time import perf_counter
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError("board analytics require numpy to be installed")
+
+from .game_model import Minefield
+
+# Boards are analyzed in batches of up to MAX_BATCH_SIZE boards holding at most about BATCH_CELLS cells between them.
+#   Analyzing a batch takes 13 to 24 bytes per cell at its peak, so this keeps a batch to around 200MB at most.
+MAX_BATCH_SIZE = 10000
+BATCH_CELLS = 2 ** 23
+
+# pick_boards() gives up after this many batches in a row without a board in the 3BV range
+MAX_EMPTY_BATCHES = 100
+
+
+def default_batch_size(width, height):
+    """
+    :return: The number of boards of the given size to analyze at once. Always at least 1, so a batch of very large
+        boards can go over BATCH_CELLS.
+    """
+    return max(1, min(MAX_BATCH_SIZE, BATCH_CELLS // max(width * height, 1)))
+
+
+def random_boards(count, num_mines, width, height, rng):
+    """
+    :param rng: A numpy.random.Generator instance.
+    :return: A stack of count boards with num_mines mines each, placed uniformly at random. The boards differ from the
+        ones random_minefield() makes for the same seed.
+    """
+    size = width * height
+    mines = numpy.zeros((count, size), dtype=bool)
+
+    if num_mines:
+        # The positions of the num_mines smallest of a row of random keys are a uniform sample without replacement
+        keys = rng.random((count, size), dtype=numpy.float32)
+        positions = numpy.argpartition(keys, num_mines - 1, axis=1)[:, :num_mines]
+        numpy.put_along_axis(mines, positions, True, axis=1)
+
+    return mines.reshape(count, height, width)
+
+
+def _box(stack, func):
+    """
+    Combines each cell of every board with its neighbors using func, which is numpy.add or numpy.maximum. The 3x3 box is
+    applied along the rows and then the columns by combining shifted views in place, which avoids padding the stack.
+    Cells past the edge of the board are left out.
+
+    :return: A stack the same shape as the given one.
+    """
+    rows = stack.copy()
+    func(rows[:, :, 1:], stack[:, :, :-1], out=rows[:, :, 1:])
+    func(rows[:, :, :-1], stack[:, :, 1:], out=rows[:, :, :-1])
+
+    box = rows.copy()
+    func(box[:, 1:], rows[:, :-1], out=box[:, 1:])
+    func(box[:, :-1], rows[:, 1:], out=box[:, :-1])
+    return box
+
+
+def neighbor_counts(mines):
+    """
+    :return: A stack holding the number of neighboring mines of each cell, the same numbers Minefield shows.
+    """
+    mines = mines.astype(numpy.uint8)
+    return _box(mines, numpy.add) - mines
+
+
+def _cell_ids(height, width):
+    # The labels are the bulk of the work so they're kept as narrow as the board allows
+    dtype = numpy.uint16 if height * width < 2 ** 16 else numpy.uint32
+    return numpy.arange(1, height * width + 1, dtype=dtype).reshape(1, height, width)
+
+
+def label_openings(zero):
+    """
+    Labels the openings of every board in the given stack of cells without neighboring mines. Neighboring cells,
+    diagonals included, are in the same opening. Every cell of an opening takes the label of its last cell in row order,
+    which is that cell's index plus one.
+
+    :return: A stack holding the label of each cell, or 0 for cells outside an opening.
+    """
+    ids = _cell_ids(*zero.shape[1:])
+    labels = ids * zero
+    active = numpy.arange(len(zero))
+
+    # Each pass spreads the labels by one cell. Boards are dropped once their labels stop changing.
+    while active.size:
+        current = labels[active]
+        spread = _box(current, numpy.maximum)
+        spread *= zero[active]
+        labels[active] = spread
+        active = active[(spread != current).any(axis=(1, 2))]
+
+    return labels
+
+
+class BoardAnalysis:
+    """
+    The neighbor counts, openings and 3BV of every board in a stack.
+    """
+    def __init__(self, mines):
+        self.mines = mines
+        self.counts = neighbor_counts(mines)
+
+        zero = ~mines & (self.counts == 0)
+        self.labels = label_openings(zero)
+        self.openings = (zero & (self.labels == _cell_ids(*mines.shape[1:]))).sum(axis=(1, 2))
+
+        # Cells next to an opening are revealed with it so only the safe cells beyond every opening need their own click
+        unopened = ~mines & ~_box(zero, numpy.maximum)
+        self.three_bv = self.openings + unopened.sum(axis=(1, 2))
+
+    def __repr__(self):
+        return "{}({} boards)".format(type(self).__name__, len(self))
+
+    def __len__(self):
+        return len(self.mines)
+
+    def select(self, min_3bv=None, max_3bv=None):
+        """
+        :return: An array of the indices of the boards whose 3BV is in the given range, bounds included.
+        """
+        keep = numpy.ones(len(self), dtype=bool)
+
+        if min_3bv is not None:
+            keep &= self.three_bv >= min_3bv
+        if max_3bv is not None:
+            keep &= self.three_bv <= max_3bv
+
+        return numpy.flatnonzero(keep)
+
+    def minefield(self, index, storage="array"):
+        """
+        :return: A new Minefield instance for the board at the given index.
+        """
+        height, width = self.mines.shape[1:]
+        return Minefield(width, height, bytearray(self.mines[index].astype(numpy.uint8).tobytes()), storage)
+
+
+def analyze_difficulty(count, difficulty, seed=None, batch_size=None):
+    """
+    Analyzes count random boards of the given difficulty, batch_size boards at a time. The default_batch_size() is used
+    if it isn't given.
+
+    :return: A DifficultyReport instance.
+    """
+    rng = numpy.random.default_rng(seed)
+    batch_size = batch_size or default_batch_size(*difficulty[1:])
+    three_bv = []
+    openings = []
+    start = perf_counter()
+
+    for batch_start in range(0, count, batch_size):
+        analysis = BoardAnalysis(random_boards(min(batch_size, count - batch_start), *difficulty, rng))
+        three_bv.append(analysis.three_bv)
+        openings.append(analysis.openings)
+
+    return DifficultyReport(difficulty, numpy.concatenate(three_bv), numpy.concatenate(openings),
+                            perf_counter() - start, seed)
+
+
+def pick_boards(count, difficulty, min_3bv=None, max_3bv=None, seed=None, storage="array", batch_size=None):
+    """
+    Generates random boards of the given difficulty and keeps the first count whose 3BV is in the given range.
+
+    :param batch_size: The number of boards generated at a time, picked by default_batch_size() if not given.
+
+    :raises ValueError: If MAX_EMPTY_BATCHES batches go by without finding a board in the range.
+    :return: A list of new Minefield instances.
+    """
+    rng = numpy.random.default_rng(seed)
+    batch_size = batch_size or default_batch_size(*difficulty[1:])
+    minefields = []
+    empty_batches = 0
+
+    while len(minefields) < count:
+        analysis = BoardAnalysis(random_boards(batch_size, *difficulty, rng))
+        indices = analysis.select(min_3bv, max_3bv)[:count - len(minefields)]
+        minefields.extend(analysis.minefield(index, storage) for index in indices)
+
+        empty_batches = 0 if indices.size else empty_batches + 1
+        if empty_batches == MAX_EMPTY_BATCHES:
+            raise ValueError("no boards with a 3BV in the given range were found in {} boards".format(
+                MAX_EMPTY_BATCHES * batch_size))
+
+    return minefields
+
+
+class DifficultyReport:
+    """
+    Summary statistics for the boards analyzed by analyze_difficulty().
+    """
+    def __init__(self, difficulty, three_bv, openings, seconds, seed):
+        self.difficulty = difficulty
+        self.three_bv = three_bv
+        self.openings = openings
+        self.seconds = seconds
+        self.seed = seed
+
+    def __repr__(self):
+        return "{}({}, {} boards, seed={})".format(type(self).__name__, self.difficulty, len(self.three_bv), self.seed)
+
+    @property
+    def boards_per_second(self):
+        return len(self.three_bv) / self.seconds if self.seconds else 0.0
+
+    def format(self):
+        """
+        :return: A human readable summary of the boards.
+        """
+        num_mines, width, height = self.difficulty
+        p10, p50, p90 = numpy.percentile(self.three_bv, [10, 50, 90])
+
+        return "\n".join((
+            "Boards analyzed: {} {}x{} boards with {} mines (seed {})".format(
+                len(self.three_bv), width, height, num_mines, self.seed),
+            "3BV:             mean {:.1f}, min {}, p10 {:.0f}, median {:.0f}, p90 {:.0f}, max {}".format(
+                self.three_bv.mean(), self.three_bv.min(), p10, p50, p90, self.three_bv.max()),
+            "3BV per cell:    {:.3f}".format(self.three_bv.mean() / (width * height)),
+            "Openings:        mean {:.1f}, boards without one {:.2%}".format(
+                self.openings.mean(), (self.openings == 0).mean()),
+            "Boards / second: {:.0f} ({:.2f}s elapsed)".format(self.boards_per_second, self.seconds)
+        ))
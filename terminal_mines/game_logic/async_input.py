@@ -0,0 +1,299 @@
+"""
+A non-blocking input loop built on asyncio.
+
+Keys are read from stdin as soon as they arrive and handled in bursts. Runs of movement keys within a burst, such as
+those sent while an arrow key is held down, are merged into a single cursor update, and redraws are capped at a fixed
+frame rate so the screen never falls behind the keyboard. Background tasks can run alongside the loop and ask for a
+redraw when they have something to show.
+
+On Unix-like platforms stdin is switched to cbreak mode and watched by the event loop. Elsewhere keys are read with
+click.getchar() on a helper thread.
+"""
+
+import asyncio
+import codecs
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import click
+
+from .keyboard_listener import ArrowKeyMapping
+from .renderer import DEFAULT_FPS
+
+try:
+    import termios
+    import tty
+except ImportError:
+    termios = None
+
+ESCAPE = "\x1b"
+
+# The cursor movement made by each movement key
+MOVES = {
+    ArrowKeyMapping.UP.value: (0, -1),
+    ArrowKeyMapping.DOWN.value: (0, 1),
+    ArrowKeyMapping.LEFT.value: (-1, 0),
+    ArrowKeyMapping.RIGHT.value: (1, 0)
+}
+
+# The final characters of the arrow key escape sequences on Unix-like platforms and on Windows
+ARROW_SEQUENCES = {"A": ArrowKeyMapping.UP.value, "B": ArrowKeyMapping.DOWN.value,
+                   "C": ArrowKeyMapping.RIGHT.value, "D": ArrowKeyMapping.LEFT.value}
+WINDOWS_ARROW_SEQUENCES = {"H": ArrowKeyMapping.UP.value, "P": ArrowKeyMapping.DOWN.value,
+                           "K": ArrowKeyMapping.LEFT.value, "M": ArrowKeyMapping.RIGHT.value}
+
+
+def parse_keys(text):
+    """
+    Splits text read from the terminal into keys of the form input_loop() hands to its handler. Printable characters
+    are lower cased, arrow keys become their mapped letters, Enter becomes a newline, and a lone ESC is kept as ESCAPE.
+    Other escape sequences and control characters are dropped.
+
+    :return: A list of keys.
+    """
+    keys = []
+    index = 0
+
+    while index < len(text):
+        ch = text[index]
+        index += 1
+
+        if ch == ESCAPE and index < len(text) and text[index] in "[O":
+            # Skip to the final character of the sequence, which is the only part that matters for the arrow keys
+            end = index + 1
+            while end < len(text) and not "@" <= text[end] <= "~":
+                end += 1
+
+            if end < len(text) and text[end] in ARROW_SEQUENCES:
+                keys.append(ARROW_SEQUENCES[text[end]])
+
+            index = end + 1
+        elif ch in ("\x00", "\xe0") and index < len(text):
+            # Windows sends a prefix character followed by the key's scan code
+            if text[index] in WINDOWS_ARROW_SEQUENCES:
+                keys.append(WINDOWS_ARROW_SEQUENCES[text[index]])
+
+            index += 1
+        elif ch == ESCAPE:
+            keys.append(ESCAPE)
+        elif ch == "\r" or ch == "\n":
+            keys.append("\n")
+        elif " " <= ch <= "~":
+            keys.append(ch.lower())
+
+    return keys
+
+
+def coalesce(keys):
+    """
+    Merges each run of movement keys into one (dx, dy) tuple holding the total movement. Other keys are kept as is and
+    in order, so a movement is always applied before a key that follows it.
+
+    :return: A list of keys and tuples.
+    """
+    events = []
+
+    for key in keys:
+        if key in MOVES:
+            dx, dy = MOVES[key]
+
+            if events and isinstance(events[-1], tuple):
+                events[-1] = (events[-1][0] + dx, events[-1][1] + dy)
+            else:
+                events.append((dx, dy))
+        else:
+            events.append(key)
+
+    return events
+
+
+class AsyncInputLoop:
+    """
+    Reads keys without blocking and hands them to the handlers in coalesced bursts, redrawing at most fps times a
+    second.
+
+    handle_key(key) is called for each key other than a movement key and handle_move(dx, dy) for each run of movement
+    keys. Both return a list of the cords of the cells they changed, which are gathered up and passed to redraw(changed)
+    once the next frame is due. The loop stops when ESC is pressed, stdin is closed, or stop() is called.
+    """
+    def __init__(self, handle_key, handle_move, redraw, fps=DEFAULT_FPS):
+        self.handle_key = handle_key
+        self.handle_move = handle_move
+        self.redraw = redraw
+        self.fps = fps
+
+        self.loop = None
+        self.stopped = False
+        self.pending = []           # Keys read since the last burst was handled
+        self.wakeup = None          # An asyncio.Event set when keys arrive or the loop is stopped
+
+        self.changed = []           # Cords changed since the last frame, or None for a full comparison
+        self.dirty = False
+        self.last_draw = None
+        self.draw_handle = None
+
+    def __repr__(self):
+        return "{}(fps={})".format(type(self).__name__, self.fps)
+
+    def run(self, *background):
+        """
+        Runs the loop until it is stopped. Each of the given coroutine functions is started as a task with this loop
+        as its argument and is cancelled when the loop stops.
+        """
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        main = self.loop.create_task(self._main(background))
+
+        try:
+            self.loop.run_until_complete(main)
+        except KeyboardInterrupt:
+            # Wind down as if ESC was pressed so that the background tasks are cancelled and awaited, and the terminal
+            #   restored, before the loop is closed
+            self.stop()
+
+            if not main.done():
+                self.loop.run_until_complete(main)
+            elif not main.cancelled():
+                # The interrupt was raised inside _main(), which has already cleaned up. Retrieving it stops asyncio
+                #   from reporting it as never retrieved.
+                main.exception()
+        finally:
+            self.loop.close()
+            asyncio.set_event_loop(None)
+
+    def stop(self):
+        self.stopped = True
+
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def request_redraw(self, changed=None):
+        """
+        Schedules a redraw for when the next frame is due. Can be called by background tasks.
+
+        :param changed: A list of the cords of the cells that changed, or None if they aren't known.
+        """
+        if changed is None:
+            self.changed = None
+        elif self.changed is not None:
+            self.changed.extend(changed)
+
+        self.dirty = True
+
+        if self.draw_handle is None:
+            delay = 0 if self.last_draw is None else self.last_draw + 1 / self.fps - self.loop.time()
+            self.draw_handle = self.loop.call_later(max(delay, 0), self.draw)
+
+    def draw(self):
+        """
+        Draws a frame now if there is anything to draw.
+        """
+        if self.draw_handle is not None:
+            self.draw_handle.cancel()
+            self.draw_handle = None
+
+        if self.dirty:
+            changed = self.changed
+            self.changed = []
+            self.dirty = False
+            self.last_draw = self.loop.time()
+            self.redraw(changed)
+
+    def receive(self, text):
+        """
+        Queues up the keys in the given text. Must be called from the event loop's thread.
+        """
+        self.pending.extend(parse_keys(text))
+        self.wakeup.set()
+
+    async def _main(self, background):
+        self.wakeup = asyncio.Event()
+        tasks = [self.loop.create_task(func(self)) for func in background]
+
+        try:
+            with self._reader():
+                while not self.stopped:
+                    await self.wakeup.wait()
+                    self.wakeup.clear()
+
+                    keys = self.pending
+                    self.pending = []
+                    self.dispatch(keys)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            # Make sure the last frame, such as the end of the game, is drawn before returning
+            self.draw()
+
+    def dispatch(self, keys):
+        """
+        Hands a burst of keys to the handlers.
+        """
+        for event in coalesce(keys):
+            if event == ESCAPE:
+                self.stop()
+            elif isinstance(event, tuple):
+                self.request_redraw(self.handle_move(*event))
+            else:
+                self.request_redraw(self.handle_key(event))
+
+            if self.stopped:
+                return
+
+    @contextmanager
+    def _reader(self):
+        """
+        Starts feeding keys from stdin into the loop for the duration of the with block.
+        """
+        if termios is None:
+            yield self._start_thread()
+            return
+
+        fd = sys.stdin.fileno()
+        decoder = codecs.getincrementaldecoder(sys.stdin.encoding or "utf-8")(errors="ignore")
+
+        def read():
+            data = os.read(fd, 1024)
+
+            if data:
+                self.receive(decoder.decode(data))
+            else:
+                self.stop()
+
+        try:
+            settings = termios.tcgetattr(fd)
+            # Unlike the default of TCSAFLUSH, this keeps any keys pressed while the game was starting
+            tty.setcbreak(fd, termios.TCSADRAIN)
+        except termios.error:
+            # Not a terminal; keys can still be read from a pipe
+            settings = None
+
+        self.loop.add_reader(fd, read)
+
+        try:
+            yield
+        finally:
+            self.loop.remove_reader(fd)
+
+            if settings is not None:
+                termios.tcsetattr(fd, termios.TCSADRAIN, settings)
+
+    def _start_thread(self):
+        def read():
+            while not self.stopped:
+                try:
+                    ch = click.getchar()
+                except (KeyboardInterrupt, EOFError):
+                    ch = ESCAPE
+
+                self.loop.call_soon_threadsafe(self.receive, ch)
+
+        thread = threading.Thread(target=read, daemon=True)
+        thread.start()
+        return thread
+
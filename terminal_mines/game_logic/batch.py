@@ -0,0 +1,177 @@
+"""
+Plays many games with the AI without rendering anything and summarizes how it did.
+"""
+
+from io import BytesIO
+from itertools import repeat
+from os import cpu_count
+from random import Random, getrandbits
+from time import perf_counter
+
+from .game_model import random_minefield
+from .persistence import MoveLog, record_moves
+from .solver import solve_headless
+
+
+def play_game(difficulty, engine, seed, index, record=False, patterns=False, beta=False):
+    """
+    Plays one game of a batch. The board and the AI's guesses are both derived from the batch seed and the game's
+    index so that any game can be reproduced on its own.
+
+    :param record: If set, the game is recorded in the move log format and kept in the log attribute of the result.
+    :param patterns: Set to True to play with the solver's pattern table.
+    :param beta: Set to True to win by revealing every safe cell rather than by flagging every mine.
+    :return: A GameStats instance.
+    """
+    rng = Random("{}:{}".format(seed, index))
+    minefield = random_minefield(*difficulty, seed=rng.getrandbits(64))
+    minefield.journaling = False    # The AI never undoes a move
+    minefield.beta = beta
+
+    if record:
+        buffer = BytesIO()
+        log = MoveLog(buffer, header=False)
+        log.start_game(minefield)
+        record_moves(minefield, log)
+
+    stats = solve_headless(minefield, engine, rng, patterns)
+
+    if record:
+        stats.log = buffer.getvalue()
+
+    return stats
+
+
+def play_games(difficulty, engine, seed, indices, record=False, patterns=False, beta=False):
+    """
+    Plays the games with the given indices. This is the unit of work handed to each worker process.
+
+    :return: A list of GameStats instances.
+    """
+    return [play_game(difficulty, engine, seed, index, record, patterns, beta) for index in indices]
+
+
+def run_batch(num_games, difficulty, engine="probability", seed=None, workers=1, log_file=None, patterns=False,
+              beta=False):
+    """
+    Plays num_games games on boards of the given difficulty, a tuple of the args expected by random_minefield().
+
+    The games are spread across the given number of worker processes, or one per CPU if workers is 0. Since every game
+    is seeded from its index the results are identical to a serial run with the same seed.
+
+    :param log_file: An optional file opened in binary append mode. Every game is added to it as a move log, in order.
+    :param patterns: Set to True to play with the solver's pattern table, to compare its time per move.
+    :param beta: Set to True to play every game under the beta rules.
+    :return: A BatchReport instance.
+    """
+    if seed is None:
+        seed = getrandbits(32)
+
+    if workers == 0:
+        workers = cpu_count() or 1
+
+    start = perf_counter()
+    record = log_file is not None
+    log = MoveLog(log_file) if record else None
+
+    # Hand out several chunks per worker so that a few slow games don't leave the other workers idle
+    chunk_size = max(num_games // (workers * 8), 1)
+    chunks = [range(chunk_start, min(chunk_start + chunk_size, num_games))
+              for chunk_start in range(0, num_games, chunk_size)]
+    args = (repeat(difficulty), repeat(engine), repeat(seed), chunks, repeat(record), repeat(patterns), repeat(beta))
+
+    if workers == 1:
+        results = collect_results(map(play_games, *args), log)
+    else:
+        # Loading multiprocessing takes a noticeable part of a short batch so it's only done when it's needed
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(workers) as executor:
+            results = collect_results(executor.map(play_games, *args), log)
+
+    return BatchReport(results, perf_counter() - start, seed, workers)
+
+
+def collect_results(chunk_results, log=None):
+    """
+    Flattens the results of each chunk of games. Recorded games are written to the log as their chunk comes in, rather
+    than kept around until the end of the batch.
+
+    :return: A list of GameStats instances.
+    """
+    results = []
+
+    for chunk in chunk_results:
+        for result in chunk:
+            if log is not None:
+                log.append(result.log)
+                result.log = None
+
+            results.append(result)
+
+    return results
+
+
+class BatchReport:
+    """
+    Summary statistics for a batch of games.
+    """
+    def __init__(self, results, seconds, seed, workers=1):
+        self.results = results
+        self.seconds = seconds
+        self.seed = seed
+        self.workers = workers
+
+    def __repr__(self):
+        return "{}({} games, seed={})".format(type(self).__name__, len(self.results), self.seed)
+
+    @property
+    def wins(self):
+        return len([result for result in self.results if result.won])
+
+    @property
+    def win_rate(self):
+        return self.wins / len(self.results) if self.results else 0.0
+
+    @property
+    def average_moves(self):
+        return sum(result.moves for result in self.results) / len(self.results) if self.results else 0.0
+
+    @property
+    def average_guesses(self):
+        return sum(result.guesses for result in self.results) / len(self.results) if self.results else 0.0
+
+    @property
+    def cpu_seconds(self):
+        """
+        The time spent playing each game, summed over every game in the batch.
+        """
+        return sum(result.seconds for result in self.results)
+
+    @property
+    def seconds_per_move(self):
+        moves = sum(result.moves for result in self.results)
+        return self.cpu_seconds / moves if moves else 0.0
+
+    @property
+    def lookups(self):
+        return sum(result.lookups for result in self.results)
+
+    @property
+    def games_per_second(self):
+        return len(self.results) / self.seconds if self.seconds else 0.0
+
+    def format(self):
+        """
+        :return: A human readable summary of the batch.
+        """
+        return "\n".join((
+            "Games played:    {} (seed {})".format(len(self.results), self.seed),
+            "Win rate:        {:.2%} ({} won)".format(self.win_rate, self.wins),
+            "Average moves:   {:.1f}".format(self.average_moves),
+            "Average guesses: {:.2f}".format(self.average_guesses),
+            "Time per move:   {:.3f}ms".format(self.seconds_per_move * 1000),
+            "Pattern table:   {}".format("{} lookups".format(self.lookups) if self.lookups else "not used"),
+            "Games / second:  {:.1f} ({:.2f}s elapsed, {:.2f}s summed over games, {} worker{})".format(
+                self.games_per_second, self.seconds, self.cpu_seconds, self.workers, "" if self.workers == 1 else "s")
+        ))
@@ -0,0 +1,359 @@
+"""
+A minefield for boards far too big to hold in memory. The board is split into square chunks whose mines are generated
+on demand from a seed, so only the parts of the board that have been played on are ever materialized.
+"""
+
+from collections import OrderedDict
+from random import Random, getrandbits
+
+from .game_model import (BaseMinefield, CellState, REVEALED_STATES, STATES, STATE_CODES, _adjacency_counts,
+                         _random_mine_bitmap)
+
+
+class ChunkedCell:
+    """
+    Stands in for Cell on a ChunkedMinefield. Reads and writes go through the minefield so the chunk holding the cell
+    doesn't need to exist until it is used.
+    """
+    __slots__ = ("_minefield", "_x", "_y")
+
+    def __init__(self, minefield, x, y):
+        self._minefield = minefield
+        self._x = x
+        self._y = y
+
+    @property
+    def is_mine(self):
+        return self._minefield.is_mine(self._x, self._y)
+
+    @property
+    def state(self):
+        return self._minefield.get_state(self._x, self._y)
+
+    @state.setter
+    def state(self, state):
+        self._minefield._set_state(self._y * self._minefield.width + self._x, state)
+
+    def __repr__(self):
+        return "{}({}, {})".format(type(self).__name__, self.is_mine, self.state.value)
+
+
+class ChunkedMinefield(BaseMinefield):
+    """
+    A drop-in replacement for Minefield where the mines are generated lazily, one chunk at a time.
+
+    Each chunk gets the same share of the mines, set by the density, and places them with a generator seeded from the
+    board's seed and the chunk's position. A chunk can therefore be thrown away and rebuilt exactly, which is what the
+    LRU cache of chunks does once more than max_chunks of them have been built. Only the cell states of chunks that
+    have been played on are kept for good, so memory grows with the area revealed rather than the size of the board.
+    """
+    def __init__(self, width, height, density, seed=None, chunk_size=64, max_chunks=1024):
+        if not 0 <= density <= 1:
+            raise ValueError("density must be between 0 and 1")
+
+        self.density = density
+        self.seed = getrandbits(64) if seed is None else seed
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+
+        self._chunks = OrderedDict()    # Maps chunk cords to a tuple of the mine and neighbor count bytearrays
+        self._states = {}               # Maps chunk cords to the bytearray of cell states for chunks played on
+
+        super().__init__(width, height, self._count_mines(width, height))
+
+    def __repr__(self):
+        return "{}({}, {}, {}, {} chunks cached)".format(type(self).__name__, self.width, self.height, self.density,
+                                                         len(self._chunks))
+
+    def _chunk_mines(self, width, height):
+        """
+        :return: How many mines a chunk of the given size holds.
+        """
+        return int(self.density * width * height + 0.5)
+
+    def _count_mines(self, width, height):
+        """
+        :return: How many mines a board of the given size holds in total.
+        """
+        size = self.chunk_size
+        full_x, partial_x = divmod(width, size)
+        full_y, partial_y = divmod(height, size)
+        total = 0
+
+        # Every chunk is either full size or cut short by the right and/or bottom edge of the board
+        for chunks_x, chunk_width in ((full_x, size), (1 if partial_x else 0, partial_x)):
+            for chunks_y, chunk_height in ((full_y, size), (1 if partial_y else 0, partial_y)):
+                total += chunks_x * chunks_y * self._chunk_mines(chunk_width, chunk_height)
+
+        return total
+
+    def _generate_mines(self, chunk_x, chunk_y):
+        """
+        :return: A bytearray of chunk_size squared bytes holding a 1 for each mine in the given chunk. Cells past the
+            edge of the board, including those of chunks outside it, are never mines.
+        """
+        size = self.chunk_size
+        mines = bytearray(size * size)
+        width = min(size, self.width - chunk_x * size)
+        height = min(size, self.height - chunk_y * size)
+
+        if chunk_x >= 0 and chunk_y >= 0 and width > 0 and height > 0:
+            rng = Random("{}:{}:{}".format(self.seed, chunk_x, chunk_y))
+            placed = _random_mine_bitmap(self._chunk_mines(width, height), width * height, rng)
+
+            if width == size:
+                mines[:len(placed)] = placed
+            else:
+                for y in range(height):
+                    mines[y * size:y * size + width] = placed[y * width:(y + 1) * width]
+
+        return mines
+
+    def _chunk(self, chunk_x, chunk_y):
+        """
+        :return: A tuple of the mine and neighbor count bytearrays of the given chunk, building it if needed.
+        """
+        key = (chunk_x, chunk_y)
+        chunks = self._chunks
+
+        if key in chunks:
+            chunks.move_to_end(key)
+            return chunks[key]
+
+        # Neighbor counts along the edges depend on the surrounding chunks; reuse their mines if they are cached
+        size = self.chunk_size
+        padded_width = size + 2
+        padded = bytearray(padded_width * padded_width)
+        mines = None
+
+        # The first source cell, number of cells and first destination cell to copy along one axis for each offset
+        spans = {-1: (size - 1, 1, 0), 0: (0, size, 1), 1: (0, 1, size + 1)}
+
+        for offset_y in (-1, 0, 1):
+            for offset_x in (-1, 0, 1):
+                neighbor_key = (chunk_x + offset_x, chunk_y + offset_y)
+                if neighbor_key in chunks:
+                    neighbor_mines = chunks[neighbor_key][0]
+                else:
+                    neighbor_mines = self._generate_mines(*neighbor_key)
+
+                if offset_x == offset_y == 0:
+                    mines = neighbor_mines
+
+                # Copy the part of the neighbor that falls within one cell of this chunk
+                src_x, copy_width, dest_x = spans[offset_x]
+                src_y, copy_height, dest_y = spans[offset_y]
+
+                for row in range(copy_height):
+                    src_start = (src_y + row) * size + src_x
+                    dest_start = (dest_y + row) * padded_width + dest_x
+                    padded[dest_start:dest_start + copy_width] = neighbor_mines[src_start:src_start + copy_width]
+
+        padded_counts = _adjacency_counts(padded, padded_width, padded_width)
+        adjacent = bytearray(size * size)
+        for y in range(size):
+            padded_start = (y + 1) * padded_width + 1
+            adjacent[y * size:(y + 1) * size] = padded_counts[padded_start:padded_start + size]
+
+        chunks[key] = (mines, adjacent)
+
+        if len(chunks) > self.max_chunks:
+            # Drop the least recently used chunk; it can be rebuilt from the seed if it's needed again
+            chunks.popitem(last=False)
+
+        return mines, adjacent
+
+    @property
+    def num_chunks(self):
+        """
+        The number of chunks currently held in the cache.
+        """
+        return len(self._chunks)
+
+    @property
+    def cells(self):
+        """
+        Iterates over all cells from left to right followed by top to bottom. Yields the cell object.
+        """
+        for _, _, cell in self.cords_and_cells:
+            yield cell
+
+    @property
+    def cords_and_cells(self):
+        """
+        Iterates over all cells from left to right followed by top to bottom. Yields a tuple of x pos, y pos, and the
+        cell object. Visits the whole board so prefer known_cords() on big boards.
+        """
+        for y in range(self.height):
+            for x in range(self.width):
+                yield x, y, ChunkedCell(self, x, y)
+
+    def is_mine(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            chunk_x, local_x = divmod(x, self.chunk_size)
+            chunk_y, local_y = divmod(y, self.chunk_size)
+            return self._chunk(chunk_x, chunk_y)[0][local_y * self.chunk_size + local_x] == 1
+        else:
+            raise IndexError
+
+    def get_cell(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return ChunkedCell(self, x, y)
+        else:
+            raise IndexError
+
+    def get_state(self, x, y):
+        """
+        :return: The CellState of the given cell. Never builds a chunk.
+        """
+        if 0 <= x < self.width and 0 <= y < self.height:
+            chunk_x, local_x = divmod(x, self.chunk_size)
+            chunk_y, local_y = divmod(y, self.chunk_size)
+            states = self._states.get((chunk_x, chunk_y))
+
+            if states is None:
+                return CellState.UNKNOWN
+            else:
+                return STATES[states[local_y * self.chunk_size + local_x]]
+        else:
+            raise IndexError
+
+    def row_codes(self, y, start=0, stop=None):
+        """
+        :return: A bytes object holding the state of each cell in the given row, optionally limited to the cells from
+            start up to stop, as an index into STATES.
+        """
+        if stop is None:
+            stop = self.width
+
+        if not (0 <= y < self.height and 0 <= start <= stop <= self.width):
+            raise IndexError
+
+        size = self.chunk_size
+        chunk_y, local_y = divmod(y, size)
+        codes = bytearray(stop - start)
+
+        for chunk_x in range(start // size, (stop + size - 1) // size):
+            states = self._states.get((chunk_x, chunk_y))
+
+            if states is not None:
+                first = max(start, chunk_x * size)
+                last = min(stop, (chunk_x + 1) * size)
+                row_start = local_y * size - chunk_x * size
+                codes[first - start:last - start] = states[row_start + first:row_start + last]
+
+        return bytes(codes)
+
+    def known_cords(self):
+        """
+        Iterates over the cords of every cell that isn't in the unknown state. Only visits the chunks played on.
+        """
+        size = self.chunk_size
+        unknown_code = STATE_CODES[CellState.UNKNOWN]
+
+        for chunk_x, chunk_y in sorted(self._states, key=lambda key: (key[1], key[0])):
+            states = self._states[(chunk_x, chunk_y)]
+
+            for index, code in enumerate(states):
+                if code != unknown_code:
+                    local_y, local_x = divmod(index, size)
+                    yield chunk_x * size + local_x, chunk_y * size + local_y
+
+    def _chunk_states(self, chunk_x, chunk_y):
+        """
+        :return: The bytearray of cell states for the given chunk, creating it the first time the chunk is played on.
+        """
+        key = (chunk_x, chunk_y)
+
+        if key not in self._states:
+            self._states[key] = bytearray(self.chunk_size * self.chunk_size)
+
+        return self._states[key]
+
+    def _locate(self, index):
+        """
+        :return: A tuple of the cords of the chunk holding the cell at the given index and the cell's index within it.
+        """
+        y, x = divmod(index, self.width)
+        chunk_x, local_x = divmod(x, self.chunk_size)
+        chunk_y, local_y = divmod(y, self.chunk_size)
+        return (chunk_x, chunk_y), local_y * self.chunk_size + local_x
+
+    def _mine_at(self, index):
+        key, local = self._locate(index)
+        return self._chunk(*key)[0][local] == 1
+
+    def _state_at(self, index):
+        key, local = self._locate(index)
+        states = self._states.get(key)
+        return CellState.UNKNOWN if states is None else STATES[states[local]]
+
+    def _write_state(self, index, state):
+        key, local = self._locate(index)
+        self._chunk_states(*key)[local] = STATE_CODES[state]
+
+    def _mine_indices(self):
+        """
+        Losing the game only exposes the mines in chunks that have been played on, since showing the rest would mean
+        building the whole board. A chunk counts as played on while any of its cells is known, rather than whenever it
+        has states, since undoing a move can leave a chunk's states behind with every cell unknown again. That keeps
+        redoing a lost game exact.
+        """
+        size = self.chunk_size
+        width = self.width
+        unknown_code = STATE_CODES[CellState.UNKNOWN]
+        indices = []
+
+        for chunk_x, chunk_y in sorted(self._states, key=lambda key: (key[1], key[0])):
+            states = self._states[(chunk_x, chunk_y)]
+            if states.count(unknown_code) == len(states):
+                continue
+
+            mines = self._chunk(chunk_x, chunk_y)[0]
+            index = mines.find(1)
+
+            while index != -1:
+                local_y, local_x = divmod(index, size)
+                indices.append((chunk_y * size + local_y) * width + chunk_x * size + local_x)
+                index = mines.find(1, index + 1)
+
+        return indices
+
+    def _flood_fill(self, start):
+        """
+        Chunks are built as the fill reaches them.
+        """
+        size = self.chunk_size
+        width = self.width
+        height = self.height
+        revealed_codes = [STATE_CODES[state] for state in REVEALED_STATES]
+
+        revealed = []
+        stack = [start]
+        queued = {start}        # Cells that have already been looked at
+
+        while stack:
+            index = stack.pop()
+            y, x = divmod(index, width)
+            chunk_x, local_x = divmod(x, size)
+            chunk_y, local_y = divmod(y, size)
+            local = local_y * size + local_x
+
+            # Cells reached by the fill are always unknown and safe so the counters can be updated in bulk below
+            neighbor_mines = self._chunk(chunk_x, chunk_y)[1][local]
+            self._chunk_states(chunk_x, chunk_y)[local] = revealed_codes[neighbor_mines]
+            revealed.append(index)
+
+            if neighbor_mines == 0:
+                for neighbor_y in range(max(y - 1, 0), min(y + 2, height)):
+                    for neighbor_x in range(max(x - 1, 0), min(x + 2, width)):
+                        neighbor = neighbor_y * width + neighbor_x
+
+                        if neighbor not in queued:
+                            queued.add(neighbor)
+
+                            if self.get_state(neighbor_x, neighbor_y) == CellState.UNKNOWN:
+                                stack.append(neighbor)
+
+        self._unknown_safe -= len(revealed)
+        return revealed
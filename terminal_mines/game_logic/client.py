@@ -0,0 +1,145 @@
+"""
+A thin client for the game server. Keeps a copy of the board built from the server's responses that the renderers can
+draw just like a local Minefield.
+"""
+
+import socket
+
+from .game_model import Cell, GameState, STATES, STATE_CODES
+from .server import ENCODING, WRONG_FLAG
+
+# The state code of each character used by the protocol
+CHAR_CODES = {state.value: code for state, code in STATE_CODES.items()}
+CHAR_CODES[WRONG_FLAG] = CHAR_CODES["F"]
+
+GAME_STATES = {state.name.lower(): state for state in GameState}
+
+
+class RemoteBoard:
+    """
+    The client's copy of the board. Provides the parts of the Minefield interface used by the renderers.
+    """
+    def __init__(self):
+        self.width = 0
+        self.height = 0
+        self.x = 0
+        self.y = 0
+        self.state = GameState.IN_PROGRESS
+        self.flags_remaining = 0
+        self.message = None
+
+        self.codes = bytearray()
+        self.wrong_flags = set()    # The cords of the incorrectly placed flags, which are only known once the game ends
+
+    def __repr__(self):
+        return "{}({}, {})".format(type(self).__name__, self.width, self.height)
+
+    def get_state(self, x, y):
+        return STATES[self.codes[y * self.width + x]]
+
+    def get_cell(self, x, y):
+        cell = Cell((x, y) not in self.wrong_flags)
+        cell.state = self.get_state(x, y)
+        return cell
+
+    def row_codes(self, y, start=0, stop=None):
+        if stop is None:
+            stop = self.width
+
+        return bytes(self.codes[y * self.width + start:y * self.width + stop])
+
+    def set_cell(self, x, y, char):
+        self.codes[y * self.width + x] = CHAR_CODES[char]
+
+        if char == WRONG_FLAG:
+            self.wrong_flags.add((x, y))
+
+    def apply(self, response):
+        """
+        Updates the board from a line sent by the server.
+
+        :raises ValueError: If the server reported an error.
+        :return: A list of the cords of the cells that changed, or None if the whole board was replaced.
+        """
+        kind, _, rest = response.partition(" ")
+        words = rest.split()
+
+        if kind == "board":
+            self.width, self.height, self.x, self.y = map(int, words[:4])
+            self.state = GAME_STATES[words[4]]
+            self.flags_remaining = int(words[5])
+            cells = words[6] if len(words) > 6 else ""
+
+            self.codes = bytearray(CHAR_CODES[char] for char in cells)
+            self.wrong_flags = set()
+
+            for index, char in enumerate(cells):
+                if char == WRONG_FLAG:
+                    self.wrong_flags.add((index % self.width, index // self.width))
+
+            return None
+        elif kind == "cursor":
+            self.x, self.y = map(int, words)
+            return []
+        elif kind == "update":
+            self.state = GAME_STATES[words[0]]
+            self.flags_remaining = int(words[1])
+            changed = []
+
+            for cell in words[2:]:
+                x, y, char = cell.split(",")
+                x, y = int(x), int(y)
+                self.set_cell(x, y, char)
+                changed.append((x, y))
+
+            return changed
+        else:
+            raise ValueError(rest if kind == "error" else "unexpected response from the server: {}".format(response))
+
+
+class RemoteGame:
+    """
+    A connection to a game server along with the client's copy of the board.
+    """
+    def __init__(self, host, port, timeout=None):
+        self.socket = socket.create_connection((host, port), timeout)
+        self.stream = self.socket.makefile("rw", encoding=ENCODING, newline="\n")
+        self.board = RemoteBoard()
+        self.board.apply(self.receive())
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, self.board)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def command(self, line):
+        """
+        Sends a command and applies the server's response to the board.
+
+        :return: A list of the cords of the cells that changed, or None if the whole board was replaced.
+        """
+        self.stream.write(line + "\n")
+        self.stream.flush()
+        return self.board.apply(self.receive())
+
+    def receive(self):
+        line = self.stream.readline()
+
+        if not line:
+            raise ConnectionError("the server closed the connection")
+
+        return line.rstrip("\n")
+
+    def close(self):
+        try:
+            self.stream.write("quit\n")
+            self.stream.flush()
+        except OSError:
+            pass
+        finally:
+            self.stream.close()
+            self.socket.close()
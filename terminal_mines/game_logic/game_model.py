@@ -2,8 +2,10 @@
 Models the game state and exposes functions for manipulating it.
 """
 
+from array import array
 from enum import Enum
-from random import randint
+from random import Random
+from weakref import WeakSet
 
 
 class CellState(Enum):
@@ -39,14 +41,226 @@ class Cell:
         return "{}({}, {})".format(type(self).__name__, self.is_mine, self.state.value)
 
 
-class Minefield:
+# The state a safe cell takes when revealed, indexed by the number of neighboring mines
+REVEALED_STATES = (CellState.SAFE, CellState.WARN1, CellState.WARN2, CellState.WARN3, CellState.WARN4, CellState.WARN5,
+                   CellState.WARN6, CellState.WARN7, CellState.WARN8)
+
+# Cell states are stored as small integer codes by the compact storage backends
+STATES = tuple(CellState)
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+
+
+class CellView:
     """
-    Stores the state of the game and the position of the cursor. Provides functions for interacting with the game.
+    A lightweight stand-in for Cell used by the compact storage backends. Reads and writes go straight through to the
+    backend so no per-cell objects need to be kept around.
+    """
+    __slots__ = ("_storage", "_index")
+
+    def __init__(self, storage, index):
+        self._storage = storage
+        self._index = index
+
+    @property
+    def is_mine(self):
+        return bool(self._storage.is_mine(self._index))
+
+    @property
+    def state(self):
+        return self._storage.get_state(self._index)
+
+    @state.setter
+    def state(self, state):
+        self._storage.set_state(self._index, state)
+
+    def __repr__(self):
+        return "{}({}, {})".format(type(self).__name__, self.is_mine, self.state.value)
+
+
+class ObjectStorage:
+    """
+    The original representation. Keeps one Cell object per cell in a flat list.
+    """
+    def __init__(self, mine_bitmap):
+        self.cells = [Cell(bool(is_mine)) for is_mine in mine_bitmap]
+
+    def is_mine(self, index):
+        return self.cells[index].is_mine
+
+    def get_state(self, index):
+        return self.cells[index].state
+
+    def set_state(self, index, state):
+        self.cells[index].state = state
+
+    def cell(self, index):
+        return self.cells[index]
+
+    def state_codes(self, start, stop):
+        return bytes(STATE_CODES[cell.state] for cell in self.cells[start:stop])
+
+    def set_state_codes(self, codes):
+        for cell, code in zip(self.cells, codes):
+            cell.state = STATES[code]
+
+    def mine_bitmap(self):
+        return bytes(cell.is_mine for cell in self.cells)
+
+
+class ArrayStorage:
+    """
+    Keeps the mine bits and cell states in flat bytearrays. Cells are handed out as CellView instances.
+    """
+    def __init__(self, mine_bitmap):
+        self.mines = mine_bitmap                    # Used as is rather than copied
+        self.states = bytearray(len(mine_bitmap))   # Code 0 is CellState.UNKNOWN
+
+    def is_mine(self, index):
+        return self.mines[index] == 1
+
+    def get_state(self, index):
+        return STATES[self.states[index]]
+
+    def set_state(self, index, state):
+        self.states[index] = STATE_CODES[state]
+
+    def cell(self, index):
+        return CellView(self, index)
+
+    def state_codes(self, start, stop):
+        return bytes(self.states[start:stop])
+
+    def set_state_codes(self, codes):
+        self.states[:] = codes
+
+    def mine_bitmap(self):
+        return bytes(self.mines)
+
+
+class NumpyStorage(ArrayStorage):
+    """
+    Same layout as ArrayStorage but backed by NumPy arrays. Requires the optional numpy dependency.
+    """
+    def __init__(self, mine_bitmap):
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("the numpy storage backend requires numpy to be installed")
+
+        self.mines = numpy.frombuffer(mine_bitmap, dtype=numpy.uint8)
+        self.states = numpy.zeros(len(mine_bitmap), dtype=numpy.uint8)
+
+    def state_codes(self, start, stop):
+        return self.states[start:stop].tobytes()
+
+    def set_state_codes(self, codes):
+        import numpy
+        self.states[:] = numpy.frombuffer(codes, dtype=numpy.uint8)
+
+    def mine_bitmap(self):
+        return self.mines.tobytes()
+
+
+class OverlayStorage:
+    """
+    Copy-on-write cell states layered over another backend, which is shared rather than copied. Used by
+    Minefield.fork(). Only the cells written through this overlay, or preserved by the minefield that owns the base
+    before it overwrites them, are held here.
     """
-    def __init__(self, width, height, mines):
+    def __init__(self, base):
+        self.base = base
+        self.states = {}        # Maps cell indices to state codes
+
+    def __repr__(self):
+        return "{}({} cells)".format(type(self).__name__, len(self.states))
+
+    def is_mine(self, index):
+        return self.base.is_mine(index)
+
+    def get_state(self, index):
+        code = self.states.get(index)
+        return self.base.get_state(index) if code is None else STATES[code]
+
+    def set_state(self, index, state):
+        self.states[index] = STATE_CODES[state]
+
+    def cell(self, index):
+        return CellView(self, index)
+
+    def state_codes(self, start, stop):
+        codes = bytearray(self.base.state_codes(start, stop))
+        states = self.states
+
+        # Look through whichever of the overlay or the range is smaller
+        if len(states) < stop - start:
+            for index, code in states.items():
+                if start <= index < stop:
+                    codes[index - start] = code
+        else:
+            for index in range(start, stop):
+                code = states.get(index)
+                if code is not None:
+                    codes[index - start] = code
+
+        return bytes(codes)
+
+    def set_state_codes(self, codes):
+        self.states = dict(enumerate(codes))
+
+    def mine_bitmap(self):
+        return self.base.mine_bitmap()
+
+    def keep(self, indices, code=None):
         """
-        The mines arg must be a set of strings of the form "x,y".
+        Copies the base's state for each of the given cells into the overlay, unless the overlay already has one, so
+        that the base can be written to without the change showing through. The code arg can be given when every
+        cell's current state is already known.
         """
+        states = self.states
+        base = self.base
+
+        for index in indices:
+            if index not in states:
+                states[index] = STATE_CODES[base.get_state(index)] if code is None else code
+
+
+STORAGE_BACKENDS = {
+    "objects": ObjectStorage,
+    "array": ArrayStorage,
+    "numpy": NumpyStorage
+}
+
+
+class Delta:
+    """
+    One entry in a Minefield's journal. Holds the move that was made, the indices of the cells it changed along with
+    their state codes beforehand, the counters and game state from before the move, and the board's versions before
+    and after it. The indices are kept in an array and the codes in a bytes object so that a big reveal costs a few
+    bytes per cell.
+    """
+    __slots__ = ("move", "x", "y", "indices", "before", "counters", "versions")
+
+    def __init__(self, move, x, y, indices, before, counters, versions):
+        self.move = move
+        self.x = x
+        self.y = y
+        self.indices = indices
+        self.before = before
+        self.counters = counters
+        self.versions = versions
+
+    def __repr__(self):
+        return "{}({}, {}, {}, {} cells)".format(type(self).__name__, self.move.__name__, self.x, self.y,
+                                                 len(self.indices))
+
+
+class BaseMinefield:
+    """
+    The parts of a minefield shared by Minefield and ChunkedMinefield: the cursor, the running counters, the moves and
+    the journal that lets them be undone. Cells are addressed by their index, y * width + x, and subclasses store them
+    by implementing _mine_at(), _state_at(), _write_state(), _mine_indices() and _flood_fill().
+    """
+    def __init__(self, width, height, num_mines):
         self.width = width
         self.height = height
 
@@ -54,45 +268,48 @@ class Minefield:
         self.y = 0      # The y cord of the currently selected cell
         self.state = GameState.IN_PROGRESS
 
-        self.rows = [[Cell("{},{}".format(x, y) in mines) for x in range(width)] for y in range(height)]
+        # Running counters so that the flag count and win checks don't need to scan the board
+        self._num_mines = num_mines
+        self._num_flags = 0
+        self._correct_flags = 0
+        self._unknown_safe = width * height - num_mines
+
+        self._journal = []          # Delta instances for the moves that can be undone, oldest first
+        self._undone = []           # Delta instances for the moves that can be redone, most recently undone last
+        self._journaling = True
+        self._index_typecode = _index_typecode(width * height)
+        self._version = 0
+        self._last_version = 0      # The highest version handed out so far
 
         self.beta = False        # Enable beta features if set to True
+        self.message = None      # Shown on the status line, such as a hint
 
     def __repr__(self):
         return "{}({}, {})".format(type(self).__name__, self.width, self.height)
 
     @property
-    def cells(self):
-        """
-        Iterates over all cells from left to right followed by top to bottom. Yields the cell object.
-        """
-        for row in self.rows:
-            for cell in row:
-                yield cell
-
-    @property
-    def cords_and_cells(self):
+    def rows(self):
         """
-        Iterates over all cells from left to right followed by top to bottom. Yields a tuple of x pos, y pos, and the
-        cell object.
+        A list of rows where each row is a list of cells. Built on demand; prefer get_cell() for single lookups.
         """
-        for y in range(self.height):
-            for x in range(self.width):
-                yield x, y, self.rows[y][x]
+        return [[self.get_cell(x, y) for x in range(self.width)] for y in range(self.height)]
 
     @property
     def num_mines(self):
-        return len([cell for cell in self.cells if cell.is_mine])
+        return self._num_mines
 
     @property
     def flags_remaining(self):
-        return self.num_mines - len([cell for cell in self.cells if cell.state == CellState.FLAGGED])
+        return self._num_mines - self._num_flags
 
-    def get_cell(self, x, y):
-        if 0 <= x < self.width and 0 <= y < self.height:
-            return self.rows[y][x]
-        else:
-            raise IndexError
+    @property
+    def unknown_cells(self):
+        """
+        The number of cells still in the unknown state. Taken from the running counters so it costs nothing to check.
+        """
+        # Every mine that wasn't flagged explodes when the game is lost
+        unknown_mines = 0 if self.state == GameState.LOST else self._num_mines - self._correct_flags
+        return self._unknown_safe + unknown_mines
 
     def neighboring_cords(self, x, y):
         """
@@ -112,75 +329,752 @@ class Minefield:
         for neighbor_x, neighbor_y in self.neighboring_cords(x, y):
             yield self.get_cell(neighbor_x, neighbor_y)
 
-    def reveal_cell(self, x, y, recursing=False):
+    def _mine_at(self, index):
+        raise NotImplementedError
+
+    def _state_at(self, index):
+        """
+        :return: The CellState of the cell at the given index.
+        """
+        raise NotImplementedError
+
+    def _write_state(self, index, state):
+        """
+        Stores the state of a cell without touching the running counters.
+        """
+        raise NotImplementedError
+
+    def _mine_indices(self):
+        """
+        :return: The indices of the mines exposed when the game is lost.
+        """
+        raise NotImplementedError
+
+    def _flood_fill(self, start):
+        """
+        Reveals the safe cell at the given index along with every cell reachable from it through cells that have no
+        neighboring mines, and takes the revealed cells off the running counters.
+
+        :return: A list of the indices that were revealed.
+        """
+        raise NotImplementedError
+
+    def _explode_mines(self):
+        """
+        Marks every unknown mine returned by _mine_indices() as exploded when the game is lost. Unknown and exploded
+        mines both leave the running counters alone so they aren't touched.
+
+        :return: A list of the indices that were changed.
+        """
+        changed = []
+
+        for index in self._mine_indices():
+            if self._state_at(index) == CellState.UNKNOWN:
+                self._write_state(index, CellState.EXPLODED)
+                changed.append(index)
+
+        return changed
+
+    def _set_state(self, index, state):
+        """
+        Updates the state of a cell while keeping the running counters in sync. All state changes other than the bulk
+        reveals made by _flood_fill() go through here.
+        """
+        is_mine = self._mine_at(index)
+
+        self._count_state(self._state_at(index), is_mine, -1)
+        self._write_state(index, state)
+        self._count_state(state, is_mine, 1)
+
+    def _count_state(self, state, is_mine, delta):
+        if state == CellState.FLAGGED:
+            self._num_flags += delta
+
+            if is_mine:
+                self._correct_flags += delta
+        elif state == CellState.UNKNOWN and not is_mine:
+            self._unknown_safe += delta
+
+    def _counters(self):
+        return self._num_flags, self._correct_flags, self._unknown_safe, self.state
+
+    def _cords(self, indices):
+        width = self.width
+        return [(index % width, index // width) for index in indices]
+
+    @property
+    def version(self):
+        """
+        A number that identifies the state of the cells. Every move that changes a cell gives the board a new version,
+        while undoing or redoing a move goes back to the version the board had then, so two equal versions of a board
+        always have the same cells. Writing to a cell's state directly doesn't change it.
+        """
+        return self._version
+
+    def _new_version(self):
+        self._last_version += 1
+        return self._last_version
+
+    @property
+    def journaling(self):
         """
-        Reveals the given cell and updates the game state. Will recursively reveal other cells if the given one is safe.
+        Whether moves are recorded so that they can be undone. On by default. Games that never undo a move, such as the
+        AI's headless games, can turn it off to save the memory. Turning it off forgets the moves already recorded.
         """
-        target = self.get_cell(x, y)
+        return self._journaling
 
-        if target.state != CellState.UNKNOWN:
-            return
+    @journaling.setter
+    def journaling(self, enabled):
+        self._journaling = enabled
+
+        if not enabled:
+            self._journal = []
+            self._undone = []
+
+    def _journaled(self, move, x, y, clear_undone=True, version=None):
+        """
+        Makes a move and records what it changed in the journal, if journaling is on.
+
+        :param move: One of the unbound move functions, such as BaseMinefield._reveal().
+        :param version: The version the board takes if the move changes it. A new one is used if this is omitted.
+        :return: A list of the (x, y) cords of every cell whose state changed.
+        """
+        counters = self._counters()
+        previous = self._version
+        indices, before = move(self, x, y)
 
-        if target.is_mine:
+        if indices:
+            self._version = self._new_version() if version is None else version
+
+            if self._journaling:
+                self._journal.append(Delta(move, x, y, array(self._index_typecode, indices), before, counters,
+                                           (previous, self._version)))
+
+                if clear_undone:
+                    # A new move replaces whatever had been undone
+                    self._undone = []
+
+        return self._cords(indices)
+
+    @property
+    def can_undo(self):
+        return bool(self._journal)
+
+    @property
+    def can_redo(self):
+        return bool(self._undone)
+
+    def undo(self):
+        """
+        Reverts the last reveal or flag that changed the board, including its effect on the game state.
+
+        :return: A list of the (x, y) cords of every cell whose state changed.
+        """
+        if not self._journal:
+            return []
+
+        delta = self._journal.pop()
+        self._restore_codes(delta.indices, delta.before)
+
+        self._num_flags, self._correct_flags, self._unknown_safe, self.state = delta.counters
+        self._version = delta.versions[0]
+        self._undone.append(delta)
+        return self._cords(delta.indices)
+
+    def _restore_codes(self, indices, codes):
+        """
+        Puts back the state codes of the given cells, as recorded in a Delta, without touching the running counters.
+        """
+        write_state = self._write_state
+        for index, code in zip(indices, codes):
+            write_state(index, STATES[code])
+
+    def redo(self):
+        """
+        Makes the last undone move again. Moves are deterministic so replaying one gives back exactly what was undone.
+
+        :return: A list of the (x, y) cords of every cell whose state changed.
+        """
+        if not self._undone:
+            return []
+
+        delta = self._undone.pop()
+        return self._journaled(delta.move, delta.x, delta.y, clear_undone=False, version=delta.versions[1])
+
+    def reveal_cell(self, x, y):
+        """
+        Reveals the given cell and updates the game state. Will flood fill outwards to reveal other cells if the given
+        one is safe.
+
+        :return: A list of the (x, y) cords of every cell whose state changed.
+        """
+        return self._journaled(BaseMinefield._reveal, x, y)
+
+    def _reveal(self, x, y):
+        """
+        The move made by reveal_cell().
+
+        :return: A tuple of the list of indices changed and a bytes object of their state codes beforehand.
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError
+
+        index = y * self.width + x
+
+        if self._state_at(index) != CellState.UNKNOWN:
+            return [], b""
+
+        if self._mine_at(index):
             # Game lost; update all un-flagged mines as exploded
-            target.state = CellState.EXPLODED
-            
-            for cell in self.cells:
-                if cell.state == CellState.UNKNOWN and cell.is_mine:
-                    cell.state = CellState.EXPLODED
-                        
+            self._set_state(index, CellState.EXPLODED)
+            changed = [index] + self._explode_mines()
             self.state = GameState.LOST
         else:
-            neighbor_mines = len([cell for cell in self.neighbors(x, y) if cell.is_mine])
+            changed = self._flood_fill(index)
 
-            if neighbor_mines == 0:
-                target.state = CellState.SAFE
-
-                # Use recursion to propagate the reveal to neighboring cells
-                for neighbor_x, neighbor_y in self.neighboring_cords(x, y):
-                    self.reveal_cell(neighbor_x, neighbor_y, recursing=True)
-            else:
-                target.state = CellState(str(neighbor_mines))
-            
-            if not recursing and self.beta:
-                # Check if the game has been won, based on revealed cells instead of flags
-                for cell in self.cells:
-                    if not cell.is_mine and cell.state == CellState.UNKNOWN:
-                        return
-
-                self.state = GameState.WON 
+            if self.beta and self._unknown_safe == 0:
+                # The game has been won, based on revealed cells instead of flags
+                self.state = GameState.WON
 
+        # Only unknown cells are ever revealed and the code for CellState.UNKNOWN is 0
+        return changed, bytes(len(changed))
 
     def flag_cell(self, x, y):
         """
         Toggles a cell between the unknown and flagged states. Does nothing if called on a revealed cell or if the
         player is out of flags.
+
+        :return: A list of the (x, y) cords of every cell whose state changed.
         """
-        target = self.get_cell(x, y)
+        return self._journaled(BaseMinefield._flag, x, y)
+
+    def _flag(self, x, y):
+        """
+        The move made by flag_cell().
+
+        :return: A tuple of the list of indices changed and a bytes object of their state codes beforehand.
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError
 
-        if target.state == CellState.FLAGGED:
-            target.state = CellState.UNKNOWN
-        elif target.state == CellState.UNKNOWN and self.flags_remaining > 0:
-            target.state = CellState.FLAGGED
+        index = y * self.width + x
+        state = self._state_at(index)
 
-            if not self.beta:
-                # Check if the game has been won
-                for cell in self.cells:
-                    if cell.is_mine and cell.state != CellState.FLAGGED:
-                        return
-                    elif not cell.is_mine and cell.state == CellState.FLAGGED:
-                        return
+        if state == CellState.FLAGGED:
+            self._set_state(index, CellState.UNKNOWN)
+        elif state == CellState.UNKNOWN and self.flags_remaining > 0:
+            self._set_state(index, CellState.FLAGGED)
 
+            if not self.beta and self._correct_flags == self._num_flags == self._num_mines:
+                # Game won; every mine is flagged and no flag is misplaced
                 self.state = GameState.WON
+        else:
+            return [], b""
+
+        return [index], bytes((STATE_CODES[state],))
 
 
-def random_minefield(num_mines, width, height):
+class Minefield(BaseMinefield):
     """
-    :return: A new Minefield instance with a random set of mines.
+    Stores the state of the game and the position of the cursor. Provides functions for interacting with the game.
     """
-    mines = set()
+    def __init__(self, width, height, mines, storage="array"):
+        """
+        The mines arg must be an iterable of cell indices, where the index of a cell is y * width + x. It can also be a
+        bytearray holding a 1 for each mine and a 0 for each safe cell, which is then used as is. The storage arg
+        selects one of the backends in STORAGE_BACKENDS.
+        """
+        if isinstance(mines, bytearray) and len(mines) == width * height:
+            mine_bitmap = mines
+        else:
+            mine_bitmap = bytearray(width * height)
+            for index in mines:
+                mine_bitmap[index] = 1
+
+        super().__init__(width, height, mine_bitmap.count(1))
+
+        self._storage = STORAGE_BACKENDS[storage](mine_bitmap)
+        self._adjacent = _adjacency_counts(mine_bitmap, width, height)
+        self._forks = WeakSet()     # Forks whose overlays must be kept in sync before cells are overwritten
+
+    @property
+    def cells(self):
+        """
+        Iterates over all cells from left to right followed by top to bottom. Yields the cell object.
+        """
+        get = self._storage.cell
+
+        for index in range(self.width * self.height):
+            yield get(index)
+
+    @property
+    def cords_and_cells(self):
+        """
+        Iterates over all cells from left to right followed by top to bottom. Yields a tuple of x pos, y pos, and the
+        cell object.
+        """
+        get = self._storage.cell
+        index = 0
+
+        for y in range(self.height):
+            for x in range(self.width):
+                yield x, y, get(index)
+                index += 1
+
+    def get_cell(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self._storage.cell(y * self.width + x)
+        else:
+            raise IndexError
+
+    def get_state(self, x, y):
+        """
+        :return: The CellState of the given cell. Cheaper than get_cell() when only the state is needed.
+        """
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self._storage.get_state(y * self.width + x)
+        else:
+            raise IndexError
+
+    def row_codes(self, y, start=0, stop=None):
+        """
+        :return: A bytes object holding the state of each cell in the given row, optionally limited to the cells from
+            start up to stop, as an index into STATES.
+        """
+        if stop is None:
+            stop = self.width
+
+        if 0 <= y < self.height and 0 <= start <= stop <= self.width:
+            return self._storage.state_codes(y * self.width + start, y * self.width + stop)
+        else:
+            raise IndexError
+
+    def state_codes(self):
+        """
+        :return: A bytes object holding the state of every cell as an index into STATES, in the same order as the cell
+            indices.
+        """
+        return self._storage.state_codes(0, self.width * self.height)
+
+    def mine_bitmap(self):
+        """
+        :return: A bytes object holding a 1 for each mine and a 0 for each safe cell, in the same order as the cell
+            indices.
+        """
+        return self._storage.mine_bitmap()
+
+    def restore_cells(self, revealed, flagged):
+        """
+        Sets the state of every cell from a pair of bitmaps, each holding a 1 or 0 per cell like mine_bitmap(). Revealed
+        cells get their number back from the neighboring mines, or explode if they are mines. Used to resume a saved
+        game so the running counters are rebuilt here too.
+        """
+        # Each cell's neighbor count (0-8) plus 9 times its mine, revealed and flagged bits fits in a byte. Adding the
+        #   bitmaps as big integers combines every cell at once and the lookup table then turns the sums into states.
+        combined = int.from_bytes(self._adjacent, "little") + 9 * int.from_bytes(self.mine_bitmap(), "little") + \
+            18 * int.from_bytes(revealed, "little") + 36 * int.from_bytes(flagged, "little")
+        codes = combined.to_bytes(self.width * self.height, "little").translate(_RESTORED_CODES)
+
+        if self._forks:
+            self._preserve(range(self.width * self.height))
+
+        self._storage.set_state_codes(codes)
+        self._journal = []
+        self._undone = []
+        self._version = self._new_version()
+
+        flagged_code = STATE_CODES[CellState.FLAGGED]
+        self._num_flags = codes.count(flagged_code)
+        self._correct_flags = 0
+
+        index = codes.find(flagged_code)
+        while index != -1:
+            if self._storage.is_mine(index):
+                self._correct_flags += 1
+
+            index = codes.find(flagged_code, index + 1)
+
+        # Mines are either unknown, flagged, or exploded
+        unknown_mines = self._num_mines - self._correct_flags - codes.count(STATE_CODES[CellState.EXPLODED])
+        self._unknown_safe = codes.count(STATE_CODES[CellState.UNKNOWN]) - unknown_mines
+
+    def known_cords(self):
+        """
+        Iterates over the cords of every cell that isn't in the unknown state. Rows where nothing is known are skipped
+        without looking at each cell.
+        """
+        unknown_code = STATE_CODES[CellState.UNKNOWN]
+
+        for y in range(self.height):
+            codes = self.row_codes(y)
+
+            if codes.count(unknown_code) != len(codes):
+                for x, code in enumerate(codes):
+                    if code != unknown_code:
+                        yield x, y
+
+    def _mine_at(self, index):
+        return self._storage.is_mine(index)
+
+    def _state_at(self, index):
+        return self._storage.get_state(index)
+
+    def _write_state(self, index, state):
+        if self._forks:
+            self._preserve((index,))
 
-    while len(mines) != num_mines:
-        mines.add("{},{}".format(randint(0, width - 1), randint(0, height - 1)))
+        self._storage.set_state(index, state)
 
-    return Minefield(width, height, mines)
+    def _restore_codes(self, indices, codes):
+        if self._forks:
+            self._preserve(indices)
+
+        set_state = self._storage.set_state
+        for index, code in zip(indices, codes):
+            set_state(index, STATES[code])
+
+    def _mine_indices(self):
+        mines = self.mine_bitmap()
+        indices = []
+
+        index = mines.find(1)
+        while index != -1:
+            indices.append(index)
+            index = mines.find(1, index + 1)
+
+        return indices
+
+    def _explode_mines(self):
+        """
+        Works on the whole board at once. The unknown mines are picked out by combining the mine bitmap with the state
+        codes as big integers, and all of them are written back in one go.
+        """
+        size = self.width * self.height
+        codes = self.state_codes()
+
+        # The code for CellState.UNKNOWN is 0, so adding the exploded code to each unknown mine's code replaces it
+        unknown_mines = int.from_bytes(self.mine_bitmap(), "little") & \
+            int.from_bytes(codes.translate(_UNKNOWN_BITS), "little")
+        exploded = unknown_mines.to_bytes(size, "little")
+        changed = []
+
+        index = exploded.find(1)
+        while index != -1:
+            changed.append(index)
+            index = exploded.find(1, index + 1)
+
+        if self._forks:
+            self._preserve(changed, STATE_CODES[CellState.UNKNOWN])
+
+        if isinstance(self._storage, OverlayStorage):
+            # A fork only holds the cells it changed, so they are written one by one rather than as a whole board
+            set_state = self._storage.set_state
+            for index in changed:
+                set_state(index, CellState.EXPLODED)
+        elif changed:
+            combined = int.from_bytes(codes, "little") + STATE_CODES[CellState.EXPLODED] * unknown_mines
+            self._storage.set_state_codes(combined.to_bytes(size, "little"))
+
+        return changed
+
+    def _preserve(self, indices, code=None):
+        """
+        Hands the current state of the given cells to every live fork before the cells are overwritten.
+        """
+        for fork in self._forks:
+            fork._storage.keep(indices, code)
+
+    def fork(self):
+        """
+        :return: A new Minefield that starts out identical to this one and can then be played independently. The mines
+            and neighbor counts are shared while cell states are copied on write, so forking is cheap on any size of
+            board. Changes to either board never show through to the other. The fork starts with an empty journal.
+        """
+        fork = Minefield.__new__(Minefield)
+        BaseMinefield.__init__(fork, self.width, self.height, self._num_mines)
+        fork.x = self.x
+        fork.y = self.y
+        fork.state = self.state
+        fork.beta = self.beta
+        fork.journaling = self._journaling
+
+        fork._storage = OverlayStorage(self._storage)
+        fork._adjacent = self._adjacent
+        fork._num_flags, fork._correct_flags, fork._unknown_safe, _ = self._counters()
+        fork._forks = WeakSet()
+
+        self._forks.add(fork)
+        return fork
+
+    def _flood_fill(self, start):
+        """
+        Uses an explicit stack so that large open areas can't overflow the recursion limit.
+        """
+        storage = self._storage
+        get_state = storage.get_state
+        set_state = storage.set_state
+        adjacent = self._adjacent
+        width = self.width
+        height = self.height
+        unknown = CellState.UNKNOWN
+
+        revealed = []
+        stack = [start]
+        queued = {start}        # Cells that have already been looked at
+
+        while stack:
+            index = stack.pop()
+
+            # Cells reached by the fill are always unknown and safe so the counters can be updated in bulk below
+            neighbor_mines = adjacent[index]
+            set_state(index, REVEALED_STATES[neighbor_mines])
+            revealed.append(index)
+
+            if neighbor_mines == 0:
+                y, x = divmod(index, width)
+                min_x = max(x - 1, 0)
+                max_x = min(x + 2, width)
+
+                for neighbor_y in range(max(y - 1, 0), min(y + 2, height)):
+                    row_start = neighbor_y * width
+
+                    for neighbor in range(row_start + min_x, row_start + max_x):
+                        if neighbor not in queued:
+                            queued.add(neighbor)
+
+                            if get_state(neighbor) == unknown:
+                                stack.append(neighbor)
+
+        self._unknown_safe -= len(revealed)
+
+        if self._forks:
+            self._preserve(revealed, STATE_CODES[unknown])
+
+        return revealed
+
+
+def _index_typecode(size):
+    """
+    :return: The typecode of the narrowest array that can hold the index of every cell on a board of the given size.
+    """
+    for typecode in ("H", "I", "L", "Q"):
+        if size <= 1 << (8 * array(typecode).itemsize):
+            return typecode
+
+    raise ValueError("a board of {} cells is too big to index".format(size))
+
+
+def _restored_code(combined):
+    neighbor_mines, bits = combined % 9, combined // 9
+
+    if bits & 4:
+        return STATE_CODES[CellState.FLAGGED]
+    elif bits & 2:
+        return STATE_CODES[CellState.EXPLODED if bits & 1 else REVEALED_STATES[neighbor_mines]]
+    else:
+        return STATE_CODES[CellState.UNKNOWN]
+
+
+# Maps the sums built by Minefield.restore_cells() to state codes
+_RESTORED_CODES = bytes(_restored_code(combined) for combined in range(256))
+
+# Maps state codes to 1 for CellState.UNKNOWN and 0 for every other state
+_UNKNOWN_BITS = bytes(int(code == STATE_CODES[CellState.UNKNOWN]) for code in range(256))
+
+
+def _adjacency_counts(mine_bitmap, width, height, band_rows=256):
+    """
+    Counts the neighboring mines of every cell. Each band of rows is packed into one big integer and the 8 neighbor
+    offsets are summed with shifts. No count is above 8 so the bytes never carry into each other.
+
+    :return: A bytearray holding the number of neighboring mines for each cell.
+    """
+    counts = bytearray(width * height)
+    padded_width = width + 2
+    offsets = (1, padded_width - 1, padded_width, padded_width + 1)
+
+    for band_start in range(0, height, band_rows):
+        band_stop = min(band_start + band_rows, height)
+
+        # Copy the band plus a row above and below it, with an empty column on both sides of every row
+        padded = bytearray(padded_width * (band_stop - band_start + 2))
+        for y in range(max(band_start - 1, 0), min(band_stop + 1, height)):
+            padded_start = (y - band_start + 1) * padded_width + 1
+            padded[padded_start:padded_start + width] = mine_bitmap[y * width:(y + 1) * width]
+
+        packed = int.from_bytes(padded, "little")
+        total = 0
+        for offset in offsets:
+            total += (packed >> (8 * offset)) + (packed << (8 * offset))
+
+        total = total.to_bytes(len(padded) + padded_width + 1, "little")
+        for y in range(band_start, band_stop):
+            padded_start = (y - band_start + 1) * padded_width + 1
+            counts[y * width:(y + 1) * width] = total[padded_start:padded_start + width]
+
+    return counts
+
+
+def load_mines(mines_file, width, height, chunk_size=1 << 20):
+    """
+    Reads a mines file where each line is of the form "<x>,<y>". The file is read in chunks and each chunk is parsed in
+    one go when possible, with NumPy if it is installed. Blank lines and mines outside the bounds of the board are
+    skipped.
+
+    :raises ValueError: If a line isn't of the expected form. The message includes the line number.
+    :return: A bytearray mine bitmap suitable for Minefield.
+    """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    mine_bitmap = bytearray(width * height)
+    line_number = 1
+    leftover = ""
+
+    for chunk in iter(lambda: mines_file.read(chunk_size), ""):
+        # Only parse complete lines; the rest is carried over to the next chunk
+        block, newline, leftover = (leftover + chunk).rpartition("\n")
+
+        if newline:
+            line_number += _parse_mines_block(block, line_number, width, height, mine_bitmap, numpy)
+
+    _parse_mines_block(leftover, line_number, width, height, mine_bitmap, numpy)
+    return mine_bitmap
+
+
+def _parse_mines_block(block, first_line_number, width, height, mine_bitmap, numpy=None):
+    """
+    Parses a block of complete lines from a mines file and sets the mines in the given bitmap.
+
+    :param numpy: The numpy module, if it is installed.
+    :return: The number of lines in the block.
+    """
+    # Only loaded for mines files since importing it compiles the JSON scanner's regular expressions
+    import json
+
+    num_lines = block.count("\n") + 1
+
+    try:
+        # Fast path; if every line is a single pair of plain integers the block can be parsed as one array
+        if block.translate(_DIGITS_REMOVED) != ",\n" * (num_lines - 1) + ",":
+            raise ValueError
+
+        if numpy is not None:
+            _parse_numpy_block(block, num_lines, width, height, mine_bitmap, numpy)
+            return num_lines
+
+        numbers = json.loads("[" + block.replace("\n", ",") + "]")
+        xs = numbers[0::2]
+        ys = numbers[1::2]
+    except ValueError:
+        # Slow path; parse each line on its own so that padding is tolerated and errors can be pinpointed
+        xs = []
+        ys = []
+
+        for line_number, line in enumerate(block.split("\n"), first_line_number):
+            line = line.strip()
+
+            if line:
+                try:
+                    x, y = map(int, line.split(","))
+                except ValueError:
+                    raise ValueError("line {}: expected \"<x>,<y>\" but found {}".format(line_number, repr(line)))
+
+                xs.append(x)
+                ys.append(y)
+
+    if xs and (min(xs) < 0 or max(xs) >= width or min(ys) < 0 or max(ys) >= height):
+        indices = (y * width + x for x, y in zip(xs, ys) if 0 <= x < width and 0 <= y < height)
+    else:
+        indices = (y * width + x for x, y in zip(xs, ys))
+
+    for index in indices:
+        mine_bitmap[index] = 1
+
+    return num_lines
+
+
+def _parse_numpy_block(block, num_lines, width, height, mine_bitmap, numpy):
+    """
+    Parses a block that has passed the fast path's check with NumPy and sets the mines in the given bitmap.
+
+    :raises ValueError: If the block doesn't hold two numbers per line, such as when a minus sign is out of place, so
+        that the slow path can find the line at fault.
+    """
+    numbers = numpy.fromstring(block.replace("\n", ","), dtype=numpy.int64, sep=",")
+    if len(numbers) != 2 * num_lines:
+        raise ValueError
+
+    xs = numbers[0::2]
+    ys = numbers[1::2]
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+
+    # A view of the bytearray, so the mines are written straight into it
+    numpy.frombuffer(mine_bitmap, dtype=numpy.uint8)[ys[inside] * width + xs[inside]] = 1
+
+
+_DIGITS_REMOVED = str.maketrans("", "", "0123456789-")
+
+
+def _random_mine_bitmap(num_mines, size, rng):
+    """
+    Picks num_mines of size cells uniformly at random without visiting each cell in Python. Every cell gets a random
+    byte as its key and the cells with the smallest keys become mines: all of the cells whose key is below a threshold,
+    plus a random sample of the cells whose key equals it. Each pass over the keys is a bytes method running in C, so a
+    board of 100M cells takes a second or two rather than the best part of a minute that sampling its indices takes.
+
+    :param rng: A random.Random instance.
+    :raises ValueError: If there are more mines than cells.
+    :return: A bytearray holding a 1 for each mine and a 0 for each safe cell.
+    """
+    if not 0 <= num_mines <= size:
+        raise ValueError("{} mines cannot fit in {} cells".format(num_mines, size))
+
+    keys = bytearray(size)
+    for start in range(0, size, _KEY_BLOCK):
+        stop = min(start + _KEY_BLOCK, size)
+        keys[start:stop] = rng.getrandbits(8 * (stop - start)).to_bytes(stop - start, "little")
+
+    below = {}      # Maps thresholds to the bitmap of the keys below them
+
+    def count_below(threshold):
+        if threshold not in below:
+            below[threshold] = keys.translate(_KEYS_BELOW[threshold])
+
+        return below[threshold].count(1)
+
+    # Find the highest threshold with no more than num_mines keys below it, starting from the expected one
+    threshold = min(num_mines * 256 // size, 255) if size else 0
+    while count_below(threshold) > num_mines:
+        threshold -= 1
+    while threshold < 255 and count_below(threshold + 1) <= num_mines:
+        threshold += 1
+
+    mine_bitmap = below[threshold]
+    ties = []
+    index = keys.find(threshold)
+
+    while index != -1:
+        ties.append(index)
+        index = keys.find(threshold, index + 1)
+
+    for index in rng.sample(ties, num_mines - mine_bitmap.count(1)):
+        mine_bitmap[index] = 1
+
+    return mine_bitmap
+
+
+# The number of keys generated at a time by _random_mine_bitmap(), which keeps the big integers involved small
+_KEY_BLOCK = 1 << 20
+
+# Translates keys into a 1 for each key below the index of the table and a 0 for the rest
+_KEYS_BELOW = [bytes(1 if key < threshold else 0 for key in range(256)) for threshold in range(257)]
+
+
+def random_minefield(num_mines, width, height, storage="array", seed=None):
+    """
+    :return: A new Minefield instance with a random set of mines. Passing a seed makes the placement reproducible.
+    """
+    return Minefield(width, height, _random_mine_bitmap(num_mines, width * height, Random(seed)), storage)
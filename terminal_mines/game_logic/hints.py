@@ -0,0 +1,369 @@
+"""
+Hints for interactive play, worked out in the background so that asking for one never holds up the input loop.
+
+A worker process is handed the visible state of the board after every move and works out every cell that is certainly
+safe or certainly a mine, or the safest cell to guess when nothing is certain. The player's flags are ignored while
+doing so, so a misplaced flag can't lead to a wrong hint and is pointed out instead once its cell is known to be safe.
+The results are cached by the board's version, which means the hint is usually ready by the time the hint key is
+pressed.
+"""
+
+import asyncio
+import multiprocessing
+import random
+import signal
+from collections import OrderedDict
+
+from .game_model import Minefield, Cell, GameState, CellState, STATES, STATE_CODES
+from .probability import mine_probabilities
+from .solver import FrontierEngine
+
+UNKNOWN_CODE = STATE_CODES[CellState.UNKNOWN]
+FLAGGED_CODE = STATE_CODES[CellState.FLAGGED]
+
+# Translates state codes into the ones the worker sees, with every flag turned back into an unknown cell
+FLAGS_CLEARED = bytes(UNKNOWN_CODE if code == FLAGGED_CODE else code for code in range(256))
+
+# The number of board versions whose hints are kept. Undoing a few moves usually finds the hints still cached.
+CACHE_SIZE = 16
+
+# The kinds of hint
+REVEAL = "reveal"
+FLAG = "flag"
+UNFLAG = "unflag"
+GUESS = "guess"
+
+
+class BoardView:
+    """
+    What the player can see of a board, rebuilt from its state codes. Provides the parts of the Minefield interface
+    used by the solver engines, which can place flags on it but can't reveal cells since the mines aren't known.
+    """
+    def __init__(self, width, height, codes, num_mines):
+        self.width = width
+        self.height = height
+        self.x = 0
+        self.y = 0
+        self.state = GameState.IN_PROGRESS
+
+        self.codes = bytearray(codes)
+        self.num_mines = num_mines
+        self.num_flags = self.codes.count(FLAGGED_CODE)
+
+    def __repr__(self):
+        return "{}({}, {})".format(type(self).__name__, self.width, self.height)
+
+    @property
+    def flags_remaining(self):
+        return self.num_mines - self.num_flags
+
+    def get_state(self, x, y):
+        return STATES[self.codes[y * self.width + x]]
+
+    def get_cell(self, x, y):
+        cell = Cell(False)
+        cell.state = self.get_state(x, y)
+        return cell
+
+    def row_codes(self, y, start=0, stop=None):
+        if stop is None:
+            stop = self.width
+
+        return bytes(self.codes[y * self.width + start:y * self.width + stop])
+
+    # These only rely on the methods above so they're shared with Minefield
+    known_cords = Minefield.known_cords
+    neighboring_cords = Minefield.neighboring_cords
+
+    def flag_cell(self, x, y):
+        self.codes[y * self.width + x] = FLAGGED_CODE
+        self.num_flags += 1
+        return [(x, y)]
+
+    def reveal_cell(self, x, y):
+        raise NotImplementedError("the cells under a board view are unknown")
+
+
+class Hint:
+    """
+    A cell the player should act on, along with the chance of it being a mine.
+    """
+    __slots__ = ("x", "y", "kind", "risk")
+
+    def __init__(self, x, y, kind, risk):
+        self.x = x
+        self.y = y
+        self.kind = kind
+        self.risk = risk
+
+    def __repr__(self):
+        return "{}({}, {}, {}, {:.3f})".format(type(self).__name__, self.x, self.y, self.kind, self.risk)
+
+    def describe(self):
+        """
+        :return: The message shown on the status line for the hint.
+        """
+        if self.kind == REVEAL:
+            return "Hint: {},{} is safe".format(self.x, self.y)
+        elif self.kind == FLAG:
+            return "Hint: {},{} is a mine".format(self.x, self.y)
+        elif self.kind == UNFLAG:
+            return "Hint: the flag on {},{} is wrong".format(self.x, self.y)
+        else:
+            return "Hint: guess {},{} ({:.0%} risk)".format(self.x, self.y, self.risk)
+
+
+def deduce(view, rng=random):
+    """
+    Plays the moves that can be deduced on the view one round at a time, flagging the mines found in each round so that
+    the next can build on them.
+
+    Yields a tuple of the set of cords found to be safe and the set of cords found to be mines so far after each round.
+    """
+    engine = FrontierEngine(view, rng)
+    safe = set()
+    mines = set()
+
+    while True:
+        changed = []
+
+        for move in engine.next_moves():
+            cords = (move.x, move.y)
+
+            if move.guess or cords in safe or cords in mines:
+                continue
+            elif move.func == view.flag_cell:
+                mines.add(cords)
+                changed.extend(view.flag_cell(*cords))
+            else:
+                safe.add(cords)
+
+        yield safe, mines
+
+        # Safe cells stay unknown on the view so only new mines can lead to further deductions
+        if not changed:
+            return
+
+        engine.update(changed)
+
+
+def certain_hints(safe, mines, codes, width):
+    """
+    :return: A list of Hint instances for the cells that are certainly safe or certainly mines, leaving out the mines
+        that are already flagged.
+    """
+    hints = []
+
+    for x, y in sorted(safe):
+        hints.append(Hint(x, y, UNFLAG if codes[y * width + x] == FLAGGED_CODE else REVEAL, 0.0))
+
+    for x, y in sorted(mines):
+        if codes[y * width + x] == UNKNOWN_CODE:
+            hints.append(Hint(x, y, FLAG, 1.0))
+
+    return hints
+
+
+def compute_hints(width, height, codes, num_mines, seed=None):
+    """
+    Works out the hints for a board from its state codes. Runs in the worker process.
+
+    :return: A list of Hint instances. Either the certain moves left for the player to make, the safest guess if
+        nothing is certain, or an empty list if no cell is left unknown. Deductions stop after the first round that
+        leaves the player something to do, which on a huge board saves most of the work.
+    """
+    rng = random.Random(seed)
+    view = BoardView(width, height, codes.translate(FLAGS_CLEARED), num_mines)
+
+    if UNKNOWN_CODE not in view.codes:
+        return []
+
+    for safe, mines in deduce(view, rng):
+        hints = certain_hints(safe, mines, codes, width)
+        if hints:
+            return hints
+
+    probabilities = mine_probabilities(view, rng)
+    if probabilities is None:
+        return []
+
+    # The number of mines left can settle cells that the local reasoning couldn't. A safe interior is left to the
+    #   single hint below rather than listed cell by cell.
+    safe, mines = probabilities.certain_cells(safe_interior=False)
+    hints = certain_hints(safe, mines, codes, width)
+    if hints:
+        return hints
+
+    # The view doesn't know about the player's flags so make sure not to suggest guessing one of them
+    flagged = {cords for cords in probabilities.frontier if codes[cords[1] * width + cords[0]] == FLAGGED_CODE}
+    lowest, candidates, interior = probabilities.safest_cells(flagged)
+
+    if interior and not candidates:
+        x, y = probabilities.random_interior_cell(rng)
+
+        if codes[y * width + x] == FLAGGED_CODE:
+            unflagged = [(x, y) for x, y in probabilities.interior_cells() if codes[y * width + x] != FLAGGED_CODE]
+            x, y = rng.choice(unflagged) if unflagged else (None, None)
+
+        if x is not None:
+            certain = probabilities.exact and lowest == 0.0
+            return [Hint(x, y, REVEAL if certain else GUESS, lowest)]
+
+        # Every interior cell is flagged so the best guess left is on the frontier
+        lowest, candidates, _ = probabilities.safest_cells(flagged, interior=False)
+
+    if not candidates:
+        return []
+
+    x, y = rng.choice(candidates)
+    return [Hint(x, y, GUESS, lowest)]
+
+
+def ignore_interrupts():
+    """
+    Run in the worker process when it starts. Ctrl+C is sent to the worker along with the game, which is the one that
+    handles it by shutting the worker down.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class HintEngine:
+    """
+    Keeps the hints for a minefield up to date while it is played. The hints are worked out by a worker process after
+    every move and cached by the board's version, so looking them up never touches the cells. The cells are only
+    copied when the worker is handed a board to work on. Results that arrive after the board has changed again are
+    cached but never shown.
+
+    run() is a background task for AsyncInputLoop. Call board_changed() after every move that changed the board,
+    request() when the player asks for a hint, and dismiss() when they do anything else.
+
+    Hints need the whole visible state of the board so they aren't available on a ChunkedMinefield.
+    """
+    def __init__(self, minefield, cache_size=CACHE_SIZE):
+        self.minefield = minefield
+        self.supported = isinstance(minefield, Minefield)
+        self.cache = OrderedDict()  # Maps board versions to lists of Hint instances, least recently used first
+        self.cache_size = cache_size
+
+        self.requested = False      # Set while the player is waiting for a hint that isn't ready yet
+        self.error = None           # The error raised by the worker, if it failed
+        self.wakeup = None          # An asyncio.Event set when the board changes
+
+    def __repr__(self):
+        return "{}({}, {} cached)".format(type(self).__name__, self.minefield, len(self.cache))
+
+    def board_changed(self):
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def request(self):
+        """
+        Shows the hint for the board as it is now, moving the cursor onto its cell. If it isn't ready yet it's shown as
+        soon as it is.
+        """
+        if not self.supported:
+            self.minefield.message = "Hints aren't available on chunked boards"
+            return
+
+        hints = self.cache.get(self.minefield.version)
+
+        if hints is not None:
+            self.show(hints)
+        elif self.error is not None:
+            self.requested = False
+            self.minefield.message = "Hint failed; {}".format(self.error)
+        else:
+            self.requested = True
+            self.minefield.message = "Hint: thinking..."
+
+    def dismiss(self):
+        """
+        Hides the hint, and forgets a request that hasn't been answered, when the player does something else.
+        """
+        self.requested = False
+        self.minefield.message = None
+
+    def show(self, hints):
+        minefield = self.minefield
+        self.requested = False
+
+        if not hints:
+            minefield.message = "Hint: nothing left to reveal"
+            return
+
+        # Point out the hint closest to the cursor
+        hint = min(hints, key=lambda hint: max(abs(hint.x - minefield.x), abs(hint.y - minefield.y)))
+        minefield.x = hint.x
+        minefield.y = hint.y
+        minefield.message = hint.describe()
+
+    async def run(self, input_loop):
+        """
+        Works out the hints for the board whenever it changes, skipping any states it went through in the meantime.
+        """
+        if not self.supported:
+            return
+
+        minefield = self.minefield
+        self.wakeup = asyncio.Event()
+        self.wakeup.set()
+
+        # Unlike a ProcessPoolExecutor, a pool can be terminated without waiting for a long computation when the game
+        #   ends
+        pool = multiprocessing.Pool(1, initializer=ignore_interrupts)
+
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+
+                if minefield.state != GameState.IN_PROGRESS:
+                    continue
+
+                version = minefield.version
+
+                if version in self.cache:
+                    self.cache.move_to_end(version)
+                else:
+                    try:
+                        hints = await self.compute(pool, minefield.state_codes())
+                    except Exception as error:
+                        # Hints stay unavailable for the rest of the game rather than failing the same way again
+                        self.error = error
+
+                        if self.requested:
+                            self.request()
+                            input_loop.request_redraw([])
+
+                        return
+
+                    self.cache[version] = hints
+                    if len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+
+                if self.requested and version == minefield.version:
+                    self.show(self.cache[version])
+                    input_loop.request_redraw([])
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def compute(self, pool, codes):
+        """
+        :return: An asyncio future for the hints worked out by the pool for the given state codes.
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        def resolve(result, error):
+            if not future.done():
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+        # The callbacks run on one of the pool's threads
+        pool.apply_async(compute_hints, (self.minefield.width, self.minefield.height, codes, self.minefield.num_mines),
+                         callback=lambda result: loop.call_soon_threadsafe(resolve, result, None),
+                         error_callback=lambda error: loop.call_soon_threadsafe(resolve, None, error))
+        return future
@@ -0,0 +1,303 @@
+"""
+Generates boards that can be solved from a given first click without any guessing.
+
+Each candidate board keeps the first click and its neighbors clear so the first click always opens an area. The
+candidate is then played from that click by a solver that only makes moves it can prove are right. If the solver gets
+stuck the board is repaired by moving one of the mines it couldn't work out into the part of the board nobody has seen
+yet, and checked again. Boards that still can't be solved after a number of repairs are thrown away.
+
+Generating a board can take a while on the harder difficulties, so boards can be made in bulk by a pool of worker
+processes and kept in an on-disk pool with a file per (mines, width, height) for games to take from.
+"""
+
+import os
+import struct
+from contextlib import contextmanager
+from itertools import repeat
+from os import cpu_count
+from random import Random, getrandbits
+
+import click
+
+from .game_model import Minefield, GameState, CellState
+from .persistence import pack_bits, unpack_bits
+from .solver import ProbabilityEngine
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAX_ATTEMPTS = 1000
+MAX_REPAIRS = 20
+
+POOL_MAGIC = b"TMNG"
+POOL_VERSION = 1
+
+# magic, version, mines, width, height
+POOL_HEADER = struct.Struct("<4sBIII")
+
+# first click x, first click y; followed by the packed mine bitmap
+POOL_RECORD = struct.Struct("<II")
+
+
+class DeductionEngine(ProbabilityEngine):
+    """
+    Only makes moves that are certain. On top of the frontier reasoning it uses the exact mine probabilities, which
+    take the number of mines left into account, but it returns no moves at all where the other engines would guess.
+    """
+    def guess(self):
+        moves = super().guess()
+        return [] if any(move.guess for move in moves) else moves
+
+
+def deduce(minefield, x, y):
+    """
+    Plays a fork of the given minefield from the given first click, making only moves that are certain.
+
+    :return: The fork once it has been won, lost, or nothing more can be deduced.
+    """
+    board = minefield.fork()
+    board.journaling = False
+    engine = DeductionEngine(board)
+    engine.update(board.reveal_cell(x, y))
+
+    while board.state == GameState.IN_PROGRESS:
+        moves = engine.next_moves()
+
+        if not moves:
+            break
+
+        for move in moves:
+            if board.get_state(move.x, move.y) == CellState.UNKNOWN:
+                engine.update(move.func(move.x, move.y))
+
+    return board
+
+
+def default_first_click(width, height):
+    return width // 2, height // 2
+
+
+def opening(width, height, x, y):
+    """
+    :return: The set of indices of the given cell and its neighbors, which are kept clear of mines.
+    """
+    return {neighbor_y * width + neighbor_x
+            for neighbor_y in range(max(y - 1, 0), min(y + 2, height))
+            for neighbor_x in range(max(x - 1, 0), min(x + 2, width))}
+
+
+def repair(board, mine_bitmap, rng):
+    """
+    Moves one of the mines bordering the revealed area of a stuck board to an unknown cell away from it.
+
+    :return: True if a mine was moved or False if there was nowhere to move one to.
+    """
+    width = board.width
+    border = set()
+    known = set(board.known_cords())
+
+    for x, y in known:
+        for cords in board.neighboring_cords(x, y):
+            if cords not in known:
+                border.add(cords)
+
+    border_mines = [y * width + x for x, y in sorted(border) if mine_bitmap[y * width + x]]
+    interior = [index for index in range(width * board.height)
+                if not mine_bitmap[index] and (index % width, index // width) not in border
+                and (index % width, index // width) not in known]
+
+    if not border_mines or not interior:
+        return False
+
+    mine_bitmap[rng.choice(border_mines)] = 0
+    mine_bitmap[rng.choice(interior)] = 1
+    return True
+
+
+def no_guess_minefield(num_mines, width, height, first_click=None, rng=None, storage="array"):
+    """
+    Generates a board that can be solved from the first click without guessing.
+
+    :param first_click: The (x, y) cords of the first click. Defaults to the center of the board.
+    :param rng: A random.Random instance to make the board reproducible.
+    :raises ValueError: If the mines can't leave the first click clear or no board is found within MAX_ATTEMPTS.
+    :return: A tuple of a new Minefield instance and the cords of the first click.
+    """
+    rng = rng or Random()
+    x, y = first_click or default_first_click(width, height)
+    cleared = opening(width, height, x, y)
+    candidates = [index for index in range(width * height) if index not in cleared]
+
+    if num_mines > len(candidates):
+        raise ValueError("{} mines don't leave room for an opening on a board size of {} by {}".format(
+            num_mines, width, height))
+
+    for _ in range(MAX_ATTEMPTS):
+        mine_bitmap = bytearray(width * height)
+        for index in rng.sample(candidates, num_mines):
+            mine_bitmap[index] = 1
+
+        for _ in range(MAX_REPAIRS + 1):
+            minefield = Minefield(width, height, mine_bitmap, storage)
+            board = deduce(minefield, x, y)
+
+            if board.state == GameState.WON:
+                return minefield, (x, y)
+
+            # The opening is always revealed by now so repairs never move a mine into it
+            mine_bitmap = bytearray(mine_bitmap)
+            if not repair(board, mine_bitmap, rng):
+                break
+
+    raise ValueError("no board that can be solved without guessing was found in {} attempts".format(MAX_ATTEMPTS))
+
+
+def generate_boards(difficulty, seed, indices):
+    """
+    Generates the no-guess boards with the given indices. Each board is seeded from the seed and its index. This is
+    the unit of work handed to each worker process.
+
+    :return: A list of tuples of the packed mine bitmap and the cords of the first click.
+    """
+    boards = []
+
+    for index in indices:
+        minefield, first_click = no_guess_minefield(*difficulty, rng=Random("{}:{}".format(seed, index)))
+        boards.append((pack_bits(minefield.mine_bitmap()), first_click))
+
+    return boards
+
+
+def fill_pool(pool, count, seed=None, workers=1):
+    """
+    Generates count boards for the given BoardPool, spread across the given number of worker processes or one per CPU
+    if workers is 0. Boards are added to the pool as they are made so an interrupted run keeps what it finished.
+    """
+    if seed is None:
+        seed = getrandbits(32)
+
+    if workers == 0:
+        workers = cpu_count() or 1
+
+    difficulty = (pool.num_mines, pool.width, pool.height)
+    chunk_size = max(min(count // (workers * 8), 50), 1)
+    chunks = [range(chunk_start, min(chunk_start + chunk_size, count)) for chunk_start in range(0, count, chunk_size)]
+    args = (repeat(difficulty), repeat(seed), chunks)
+
+    if workers == 1:
+        results = map(generate_boards, *args)
+
+        for boards in results:
+            pool.add(boards)
+    else:
+        # Not loaded up front since most games just take a board from the pool
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(workers) as executor:
+            for boards in executor.map(generate_boards, *args):
+                pool.add(boards)
+
+
+@contextmanager
+def _locked(file):
+    """
+    Holds an exclusive lock on the given file for the duration of the with block, where fcntl is available.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+    try:
+        yield
+    finally:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def default_pool_directory():
+    return os.path.join(click.get_app_dir("terminal-mines"), "no-guess")
+
+
+class BoardPool:
+    """
+    An on-disk pool of no-guess boards of one size. Every board is stored as a fixed size record so that taking one
+    only reads the last record and truncates the file.
+
+    The file is locked while boards are added or taken so that several games can share a pool. Locking needs fcntl, so
+    elsewhere, such as on Windows, a pool should only be used by one process at a time.
+    """
+    def __init__(self, num_mines, width, height, directory=None):
+        self.num_mines = num_mines
+        self.width = width
+        self.height = height
+        self.directory = directory or default_pool_directory()
+        self.path = os.path.join(self.directory, "{}-{}x{}.pool".format(num_mines, width, height))
+        self.record_size = POOL_RECORD.size + (width * height + 7) // 8
+
+    def __repr__(self):
+        return "{}({}, {}, {}, {} boards)".format(type(self).__name__, self.num_mines, self.width, self.height,
+                                                   len(self))
+
+    def __len__(self):
+        try:
+            return max(os.path.getsize(self.path) - POOL_HEADER.size, 0) // self.record_size
+        except OSError:
+            return 0
+
+    def add(self, boards):
+        """
+        Appends boards of the form returned by generate_boards() to the pool.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        with open(self.path, "ab") as file, _locked(file):
+            # Seek explicitly since the position isn't moved to the end of the file until the first write
+            size = file.seek(0, os.SEEK_END)
+
+            if size == 0:
+                file.write(POOL_HEADER.pack(POOL_MAGIC, POOL_VERSION, self.num_mines, self.width, self.height))
+            elif size > POOL_HEADER.size:
+                # Drop any partly written record left by an interrupted add so that the new ones line up
+                file.truncate(size - (size - POOL_HEADER.size) % self.record_size)
+
+            for packed, (x, y) in boards:
+                file.write(POOL_RECORD.pack(x, y) + packed)
+
+    def take(self, storage="array"):
+        """
+        Removes a board from the pool.
+
+        :return: A tuple of a Minefield instance and the cords of its first click, or None if the pool is empty.
+        :raises ValueError: If the file isn't a valid pool of boards of this size.
+        """
+        if len(self) == 0:
+            return None
+
+        with open(self.path, "r+b") as file, _locked(file):
+            header = file.read(POOL_HEADER.size)
+            if header != POOL_HEADER.pack(POOL_MAGIC, POOL_VERSION, self.num_mines, self.width, self.height):
+                raise ValueError("{} is not a pool of {} by {} boards with {} mines".format(
+                    self.path, self.width, self.height, self.num_mines))
+
+            # Another game may have taken the last board since len() was checked. Any partly written record left by
+            #   an interrupted add() is past the last whole one, so it is dropped along with the board.
+            count = (os.fstat(file.fileno()).st_size - POOL_HEADER.size) // self.record_size
+            if count == 0:
+                file.truncate(POOL_HEADER.size)
+                return None
+
+            offset = POOL_HEADER.size + (count - 1) * self.record_size
+            file.seek(offset)
+            record = file.read(self.record_size)
+            file.truncate(offset)
+
+        x, y = POOL_RECORD.unpack_from(record)
+
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise ValueError("{} holds a damaged board".format(self.path))
+
+        mine_bitmap = bytearray(unpack_bits(record[POOL_RECORD.size:], self.width * self.height))
+        return Minefield(self.width, self.height, mine_bitmap, storage), (x, y)
@@ -0,0 +1,115 @@
+"""
+A lookup table of the deductions that follow from a pair of overlapping constraints.
+
+The solver compares each numbered cell with the numbered cells up to two cells away, which share some of their unknown
+neighbors. Every cell that is only next to the first number, every cell next to both, and every cell only next to the
+second number is interchangeable with the others in its group, so all that matters about the pair is the size of the
+three groups and the number of mines each number still needs. The table maps those five numbers, packed into an int
+key, to the groups that must be safe or must be mines.
+
+The table is built the first time it's needed by enumerating every way of splitting the remaining mines between the
+groups, for every pair that can occur on a board, which takes a few tens of milliseconds. Since every consistent pair
+is in the table, keys that aren't describe numbers that contradict each other, such as a number with too many flags
+around it, and the solver's general reasoning has to take over.
+
+The table is only used when the solver is asked to. Measured on expert boards it doesn't make moves any faster than
+comparing each pair directly, since pair comparison is a small part of each move.
+"""
+
+# A number's unknown neighbors can be shared with another number up to two cells away in at most 4 cells
+MAX_SHARED = 4
+
+# The bits of a table value
+ONLY_A_SAFE = 1
+ONLY_A_MINES = 2
+SHARED_SAFE = 4
+SHARED_MINES = 8
+ONLY_B_SAFE = 16
+ONLY_B_MINES = 32
+
+_table = None
+
+
+def pattern_key(only_a, shared, only_b, remaining_a, remaining_b):
+    """
+    :return: The table key for a pair of constraints, or None if the numbers are out of range.
+    """
+    if not (0 <= remaining_a <= 8 and 0 <= remaining_b <= 8):
+        return None
+
+    return only_a | shared << 4 | only_b << 8 | remaining_a << 12 | remaining_b << 16
+
+
+def deduce_pattern(only_a, shared, only_b, remaining_a, remaining_b):
+    """
+    Enumerates every number of mines the shared group can hold and works out which groups are the same in all of them.
+
+    :return: The bits of the groups that are forced, or None if the constraints contradict each other.
+    """
+    splits = [(remaining_a - mines, mines, remaining_b - mines) for mines in range(shared + 1)
+              if 0 <= remaining_a - mines <= only_a and 0 <= remaining_b - mines <= only_b]
+
+    if not splits:
+        return None
+
+    forced = 0
+    for group, (size, safe_bit, mines_bit) in enumerate(((only_a, ONLY_A_SAFE, ONLY_A_MINES),
+                                                         (shared, SHARED_SAFE, SHARED_MINES),
+                                                         (only_b, ONLY_B_SAFE, ONLY_B_MINES))):
+        if size == 0:
+            continue
+        if all(split[group] == 0 for split in splits):
+            forced |= safe_bit
+        elif all(split[group] == size for split in splits):
+            forced |= mines_bit
+
+    return forced
+
+
+def build_table():
+    """
+    :return: A dict mapping the key of every consistent pair of overlapping constraints to the groups it forces.
+    """
+    table = {}
+
+    for shared in range(1, MAX_SHARED + 1):
+        for only_a in range(9 - shared):
+            for only_b in range(9 - shared):
+                for remaining_a in range(only_a + shared + 1):
+                    for remaining_b in range(only_b + shared + 1):
+                        forced = deduce_pattern(only_a, shared, only_b, remaining_a, remaining_b)
+
+                        if forced is not None:
+                            table[pattern_key(only_a, shared, only_b, remaining_a, remaining_b)] = forced
+
+    return table
+
+
+def forced_groups(forced, only_a, shared, only_b):
+    """
+    :return: A tuple of the set of cords that must be safe and the set of cords that must be mines, given a table value
+        and the cords in each group.
+    """
+    safe = set()
+    mines = set()
+
+    for group, safe_bit, mines_bit in ((only_a, ONLY_A_SAFE, ONLY_A_MINES), (shared, SHARED_SAFE, SHARED_MINES),
+                                       (only_b, ONLY_B_SAFE, ONLY_B_MINES)):
+        if forced & safe_bit:
+            safe |= group
+        elif forced & mines_bit:
+            mines |= group
+
+    return safe, mines
+
+
+def pattern_table():
+    """
+    :return: The table from build_table(), which is built the first time it's needed.
+    """
+    global _table
+
+    if _table is None:
+        _table = build_table()
+
+    return _table
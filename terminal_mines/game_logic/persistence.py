@@ -0,0 +1,343 @@
+"""
+Binary formats for saving and replaying games.
+
+A snapshot holds a single game as three packed bitmaps (the mines, the revealed cells and the flagged cells) behind a
+small header, optionally compressed with zlib. Everything else about the board follows from those bitmaps so a
+snapshot takes a little over 3 bits per cell. Snapshots are read through mmap so loading one doesn't copy the file.
+
+A move log is an append-only file of records. Each game starts with a record holding its packed mine bitmap, plus the
+revealed and flagged bitmaps of a game that was resumed from a snapshot, and is followed by one fixed size record per
+reveal, flag, undo or redo, stamped with the milliseconds since the game started. Any number of games can be
+appended to the same log, which keeps the AI's games cheap to archive and easy to re-run one by one.
+"""
+
+import mmap
+import struct
+import zlib
+from time import perf_counter, sleep
+
+from .game_model import Minefield, GameState, CellState, STATE_CODES
+
+SNAPSHOT_MAGIC = b"TMSS"
+LOG_MAGIC = b"TMLG"
+VERSION = 1
+
+# magic, version, flags, width, height, cursor x, cursor y, game state
+SNAPSHOT_HEADER = struct.Struct("<4sBBIIIIB")
+SNAPSHOT_COMPRESSED = 1
+SNAPSHOT_BETA = 2
+
+# magic, version
+LOG_HEADER = struct.Struct("<4sB")
+
+# Every log record starts with its kind
+GAME = 0
+REVEAL = 1
+FLAG = 2
+UNDO = 3
+REDO = 4
+
+# kind, width, height, flags, payload length
+GAME_RECORD = struct.Struct("<BIIBI")
+GAME_COMPRESSED = 1
+GAME_BETA = 2
+GAME_RESUMED = 4
+# The state of a resumed game is kept in the flags above the bits of the other flags
+GAME_STATE_SHIFT = 4
+
+# kind, x, y, milliseconds since the start of the game
+MOVE_RECORD = struct.Struct("<BIII")
+
+_BITS_TO_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+_DIGITS_TO_BITS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def pack_bits(bitmap):
+    """
+    :return: The given bitmap of 0 and 1 bytes packed into 8 cells per byte, least significant bit first.
+    """
+    if not bitmap:
+        return b""
+
+    # Parsing and formatting base 2 strings takes linear time so this is the quickest pure Python way to pack bits
+    number = int(bytes(bitmap[::-1]).translate(_BITS_TO_DIGITS), 2)
+    return number.to_bytes((len(bitmap) + 7) // 8, "little")
+
+
+def unpack_bits(data, length):
+    """
+    :return: A bytes object of the given length holding a 0 or 1 for each bit of data. The reverse of pack_bits().
+    """
+    digits = "{:b}".format(int.from_bytes(data, "little")).encode("ascii")
+    return digits.rjust(length, b"0")[::-1].translate(_DIGITS_TO_BITS)
+
+
+def _state_bitmap(codes, states):
+    """
+    :return: A bitmap holding a 1 for each of the given state codes that is one of the given states.
+    """
+    table = bytearray(256)
+    for state in states:
+        table[STATE_CODES[state]] = 1
+
+    return codes.translate(table)
+
+
+def _pack_cells(codes):
+    """
+    :return: The packed revealed and flagged bitmaps of the given state codes.
+    """
+    revealed = [state for state in CellState if state not in (CellState.UNKNOWN, CellState.FLAGGED)]
+    return pack_bits(_state_bitmap(codes, revealed)) + pack_bits(_state_bitmap(codes, (CellState.FLAGGED,)))
+
+
+def _unpack_cells(minefield, payload):
+    """
+    Restores the cells of the given minefield from the packed revealed and flagged bitmaps that make up payload.
+    """
+    size = minefield.width * minefield.height
+    packed_size = (size + 7) // 8
+    minefield.restore_cells(unpack_bits(payload[:packed_size], size), unpack_bits(payload[packed_size:], size))
+
+
+def save_snapshot(minefield, file, compress=True):
+    """
+    Writes a snapshot of the given game to a file opened in binary mode.
+    """
+    if not isinstance(minefield, Minefield):
+        raise TypeError("only Minefield boards can be saved")
+
+    payload = pack_bits(minefield.mine_bitmap()) + _pack_cells(minefield.state_codes())
+    flags = SNAPSHOT_BETA if minefield.beta else 0
+
+    if compress:
+        payload = zlib.compress(payload)
+        flags |= SNAPSHOT_COMPRESSED
+
+    file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, VERSION, flags, minefield.width, minefield.height, minefield.x,
+                                    minefield.y, minefield.state.value))
+    file.write(payload)
+
+
+def load_snapshot(file, storage="array"):
+    """
+    Reads a snapshot from a file opened in binary mode.
+
+    :raises ValueError: If the file isn't a valid snapshot.
+    :return: A Minefield instance.
+    """
+    with _map_file(file) as data:
+        if len(data) < SNAPSHOT_HEADER.size:
+            raise ValueError("the file is too short to be a snapshot")
+
+        magic, version, flags, width, height, x, y, state = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != VERSION:
+            raise ValueError("the file is not a version {} snapshot".format(VERSION))
+
+        payload = memoryview(data)[SNAPSHOT_HEADER.size:]
+        try:
+            if flags & SNAPSHOT_COMPRESSED:
+                payload = zlib.decompress(payload)
+
+            size = width * height
+            packed_size = (size + 7) // 8
+            if len(payload) != 3 * packed_size:
+                raise ValueError("the snapshot's bitmaps don't match its board size")
+
+            minefield = Minefield(width, height, bytearray(unpack_bits(payload[:packed_size], size)), storage)
+            _unpack_cells(minefield, payload[packed_size:])
+        except zlib.error as error:
+            raise ValueError("the snapshot is corrupt; {}".format(error))
+        finally:
+            # The map can't be closed while a view of it is still around
+            del payload
+
+    minefield.x = x
+    minefield.y = y
+    minefield.state = GameState(state)
+    minefield.beta = bool(flags & SNAPSHOT_BETA)
+    return minefield
+
+
+def _map_file(file):
+    try:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        raise ValueError("the file is empty")
+
+
+class MoveLog:
+    """
+    Appends games and their moves to a file opened in binary append mode. The log header is only written if the file
+    is empty, so an existing log can be added to.
+    """
+    def __init__(self, file, header=True):
+        self.file = file
+        self.start = None
+
+        if header and file.tell() == 0:
+            file.write(LOG_HEADER.pack(LOG_MAGIC, VERSION))
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, getattr(self.file, "name", "<buffer>"))
+
+    def start_game(self, minefield, compress=True):
+        """
+        Records the board of a new game. If any of its cells are already known, such as in a game loaded from a
+        snapshot, they are recorded too so the moves are replayed onto the same board. Moves recorded after this are
+        timed from this call.
+        """
+        payload = pack_bits(minefield.mine_bitmap())
+        flags = GAME_BETA if minefield.beta else 0
+
+        codes = minefield.state_codes()
+        if codes.count(STATE_CODES[CellState.UNKNOWN]) != len(codes):
+            payload += _pack_cells(codes)
+            flags |= GAME_RESUMED | minefield.state.value << GAME_STATE_SHIFT
+
+        if compress:
+            payload = zlib.compress(payload)
+            flags |= GAME_COMPRESSED
+
+        self.file.write(GAME_RECORD.pack(GAME, minefield.width, minefield.height, flags, len(payload)))
+        self.file.write(payload)
+        self.start = perf_counter()
+
+    def record(self, kind, x, y):
+        self.file.write(MOVE_RECORD.pack(kind, x, y, int((perf_counter() - self.start) * 1000)))
+
+    def append(self, data):
+        """
+        Adds games that were recorded elsewhere, for example by a MoveLog without a header writing to a buffer.
+        """
+        self.file.write(data)
+
+
+def record_moves(minefield, log):
+    """
+    Records every reveal, flag, undo or redo made on the given minefield to the log from now on, whether it is made by
+    the player or the AI. Calls that don't change the board aren't recorded.
+    """
+    def recorded(kind, func):
+        def wrapper(*cords):
+            changed = func(*cords)
+            if changed:
+                log.record(kind, *(cords or (0, 0)))
+            return changed
+
+        return wrapper
+
+    minefield.reveal_cell = recorded(REVEAL, minefield.reveal_cell)
+    minefield.flag_cell = recorded(FLAG, minefield.flag_cell)
+    minefield.undo = recorded(UNDO, minefield.undo)
+    minefield.redo = recorded(REDO, minefield.redo)
+
+
+class RecordedGame:
+    """
+    One game read back from a move log. The payload holds the packed mine bitmap, followed by the revealed and flagged
+    bitmaps if the flags include GAME_RESUMED. The moves are a list of tuples of the kind, x, y and milliseconds.
+    """
+    def __init__(self, width, height, payload, moves, flags=0):
+        self.width = width
+        self.height = height
+        self.payload = payload
+        self.moves = moves
+        self.flags = flags
+
+    def __repr__(self):
+        return "{}({}, {}, {} moves)".format(type(self).__name__, self.width, self.height, len(self.moves))
+
+    def minefield(self, storage="array"):
+        """
+        :return: A new Minefield instance as it was when the game was recorded.
+        """
+        size = self.width * self.height
+        packed_size = (size + 7) // 8
+        minefield = Minefield(self.width, self.height, bytearray(unpack_bits(self.payload[:packed_size], size)),
+                              storage)
+        minefield.beta = bool(self.flags & GAME_BETA)
+
+        if self.flags & GAME_RESUMED:
+            _unpack_cells(minefield, self.payload[packed_size:])
+            minefield.state = GameState(self.flags >> GAME_STATE_SHIFT)
+
+        return minefield
+
+
+def read_move_log(file):
+    """
+    Reads every game from a move log opened in binary mode.
+
+    :raises ValueError: If the file isn't a valid move log.
+    :return: A list of RecordedGame instances.
+    """
+    games = []
+
+    with _map_file(file) as data:
+        if len(data) < LOG_HEADER.size or LOG_HEADER.unpack_from(data) != (LOG_MAGIC, VERSION):
+            raise ValueError("the file is not a version {} move log".format(VERSION))
+
+        offset = LOG_HEADER.size
+        moves = None
+
+        try:
+            while offset < len(data):
+                kind = data[offset]
+
+                if kind == GAME:
+                    _, width, height, flags, length = GAME_RECORD.unpack_from(data, offset)
+                    offset += GAME_RECORD.size
+                    payload = data[offset:offset + length]
+                    offset += length
+
+                    if flags & GAME_COMPRESSED:
+                        payload = zlib.decompress(payload)
+
+                    if len(payload) != (3 if flags & GAME_RESUMED else 1) * ((width * height + 7) // 8):
+                        raise ValueError("the board at byte {} doesn't match its size".format(offset - length))
+
+                    moves = []
+                    games.append(RecordedGame(width, height, payload, moves, flags))
+                elif kind in (REVEAL, FLAG, UNDO, REDO) and moves is not None:
+                    moves.append(MOVE_RECORD.unpack_from(data, offset))
+                    offset += MOVE_RECORD.size
+                else:
+                    raise ValueError("unexpected record at byte {}".format(offset))
+        except (struct.error, zlib.error):
+            raise ValueError("the log is truncated or corrupt at byte {}".format(offset))
+
+    return games
+
+
+def replay_game(game, render_func=None, speed=1.0):
+    """
+    Plays the moves of a recorded game back onto a fresh board. If a render_func is given the board is drawn after
+    each move, with the original pauses between moves divided by speed.
+
+    :return: The Minefield instance after the last move.
+    """
+    minefield = game.minefield()
+    last_millis = 0
+
+    if render_func is not None:
+        render_func(minefield)
+
+    for kind, x, y, millis in game.moves:
+        if render_func is not None:
+            sleep(max(millis - last_millis, 0) / 1000 / speed)
+            last_millis = millis
+
+        if kind == UNDO:
+            changed = minefield.undo()
+        elif kind == REDO:
+            changed = minefield.redo()
+        else:
+            minefield.x = x
+            minefield.y = y
+            changed = (minefield.reveal_cell if kind == REVEAL else minefield.flag_cell)(x, y)
+
+        if render_func is not None:
+            render_func(minefield, changed)
+
+    return minefield
@@ -0,0 +1,453 @@
+"""
+Calculates how likely each unknown cell is to be a mine. Used by the AI to pick the least risky guess once nothing more
+can be deduced.
+
+The frontier (the unknown cells next to revealed numbers) is split into independent components which are solved by
+enumerating every mine configuration that satisfies their constraints. The components are then combined using the
+number of mines left on the board, which also gives the odds for the unknown cells away from the frontier.
+"""
+
+import random
+from math import exp, lgamma
+
+from .game_model import CellState, REVEALED_STATES, STATE_CODES
+
+# Components with more cells than this, or which need more search steps than EXACT_BUDGET, are sampled instead
+MAX_COMPONENT_SIZE = 40
+EXACT_BUDGET = 200000
+SAMPLES = 200
+SAMPLE_BUDGET = 5000
+
+# Probabilities are sums of floating point weights, so a cell that is certainly a mine can come out a little under 1.
+#   Probabilities this close to each other, or to 1, are treated as the same.
+TOLERANCE = 1e-9
+
+UNKNOWN_CODE = STATE_CODES[CellState.UNKNOWN]
+
+# Maps the numbered states to their number
+NUMBERED_STATES = {state: number for number, state in enumerate(REVEALED_STATES) if number}
+
+
+class SearchBudgetExceeded(Exception):
+    pass
+
+
+class ComponentSolutions:
+    """
+    The mine configurations of one frontier component, grouped by how many mines they use. counts[k] is the (relative)
+    number of configurations with k mines and cell_counts[k][i] is how many of those have a mine in cells[i].
+    """
+    def __init__(self, cells, counts, cell_counts, exact):
+        self.cells = cells
+        self.counts = counts
+        self.cell_counts = cell_counts
+        self.exact = exact
+
+    def __repr__(self):
+        return "{}({} cells, exact={})".format(type(self).__name__, len(self.cells), self.exact)
+
+
+class ProbabilityMap:
+    """
+    The chance of each unknown cell being a mine. Frontier cells are kept in a dict while the remaining unknown cells,
+    the interior, share a single probability. The interior is only counted, not listed, since it can cover most of a
+    huge board.
+    """
+    def __init__(self, minefield, frontier, interior_count, interior_probability, exact):
+        self.minefield = minefield
+        self.frontier = frontier
+        self.interior_count = interior_count
+        self.interior_probability = interior_probability
+        self.exact = exact
+
+    def __repr__(self):
+        return "{}({} frontier cells, {} interior cells)".format(type(self).__name__, len(self.frontier),
+                                                                 self.interior_count)
+
+    def probability(self, x, y):
+        if (x, y) in self.frontier:
+            return self.frontier[(x, y)]
+        else:
+            return self.interior_probability
+
+    def certain_cells(self, safe_interior=True):
+        """
+        Finds the cells that the number of mines left settles, on top of what the local reasoning can deduce. Only an
+        exact map is trusted with this.
+
+        :param safe_interior: Set to False to leave out the interior cells when they are certainly safe, since they can
+            be most of a huge board.
+        :return: A tuple of the set of cords that are certainly safe and the set of cords that are certainly mines.
+        """
+        safe = set()
+        mines = set()
+
+        if not self.exact:
+            return safe, mines
+
+        for cords, probability in self.frontier.items():
+            if probability == 0.0:
+                safe.add(cords)
+            elif probability > 1 - TOLERANCE:
+                mines.add(cords)
+
+        if self.interior_count and self.interior_probability == 0.0 and safe_interior:
+            safe.update(self.interior_cells())
+        elif self.interior_count and self.interior_probability > 1 - TOLERANCE:
+            # Every mine left is in the interior, such as mines walled in by other mines
+            mines.update(self.interior_cells())
+
+        return safe, mines
+
+    def safest_cells(self, excluded=(), interior=True):
+        """
+        Finds the cells least likely to be mines. Cells that are certainly mines are never among them.
+
+        :param excluded: Frontier cords to leave out.
+        :param interior: Set to False to leave out the interior.
+        :return: A tuple of the lowest probability, the sorted list of frontier cords with that probability, and whether
+            the interior cells have it too. The probability is None if no cell is left to choose from.
+        """
+        frontier = {cords: probability for cords, probability in self.frontier.items()
+                    if probability <= 1 - TOLERANCE and cords not in excluded}
+        has_interior = interior and self.interior_count > 0 and self.interior_probability <= 1 - TOLERANCE
+
+        if not frontier and not has_interior:
+            return None, [], False
+
+        lowest = min(list(frontier.values()) + ([self.interior_probability] if has_interior else []))
+        candidates = sorted(cords for cords, probability in frontier.items() if probability - lowest < TOLERANCE)
+        return lowest, candidates, has_interior and self.interior_probability - lowest < TOLERANCE
+
+    def is_interior(self, x, y):
+        return self.minefield.get_state(x, y) == CellState.UNKNOWN and (x, y) not in self.frontier
+
+    def interior_cells(self):
+        """
+        Iterates over the cords of the interior cells.
+        """
+        for y in range(self.minefield.height):
+            for x, code in enumerate(self.minefield.row_codes(y)):
+                if code == UNKNOWN_CODE and (x, y) not in self.frontier:
+                    yield x, y
+
+    def random_interior_cell(self, rng=random, attempts=100):
+        """
+        :return: The cords of a random interior cell. Tries random cells first since the interior is usually most of
+            the board.
+        """
+        for _ in range(attempts):
+            x = rng.randrange(self.minefield.width)
+            y = rng.randrange(self.minefield.height)
+
+            if self.is_interior(x, y):
+                return x, y
+
+        return rng.choice(list(self.interior_cells()))
+
+
+def find_constraints(minefield):
+    """
+    :return: A tuple of the list of constraints, the set of cells they cover, and the number of unknown cells not
+        touched by any of them. Each constraint is a tuple of the frozenset of unknown cords next to a revealed number
+        and how many mines they hold.
+    """
+    get_state = minefield.get_state
+    constraints = []
+    num_known = 0
+
+    for x, y in minefield.known_cords():
+        num_known += 1
+        state = get_state(x, y)
+
+        if state in NUMBERED_STATES:
+            cells = set()
+            remaining = NUMBERED_STATES[state]
+
+            for cords in minefield.neighboring_cords(x, y):
+                neighbor_state = get_state(*cords)
+
+                if neighbor_state == CellState.UNKNOWN:
+                    cells.add(cords)
+                elif neighbor_state == CellState.FLAGGED:
+                    remaining -= 1
+
+            if cells:
+                constraints.append((frozenset(cells), remaining))
+
+    frontier = set()
+    for cells, _ in constraints:
+        frontier |= cells
+
+    return constraints, frontier, minefield.width * minefield.height - num_known - len(frontier)
+
+
+def split_components(constraints):
+    """
+    Groups constraints that share cells, directly or through other constraints.
+
+    :return: A list of lists of constraints.
+    """
+    parent = {}
+
+    def find(cords):
+        while parent[cords] != cords:
+            parent[cords] = parent[parent[cords]]
+            cords = parent[cords]
+        return cords
+
+    for cells, _ in constraints:
+        roots = [find(parent.setdefault(cords, cords)) for cords in cells]
+
+        for root in roots[1:]:
+            parent[root] = roots[0]
+
+    components = {}
+    for constraint in constraints:
+        components.setdefault(find(next(iter(constraint[0]))), []).append(constraint)
+
+    return list(components.values())
+
+
+def search(cells, constraints, order, budget):
+    """
+    Depth first search over the mine configurations of the given cells that satisfy the constraints. Implemented
+    without recursion since sampled components can be large.
+
+    :param order: A function returning the list of values to try for a cell. Values are tried from the end.
+    :param budget: Raises SearchBudgetExceeded after this many steps.
+    :return: A generator yielding a list of 0/1 values (one per cell) for each valid configuration.
+    """
+    index_of = {cords: index for index, cords in enumerate(cells)}
+    cell_constraints = [[] for _ in cells]
+    need = []
+    free = []
+
+    for constraint_index, (constraint_cells, remaining) in enumerate(constraints):
+        need.append(remaining)
+        free.append(len(constraint_cells))
+
+        for cords in constraint_cells:
+            cell_constraints[index_of[cords]].append(constraint_index)
+
+    def apply(index, value, sign):
+        valid = True
+
+        for constraint_index in cell_constraints[index]:
+            free[constraint_index] -= sign
+            need[constraint_index] -= sign * value
+
+            if not 0 <= need[constraint_index] <= free[constraint_index]:
+                valid = False
+
+        return valid
+
+    values = [None] * len(cells)
+    pending = [None] * len(cells)
+    pending[0] = order()
+    index = 0
+    steps = 0
+
+    while index >= 0:
+        if values[index] is not None:
+            # Undo the value tried last time around
+            apply(index, values[index], -1)
+            values[index] = None
+
+        if not pending[index]:
+            index -= 1
+            continue
+
+        value = pending[index].pop()
+        steps += 1
+
+        if steps > budget:
+            raise SearchBudgetExceeded
+
+        values[index] = value
+
+        if apply(index, value, 1):
+            if index == len(cells) - 1:
+                yield values
+            else:
+                index += 1
+                pending[index] = order()
+
+
+def ordered_cells(constraints):
+    """
+    :return: The cells of a component ordered so that cells sharing a constraint are next to each other, which lets
+        the search prune dead ends early.
+    """
+    cells = []
+    seen = set()
+
+    for constraint_cells, _ in constraints:
+        for cords in sorted(constraint_cells):
+            if cords not in seen:
+                seen.add(cords)
+                cells.append(cords)
+
+    return cells
+
+
+def solve_component(constraints, rng=random, max_size=MAX_COMPONENT_SIZE):
+    """
+    Enumerates the mine configurations of one component. Falls back to sampling if the component is too big to
+    enumerate in a bounded amount of time.
+
+    :return: A ComponentSolutions instance.
+    """
+    cells = ordered_cells(constraints)
+
+    if len(cells) <= max_size:
+        try:
+            return tally(cells, search(cells, constraints, lambda: [1, 0], EXACT_BUDGET), True)
+        except SearchBudgetExceeded:
+            pass
+
+    # Sample configurations with randomized searches. Duplicates are dropped so that each configuration found is
+    #   weighted the same as it would be in an exact enumeration.
+    samples = set()
+
+    for _ in range(SAMPLES):
+        try:
+            for values in search(cells, constraints, lambda: rng.sample((0, 1), 2), SAMPLE_BUDGET):
+                samples.add(tuple(values))
+                break
+        except SearchBudgetExceeded:
+            pass
+
+    return tally(cells, samples, False)
+
+
+def tally(cells, configurations, exact):
+    """
+    Counts the given configurations by their number of mines.
+
+    :return: A ComponentSolutions instance.
+    """
+    counts = [0] * (len(cells) + 1)
+    cell_counts = [[0] * len(cells) for _ in counts]
+
+    for values in configurations:
+        num_mines = sum(values)
+        counts[num_mines] += 1
+
+        row = cell_counts[num_mines]
+        for index, value in enumerate(values):
+            if value:
+                row[index] += 1
+
+    # Trim mine counts that no configuration uses
+    while len(counts) > 1 and counts[-1] == 0:
+        counts.pop()
+        cell_counts.pop()
+
+    return ComponentSolutions(cells, counts, cell_counts, exact)
+
+
+def convolve(first, second):
+    """
+    :return: The distribution of the total number of mines given two distributions indexed by mine count.
+    """
+    result = [0.0] * (len(first) + len(second) - 1)
+
+    for first_mines, first_weight in enumerate(first):
+        if first_weight:
+            for second_mines, second_weight in enumerate(second):
+                result[first_mines + second_mines] += first_weight * second_weight
+
+    return result
+
+
+def log_choose(n, k):
+    return lgamma(n + 1) - lgamma(k + 1) - lgamma(n - k + 1)
+
+
+def mine_probabilities(minefield, rng=random, cache=None, max_component_size=MAX_COMPONENT_SIZE):
+    """
+    Calculates the chance of each unknown cell being a mine. Assumes that every flag on the board is correct.
+
+    :param cache: An optional dict used to remember the solutions of components between calls.
+    :return: A ProbabilityMap instance or None if the board's constraints can't be satisfied.
+    """
+    constraints, _, interior_count = find_constraints(minefield)
+    mines_left = minefield.flags_remaining
+
+    solutions = []
+    for component in split_components(constraints):
+        key = frozenset(component)
+
+        if cache is not None and key in cache:
+            solution = cache[key]
+        else:
+            solution = solve_component(component, rng, max_component_size)
+
+            if cache is not None and solution.exact:
+                cache[key] = solution
+
+        if not any(solution.counts):
+            return None
+
+        solutions.append(solution)
+
+    # Scale each component's counts to sum to 1 so that the products below can't overflow
+    weights = []
+    for solution in solutions:
+        total = sum(solution.counts)
+        weights.append([count / total for count in solution.counts])
+
+    # prefixes[i] and suffixes[i] hold the mine distribution of all components before and from i respectively
+    prefixes = [[1.0]]
+    for weight in weights:
+        prefixes.append(convolve(prefixes[-1], weight))
+
+    suffixes = [[1.0]]
+    for weight in reversed(weights):
+        suffixes.append(convolve(weight, suffixes[-1]))
+    suffixes.reverse()
+
+    # The relative number of ways to place the leftover mines among the interior cells given the frontier's mine count
+    log_ways = {}
+    for frontier_mines in range(len(prefixes[-1])):
+        interior_mines = mines_left - frontier_mines
+
+        if 0 <= interior_mines <= interior_count:
+            log_ways[frontier_mines] = log_choose(interior_count, interior_mines)
+
+    if not log_ways:
+        return None
+
+    largest = max(log_ways.values())
+    ways = [exp(log_ways[mines] - largest) if mines in log_ways else 0.0 for mines in range(len(prefixes[-1]))]
+
+    total = 0.0
+    interior_mines = 0.0
+    for frontier_mines, weight in enumerate(prefixes[-1]):
+        total += weight * ways[frontier_mines]
+        interior_mines += weight * ways[frontier_mines] * (mines_left - frontier_mines)
+
+    if total == 0.0:
+        return None
+
+    frontier = {}
+    for index, solution in enumerate(solutions):
+        others = convolve(prefixes[index], suffixes[index + 1])
+        scale = sum(solution.counts)
+
+        # The weight of this component having k mines given every possible mine count for the rest of the board
+        context = []
+        for mines in range(len(solution.counts)):
+            context.append(sum(weight * ways[mines + other_mines] for other_mines, weight in enumerate(others)
+                               if mines + other_mines < len(ways)))
+
+        for cell_index, cords in enumerate(solution.cells):
+            weight = sum(solution.cell_counts[mines][cell_index] / scale * context[mines]
+                         for mines in range(len(solution.counts)))
+            frontier[cords] = weight / total
+
+    interior_probability = interior_mines / total / interior_count if interior_count else 0.0
+    exact = all(solution.exact for solution in solutions)
+
+    return ProbabilityMap(minefield, frontier, interior_count, interior_probability, exact)
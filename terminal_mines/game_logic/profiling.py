@@ -0,0 +1,254 @@
+"""
+Opt-in instrumentation for the hot paths of the game. Nothing is wrapped until enable() is called so there is no cost
+when profiling is off.
+
+Once enabled, every call to an instrumented function is counted and timed. The timings are also bucketed into latency
+histograms, which is most useful for the keystroke handler, the solver's moves, and the server's commands. A summary is
+printed when the program exits and, if an output path is given, a cProfile dump of the whole session is written for use
+with pstats.
+"""
+
+import atexit
+import sys
+from bisect import bisect_left
+from cProfile import Profile
+from functools import wraps
+from time import perf_counter
+
+from click import echo
+
+ENV_VAR = "TERMINAL_MINES_PROFILE"
+
+# Values of the environment variable that leave profiling off, compared after stripping and lower casing
+OFF_VALUES = ("", "0", "false", "no", "off")
+
+# Upper bounds of the histogram buckets in seconds, doubling from 10us to roughly 20s
+BUCKET_BOUNDS = tuple(0.00001 * 2 ** power for power in range(22))
+
+# Labels that get a full histogram in the summary
+HISTOGRAM_LABELS = ("keystroke", "solver move", "server command")
+
+_session = None
+
+
+class CallStats:
+    """
+    The number of calls, total time and latency histogram for one instrumented function.
+    """
+    def __init__(self, label):
+        self.label = label
+        self.calls = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def __repr__(self):
+        return "{}({}, {} calls, {:.4f}s)".format(type(self).__name__, self.label, self.calls, self.seconds)
+
+    def record(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        self.buckets[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+
+    def percentile(self, fraction):
+        """
+        :return: The upper bound of the bucket holding the given fraction of calls, or None if there were no calls.
+        """
+        if not self.calls:
+            return None
+
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+
+            if seen >= fraction * self.calls:
+                return BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else float("inf")
+
+
+class Session:
+    """
+    Holds the stats recorded since enable() was called.
+    """
+    def __init__(self, output=None):
+        self.stats = {}
+        self.output = output
+        self.profile = None
+
+        if output:
+            self.profile = Profile()
+            self.profile.enable()
+
+    def __repr__(self):
+        return "{}({} labels)".format(type(self).__name__, len(self.stats))
+
+    def record(self, label, seconds):
+        if label not in self.stats:
+            self.stats[label] = CallStats(label)
+
+        self.stats[label].record(seconds)
+
+    def summary(self):
+        """
+        :return: A human readable report of the stats.
+        """
+        lines = ["Profile summary",
+                 "{:<28}{:>10}{:>12}{:>12}{:>12}{:>12}".format("", "calls", "total (s)", "mean (ms)", "p50 (ms)",
+                                                                "p99 (ms)")]
+
+        for stats in sorted(self.stats.values(), key=lambda stats: -stats.seconds):
+            lines.append("{:<28}{:>10}{:>12.3f}{:>12.3f}{:>12.3f}{:>12.3f}".format(
+                stats.label, stats.calls, stats.seconds, stats.seconds / stats.calls * 1000,
+                stats.percentile(0.5) * 1000, stats.percentile(0.99) * 1000))
+
+        for label in HISTOGRAM_LABELS:
+            if label in self.stats:
+                lines.append("")
+                lines.append("{} latency".format(label.capitalize()))
+                lines.extend(format_histogram(self.stats[label]))
+
+        return "\n".join(lines)
+
+    def finish(self):
+        """
+        Prints the summary and writes the cProfile dump if one was requested.
+        """
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(self.output)
+
+        echo(self.summary(), err=True)
+
+        if self.profile is not None:
+            echo("cProfile stats written to {}".format(self.output), err=True)
+
+
+def format_histogram(stats, width=40):
+    """
+    :return: A list of lines drawing the non-empty buckets of the given stats as a bar chart.
+    """
+    largest = max(stats.buckets)
+    lines = []
+
+    for index, count in enumerate(stats.buckets):
+        if count:
+            bound = "<= {:.2f}ms".format(BUCKET_BOUNDS[index] * 1000) if index < len(BUCKET_BOUNDS) else "more"
+            lines.append("  {:>12} {:<{}} {}".format(bound, "#" * max(count * width // largest, 1), width, count))
+
+    return lines
+
+
+def timed(label, func):
+    """
+    :return: A wrapper around func that records the time of each call under the given label.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _session.record(label, perf_counter() - start)
+
+    return wrapper
+
+
+def timed_generator(label, func):
+    """
+    :return: A wrapper around the generator function func that records the time taken to produce each item. Time spent
+        by the consumer between items isn't counted.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        iterator = func(*args, **kwargs)
+
+        while True:
+            start = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+
+            _session.record(label, perf_counter() - start)
+            yield item
+
+    return wrapper
+
+
+def timed_handler(label, func):
+    """
+    :return: A wrapper around the input loop func that records the time the handler takes for each keystroke.
+    """
+    @wraps(func)
+    def wrapper(handler_func, *args, **kwargs):
+        return func(timed(label, handler_func), *args, **kwargs)
+
+    return wrapper
+
+
+def replace_everywhere(original, replacement):
+    """
+    Swaps every reference to original held by a terminal_mines module for replacement, which catches functions that
+    were pulled in with "from ... import ...".
+    """
+    for name, module in list(sys.modules.items()):
+        if name.startswith("terminal_mines") and module is not None:
+            for attr, value in list(vars(module).items()):
+                if value is original:
+                    setattr(module, attr, replacement)
+
+
+def instrument(owner, attr, label, wrapper_factory=timed):
+    original = getattr(owner, attr)
+    replacement = wrapper_factory(label, original)
+
+    if isinstance(owner, type):
+        setattr(owner, attr, replacement)
+    else:
+        replace_everywhere(original, replacement)
+
+
+def enabled():
+    return _session is not None
+
+
+def enable(output=None):
+    """
+    Instruments the hot paths and starts recording. The summary is printed when the program exits.
+
+    :param output: An optional path to write cProfile stats to.
+    """
+    global _session
+
+    if _session is not None:
+        return
+
+    from . import async_input, chunked, game_model, keyboard_listener, probability, renderer, server, solver
+
+    _session = Session(output)
+
+    instrument(game_model.Minefield, "reveal_cell", "Minefield.reveal_cell")
+    instrument(game_model.Minefield, "flag_cell", "Minefield.flag_cell")
+    instrument(chunked.ChunkedMinefield, "reveal_cell", "ChunkedMinefield.reveal_cell")
+    instrument(chunked.ChunkedMinefield, "flag_cell", "ChunkedMinefield.flag_cell")
+    instrument(solver, "pick_move", "pick_move")
+    instrument(solver.FrontierEngine, "next_moves", "FrontierEngine.next_moves")
+    instrument(probability, "mine_probabilities", "mine_probabilities")
+    instrument(solver, "play_moves", "solver move", timed_generator)
+    instrument(keyboard_listener, "input_loop", "keystroke", timed_handler)
+    instrument(async_input.AsyncInputLoop, "dispatch", "keystroke")
+    instrument(server.Session, "command", "server command")
+    instrument(renderer, "render", "render")
+    instrument(renderer.DifferentialRenderer, "__call__", "DifferentialRenderer")
+
+    atexit.register(_session.finish)
+
+
+def enable_from_env(environ):
+    """
+    Enables profiling if the TERMINAL_MINES_PROFILE environment variable is set to anything other than one of the
+    OFF_VALUES, such as "0". A value of "1" only prints the summary while any other value is used as the path for the
+    cProfile stats.
+    """
+    value = environ.get(ENV_VAR, "")
+
+    if value.strip().lower() not in OFF_VALUES:
+        enable(None if value.strip() == "1" else value)
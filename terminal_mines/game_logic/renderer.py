@@ -2,11 +2,15 @@
 Handles the rendering of the game state to the console.
 """
 
+import sys
 from itertools import chain
 
-from click import clear, style, echo, get_current_context
+from click import clear, style, echo, get_current_context, get_terminal_size
 
-from .game_model import GameState, CellState
+from .game_model import GameState, CellState, STATES, STATE_CODES
+
+# How many times a second the interactive game redraws the board at most
+DEFAULT_FPS = 30
 
 fg_mapping = {
     CellState.FLAGGED: "bright_green",
@@ -22,41 +26,188 @@ fg_mapping = {
 }
 
 
-def render(minefield):
+def build_glyphs():
     """
-    Clears the screen and renders the current game state.
+    Styles every cell state once up front so frames can be assembled from plain string lookups.
+
+    :return: A tuple of three tuples indexed by state code: the normal glyphs, the glyphs used under the cursor, and the
+        glyphs used to mark incorrectly placed flags once the game is over.
     """
-    clear()
+    # Override the foreground color under the cursor to make it more readable against the green background
+    plain = tuple(style(state.value, fg=fg_mapping.get(state, None)) for state in STATES)
+    cursor = tuple(style(state.value, bg="bright_green", fg="black") for state in STATES)
+    wrong_flag = tuple(style(state.value, bg="red", fg=fg_mapping.get(state, None)) for state in STATES)
 
-    def render_cell(iter_x, iter_y):
-        cell = minefield.get_cell(iter_x, iter_y)
+    return plain, cursor, wrong_flag
 
-        fg = fg_mapping.get(cell.state, None)
-        bg = None
 
-        if minefield.state == GameState.IN_PROGRESS and iter_x == minefield.x and iter_y == minefield.y:
-            bg = "bright_green"
-            fg = "black"            # Override the foreground color to make it more readable against the green background
-        elif minefield.state != GameState.IN_PROGRESS and cell.state == CellState.FLAGGED and not cell.is_mine:
-            bg = "red"                  # Indicates incorrectly placed flag
+PLAIN_GLYPHS, CURSOR_GLYPHS, WRONG_FLAG_GLYPHS = build_glyphs()
+FLAGGED_CODE = STATE_CODES[CellState.FLAGGED]
 
-        return style(cell.state.value, bg=bg, fg=fg)
 
-    def gen_lines():
-        yield chr(0x250C) + chr(0x2500) * (minefield.width * 2 + 1) + chr(0x2510)
+def cell_glyph(minefield, x, y):
+    """
+    :return: The styled string used to draw the given cell.
+    """
+    code = STATE_CODES[minefield.get_state(x, y)]
 
-        for iter_y in range(minefield.height):
-            iter_cells = (render_cell(iter_x, iter_y) for iter_x in range(minefield.width))
-            yield " ".join(chain(chr(0x2502), iter_cells, chr(0x2502)))
+    if minefield.state == GameState.IN_PROGRESS:
+        if x == minefield.x and y == minefield.y:
+            return CURSOR_GLYPHS[code]
+    elif code == FLAGGED_CODE and not minefield.get_cell(x, y).is_mine:
+        return WRONG_FLAG_GLYPHS[code]              # Indicates incorrectly placed flag
 
-        yield chr(0x2514) + chr(0x2500) * (minefield.width * 2 + 1) + chr(0x2518)
+    return PLAIN_GLYPHS[code]
+
+
+class Viewport:
+    """
+    The part of the board that gets drawn. Follows the cursor so that boards bigger than the terminal can be played.
+    """
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.width = 0
+        self.height = 0
+
+    def __repr__(self):
+        return "{}({}, {}, {}, {})".format(type(self).__name__, self.x, self.y, self.width, self.height)
+
+    @property
+    def bounds(self):
+        return self.x, self.y, self.width, self.height
+
+    def clips(self, minefield):
+        return self.width < minefield.width or self.height < minefield.height
+
+    def follow(self, minefield):
+        """
+        Resizes the viewport to fit the terminal and scrolls it as little as possible to keep the cursor in view.
+        """
+        max_width, max_height = available_cells()
+        self.width = min(minefield.width, max_width)
+        self.height = min(minefield.height, max_height)
+
+        self.x = scroll_to(self.x, self.width, minefield.x, minefield.width)
+        self.y = scroll_to(self.y, self.height, minefield.y, minefield.height)
+
+
+def scroll_to(start, length, target, limit):
+    """
+    :return: The new start of a window of the given length which has been moved as little as possible to contain target
+        without going past 0 or limit.
+    """
+    if target < start:
+        start = target
+    elif target >= start + length:
+        start = target - length + 1
+
+    return min(max(start, 0), limit - length)
+
+
+def available_cells():
+    """
+    :return: The number of columns and rows of cells that fit in the terminal. Output that isn't going to a terminal
+        has no limit.
+    """
+    if not sys.stdout.isatty():
+        return sys.maxsize, sys.maxsize
+
+    columns, rows = get_terminal_size()
+
+    # Each cell takes 2 columns plus 3 for the borders. The borders, the status line, and the line the terminal's
+    #   cursor is left on take 4 rows.
+    return max((columns - 3) // 2, 1), max(rows - 4, 1)
+
+
+class RowCache:
+    """
+    Remembers the string built for each row of the last frame so that rows which haven't changed can be reused.
+    """
+    def __init__(self):
+        self.rows = {}
+
+    def __repr__(self):
+        return "{}({} rows)".format(type(self).__name__, len(self.rows))
+
+    def row(self, minefield, y, start, stop):
+        """
+        :return: The string for the cells from start up to stop in the given row of the board, including the borders
+            on either side.
+        """
+        if minefield.state != GameState.IN_PROGRESS:
+            # Incorrect flags are only marked on the final frame so there's no point in caching it
+            glyphs = (cell_glyph(minefield, x, y) for x in range(start, stop))
+            return " ".join(chain(BORDER, glyphs, BORDER))
+
+        codes = minefield.row_codes(y, start, stop)
+        cursor_x = minefield.x - start if y == minefield.y and start <= minefield.x < stop else -1
+        key = (codes, cursor_x, start)
+
+        cached = self.rows.get(y)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        glyphs = [PLAIN_GLYPHS[code] for code in codes]
+        if cursor_x >= 0:
+            glyphs[cursor_x] = CURSOR_GLYPHS[codes[cursor_x]]
+
+        row = " ".join(chain(BORDER, glyphs, BORDER))
+        self.rows[y] = (key, row)
+        return row
+
+    def prune(self, viewport):
+        """
+        Forgets the rows that have been scrolled out of view.
+        """
+        if len(self.rows) > viewport.height * 2:
+            self.rows = {y: row for y, row in self.rows.items() if viewport.y <= y < viewport.y + viewport.height}
 
-        if minefield.state == GameState.WON:
-            yield " Game won"
-        elif minefield.state == GameState.LOST:
-            yield " Game lost"
-        else:
-            yield " Flags remaining: {}".format(minefield.flags_remaining)
+
+BORDER = (chr(0x2502),)
+row_cache = RowCache()
+default_viewport = Viewport()
+
+
+def status_line(minefield, viewport):
+    if minefield.state == GameState.WON:
+        line = " Game won"
+    elif minefield.state == GameState.LOST:
+        line = " Game lost"
+    else:
+        line = " Flags remaining: {}".format(minefield.flags_remaining)
+
+    if minefield.message:
+        line += "  " + minefield.message
+
+    if viewport.clips(minefield):
+        line += "  (showing {}-{} x {}-{} of {}x{})".format(
+            viewport.x, viewport.x + viewport.width - 1, viewport.y, viewport.y + viewport.height - 1,
+            minefield.width, minefield.height)
+
+    return line
+
+
+def render(minefield, changed=None, viewport=None):
+    """
+    Clears the screen and renders the current game state. The changed arg is accepted for compatibility with
+    DifferentialRenderer and ignored. Only the part of the board in the viewport is drawn.
+    """
+    if viewport is None:
+        viewport = default_viewport
+
+    viewport.follow(minefield)
+    row_cache.prune(viewport)
+    clear()
+
+    def gen_lines():
+        yield chr(0x250C) + chr(0x2500) * (viewport.width * 2 + 1) + chr(0x2510)
+
+        for iter_y in range(viewport.y, viewport.y + viewport.height):
+            yield row_cache.row(minefield, iter_y, viewport.x, viewport.x + viewport.width)
+
+        yield chr(0x2514) + chr(0x2500) * (viewport.width * 2 + 1) + chr(0x2518)
+        yield status_line(minefield, viewport)
 
     try:
         echo("\n".join(gen_lines()))
@@ -65,3 +216,89 @@ def render(minefield):
         #   we'll quit while we're ahead.
         get_current_context().fail("terminal-mines does not support the Git bash emulator on Windows. Please use CMD "
                                    "or PowerShell instead.")
+
+
+class DifferentialRenderer:
+    """
+    Remembers what it last drew and only redraws the cells that have changed since, using ANSI cursor positioning.
+    Falls back to a full redraw for the first frame and whenever the viewport moves.
+    """
+    def __init__(self):
+        self.viewport = Viewport()
+        self.frame = None           # The glyph drawn for each cell of the viewport in the last frame
+        self.drawn = None           # The size of the board and the bounds of the viewport in the last frame
+        self.cursor = None
+        self.game_state = None
+        self.status = None
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, self.viewport)
+
+    def __call__(self, minefield, changed=None):
+        """
+        Renders the current game state. The changed arg can be a list of the cords of the cells that changed since the
+        last frame, such as the list returned by Minefield.reveal_cell(). If it's omitted every cell in view is
+        compared against the last frame.
+        """
+        viewport = self.viewport
+        viewport.follow(minefield)
+
+        if self.frame is None or (minefield.width, minefield.height, viewport.bounds) != self.drawn:
+            self.full_redraw(minefield)
+            return
+
+        if changed is None or minefield.state != self.game_state:
+            cords = ((x, y) for y in range(viewport.y, viewport.y + viewport.height)
+                     for x in range(viewport.x, viewport.x + viewport.width))
+        else:
+            # The cursor's old and new positions also need to be redrawn
+            cords = set(changed)
+            cords.add(self.cursor)
+            cords.add((minefield.x, minefield.y))
+
+        output = []
+        for x, y in cords:
+            view_x = x - viewport.x
+            view_y = y - viewport.y
+
+            if 0 <= view_x < viewport.width and 0 <= view_y < viewport.height:
+                glyph = cell_glyph(minefield, x, y)
+                index = view_y * viewport.width + view_x
+
+                if glyph != self.frame[index]:
+                    self.frame[index] = glyph
+                    output.append("\033[{};{}H{}".format(view_y + 2, view_x * 2 + 3, glyph))
+
+        status = status_line(minefield, viewport)
+        if status != self.status:
+            self.status = status
+            output.append("\033[{};1H{}\033[K".format(viewport.height + 3, status))
+
+        # Park the terminal's cursor on the line below the board like a full redraw would
+        output.append("\033[{};1H".format(viewport.height + 4))
+
+        self.cursor = (minefield.x, minefield.y)
+        self.game_state = minefield.state
+        echo("".join(output), nl=False)
+
+    def full_redraw(self, minefield):
+        viewport = self.viewport
+        render(minefield, viewport=viewport)
+
+        self.frame = [cell_glyph(minefield, x, y) for y in range(viewport.y, viewport.y + viewport.height)
+                      for x in range(viewport.x, viewport.x + viewport.width)]
+        self.drawn = (minefield.width, minefield.height, viewport.bounds)
+        self.cursor = (minefield.x, minefield.y)
+        self.game_state = minefield.state
+        self.status = status_line(minefield, viewport)
+
+
+def make_renderer(full_redraw=False):
+    """
+    :return: A DifferentialRenderer instance, or the full redraw render() function if full_redraw is set or stdout
+        isn't a terminal that can handle cursor positioning.
+    """
+    if full_redraw or not sys.stdout.isatty():
+        return render
+    else:
+        return DifferentialRenderer()
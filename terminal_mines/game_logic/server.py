@@ -0,0 +1,235 @@
+"""
+An asyncio TCP server that hosts one game per connection.
+
+The protocol is line based. Each command the client sends gets exactly one line back:
+
+    state               board <width> <height> <x> <y> <game state> <flags remaining> <cells>
+    new                 board ...  (after starting a new game)
+    move <x> <y>        cursor <x> <y>
+    reveal [<x> <y>]    update <game state> <flags remaining> [<x>,<y>,<cell> ...]
+    flag [<x> <y>]      update ...
+    undo                update ...
+    redo                update ...
+    quit                (closes the connection)
+
+Anything else is answered with "error <message>". Reveals and flags act on the cursor unless given cords. The game state
+is one of in_progress, won, or lost. A board sends every cell as one string of the CellState characters, row by row,
+while an update only holds the cells that changed, such as the ones opened by a reveal cascade. Once the game is over
+incorrectly placed flags are sent as "!". The server greets each new connection with a board line.
+"""
+
+import asyncio
+
+from .game_model import random_minefield, GameState, CellState, STATES, STATE_CODES
+
+ENCODING = "utf-8"
+WRONG_FLAG = "!"
+
+# Lets a burst of thousands of clients connect at once without their connections being dropped and retried
+BACKLOG = 1024
+
+# Connections sending a longer line than this are closed
+MAX_LINE = 1024
+
+# Translates state codes straight into the characters sent for them
+CODE_CHARS = bytes(ord(state.value) for state in STATES).ljust(256, b"?")
+FLAGGED_CODE = STATE_CODES[CellState.FLAGGED]
+
+
+def encode_cell(minefield, x, y):
+    state = minefield.get_state(x, y)
+    game_over = minefield.state != GameState.IN_PROGRESS
+
+    if state == CellState.FLAGGED and game_over and not minefield.get_cell(x, y).is_mine:
+        return WRONG_FLAG
+
+    return state.value
+
+
+def board_line(minefield):
+    """
+    :return: The response describing the whole board.
+    """
+    if minefield.state == GameState.IN_PROGRESS:
+        cells = minefield.state_codes().translate(CODE_CHARS).decode("ascii")
+    else:
+        cells = "".join(encode_cell(minefield, x, y) for y in range(minefield.height) for x in range(minefield.width))
+
+    return "board {} {} {} {} {} {} {}".format(minefield.width, minefield.height, minefield.x, minefield.y,
+                                               minefield.state.name.lower(), minefield.flags_remaining, cells)
+
+
+def update_line(minefield, changed):
+    """
+    :return: The response describing the cells at the given cords after a move.
+    """
+    if minefield.state != GameState.IN_PROGRESS:
+        # Every incorrect flag has to be shown once the game is over, not just the ones that changed
+        changed = set(changed)
+        codes = minefield.state_codes()
+        index = codes.find(FLAGGED_CODE)
+
+        while index != -1:
+            changed.add((index % minefield.width, index // minefield.width))
+            index = codes.find(FLAGGED_CODE, index + 1)
+
+    cells = " ".join("{},{},{}".format(x, y, encode_cell(minefield, x, y)) for x, y in changed)
+    return "update {} {} {}".format(minefield.state.name.lower(), minefield.flags_remaining, cells).rstrip()
+
+
+class Session:
+    """
+    The game played over one connection.
+    """
+    def __init__(self, server):
+        self.server = server
+        self.minefield = server.new_minefield()
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, self.minefield)
+
+    def command(self, line):
+        """
+        Runs one line of the protocol.
+
+        :return: The response line, without the newline.
+        """
+        words = line.split()
+        if not words:
+            return "error empty command"
+
+        name, args = words[0].lower(), words[1:]
+        minefield = self.minefield
+
+        try:
+            args = [int(arg) for arg in args]
+        except ValueError:
+            return "error cords must be integers"
+
+        if name == "state" and not args:
+            return board_line(minefield)
+        elif name == "new" and not args:
+            self.minefield = self.server.new_minefield()
+            return board_line(self.minefield)
+        elif name == "move" and len(args) == 2:
+            x, y = args
+            if not (0 <= x < minefield.width and 0 <= y < minefield.height):
+                return "error cords are outside the board"
+
+            minefield.x = x
+            minefield.y = y
+            return "cursor {} {}".format(x, y)
+        elif name in ("reveal", "flag") and len(args) in (0, 2):
+            x, y = args or (minefield.x, minefield.y)
+            if not (0 <= x < minefield.width and 0 <= y < minefield.height):
+                return "error cords are outside the board"
+
+            if minefield.state != GameState.IN_PROGRESS:
+                return update_line(minefield, [])
+
+            move = minefield.reveal_cell if name == "reveal" else minefield.flag_cell
+            return update_line(minefield, move(x, y))
+        elif name in ("undo", "redo") and not args:
+            return update_line(minefield, minefield.undo() if name == "undo" else minefield.redo())
+        else:
+            return "error unknown command or wrong number of arguments"
+
+
+class SessionProtocol(asyncio.Protocol):
+    """
+    Plays one connection's game until the client quits or disconnects. All the commands that arrive together are run
+    and answered with a single write.
+    """
+    def __init__(self, server):
+        self.server = server
+        self.session = None
+        self.transport = None
+        self.buffer = b""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.session = Session(self.server)
+        self.server.sessions.add(self.session)
+        transport.write((board_line(self.session.minefield) + "\n").encode(ENCODING))
+
+    def connection_lost(self, exc):
+        self.server.sessions.discard(self.session)
+
+    def data_received(self, data):
+        lines = (self.buffer + data).split(b"\n")
+        self.buffer = lines.pop()
+        responses = []
+        closing = len(self.buffer) > MAX_LINE
+
+        for line in lines:
+            if line.strip().lower() == b"quit":
+                closing = True
+                break
+
+            responses.append(self.session.command(line.decode(ENCODING, errors="replace")))
+
+        if responses:
+            self.transport.write(("\n".join(responses) + "\n").encode(ENCODING))
+
+        if closing:
+            self.transport.close()
+
+    def pause_writing(self):
+        # Stop running commands for a client that isn't reading the responses
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.transport.resume_reading()
+
+
+class GameServer:
+    """
+    Hosts a game of the given difficulty for each connection. Passing a seed makes the nth game started on the server
+    reproducible.
+    """
+    def __init__(self, difficulty, seed=None, storage="array"):
+        self.difficulty = difficulty
+        self.seed = seed
+        self.storage = storage
+
+        self.sessions = set()
+        self.games_started = 0
+
+    def __repr__(self):
+        return "{}({}, {} sessions)".format(type(self).__name__, self.difficulty, len(self.sessions))
+
+    def new_minefield(self):
+        seed = None if self.seed is None else "{}:{}".format(self.seed, self.games_started)
+        self.games_started += 1
+        return random_minefield(*self.difficulty, storage=self.storage, seed=seed)
+
+    def start(self, host, port):
+        """
+        :return: A coroutine that starts listening on the current event loop and returns the asyncio server.
+        """
+        return asyncio.get_event_loop().create_server(lambda: SessionProtocol(self), host, port, backlog=BACKLOG)
+
+    def serve_forever(self, host, port, ready=None):
+        """
+        Runs the server until it is interrupted. The ready function, if given, is called with the bound address once
+        the server is listening.
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = None
+
+        try:
+            server = loop.run_until_complete(self.start(host, port))
+
+            if ready is not None:
+                ready(server.sockets[0].getsockname())
+
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if server is not None:
+                server.close()
+
+            loop.close()
+            asyncio.set_event_loop(None)
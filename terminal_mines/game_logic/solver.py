@@ -1,14 +1,21 @@
 """
 A minesweeper board solver. Includes logic to display moves as they are made.
 """
-from random import randint, shuffle
-from time import sleep
+import random
+from itertools import chain
+from time import perf_counter, sleep
 
 from click import echo
 
 from .game_model import GameState, CellState
+from .patterns import pattern_table, forced_groups
+from .probability import mine_probabilities
 from .renderer import render
 
+NUMBERED_STATES = {CellState.WARN1, CellState.WARN2, CellState.WARN3, CellState.WARN4, CellState.WARN5,
+                   CellState.WARN6, CellState.WARN7, CellState.WARN8}
+NO_CORDS = frozenset()
+
 
 class Move:
     """
@@ -21,7 +28,7 @@ class Move:
         self.guess = guess
 
 
-def pick_move(minefield):
+def pick_move(minefield, rng=random):
     """
     Returns the move the AI wants to take. This function is ordered from "best" to "worst" strategy and returns once a
     valid move is found.
@@ -53,9 +60,17 @@ def pick_move(minefield):
                     if minefield.get_cell(neighbor_x, neighbor_y).state == CellState.UNKNOWN:
                         return Move(minefield.reveal_cell, neighbor_x, neighbor_y)
 
+    return pick_guess(minefield, rng)
+
+
+def pick_guess(minefield, rng=random):
+    """
+    Returns a guess for when no move can be deduced. Prefers the corners since they are the most likely to open up an
+    area of the board. The rng arg can be a random.Random instance to make the guesses reproducible.
+    """
     # Take a guess by revealing a corner cell
     corners = [(0, 0), (0, minefield.height - 1), (minefield.width - 1, 0), (minefield.width - 1, minefield.height - 1)]
-    shuffle(corners)
+    rng.shuffle(corners)
 
     for x, y in corners:
         if minefield.get_cell(x, y).state == CellState.UNKNOWN:
@@ -63,51 +78,345 @@ def pick_move(minefield):
 
     # Take a guess by revealing a random cell
     while True:
-        x = randint(0, minefield.width - 1)
-        y = randint(0, minefield.height - 1)
+        x = rng.randint(0, minefield.width - 1)
+        y = rng.randint(0, minefield.height - 1)
 
         if minefield.get_cell(x, y).state == CellState.UNKNOWN:
             return Move(minefield.reveal_cell, x, y, guess=True)
 
 
-def solve_game(minefield):
+class ScanEngine:
     """
-    Runs the AI against the given minefield. Renders game after each turn.
+    Wraps pick_move(). Rescans the whole board for each move. Only looks at one number at a time so the pattern table
+    is never used.
     """
-    render(minefield)
+    def __init__(self, minefield, rng=random, patterns=False):
+        self.minefield = minefield
+        self.rng = rng
+        self.lookups = 0
 
-    # Track some stats on the AI's attempt
+    def next_moves(self):
+        return [pick_move(self.minefield, self.rng)]
+
+    def update(self, changed):
+        pass
+
+
+class FrontierEngine:
+    """
+    A constraint propagation solver. Keeps track of the frontier, the revealed numbered cells that border unknown
+    cells, and only re-examines the parts of it that changed since the last move. Every move that can be deduced is
+    returned as one batch.
+
+    Pairs of numbers are compared directly, or looked up in the pattern table if patterns is True.
+    """
+    def __init__(self, minefield, rng=random, patterns=False):
+        self.minefield = minefield
+        self.rng = rng
+        self.frontier = set()       # Cords of numbered cells that still have unknown neighbors
+        self.dirty = set()          # Cords of numbered cells that need to be re-examined
+
+        self.patterns = pattern_table() if patterns else None
+        self.lookups = 0            # Pairs of numbers looked up in the pattern table
+
+        self.update(minefield.known_cords())
+
+    def update(self, changed):
+        """
+        Marks the numbered cells in and around the given cords as needing to be re-examined.
+        """
+        get_state = self.minefield.get_state
+
+        for x, y in changed:
+            for cords in chain(((x, y),), self.minefield.neighboring_cords(x, y)):
+                if get_state(*cords) in NUMBERED_STATES:
+                    self.dirty.add(cords)
+
+    def constraint(self, x, y):
+        """
+        :return: A tuple of the set of unknown neighbors of the given numbered cell and the number of mines among them.
+        """
+        minefield = self.minefield
+        unknown = set()
+        remaining = int(minefield.get_state(x, y).value)
+
+        for cords in minefield.neighboring_cords(x, y):
+            state = minefield.get_state(*cords)
+
+            if state == CellState.UNKNOWN:
+                unknown.add(cords)
+            elif state == CellState.FLAGGED:
+                remaining -= 1
+
+        return frozenset(unknown), remaining
+
+    def next_moves(self):
+        """
+        Returns every move that can be deduced from the changed part of the frontier or a single guess if there are
+        none.
+        """
+        constraints = {}
+
+        for cords in self.dirty:
+            constraint = self.constraint(*cords)
+
+            if constraint[0]:
+                self.frontier.add(cords)
+                constraints[cords] = constraint
+            else:
+                self.frontier.discard(cords)
+
+        self.dirty = set()
+        safe = set()
+        mines = set()
+
+        for unknown, remaining in constraints.values():
+            if remaining == 0:
+                safe |= unknown
+            elif remaining == len(unknown):
+                mines |= unknown
+
+        # Compare each changed constraint against the constraints that overlap with it
+        cache = dict(constraints)
+        frontier = self.frontier
+        patterns = self.patterns
+        lookups = 0
+
+        for (x, y), (unknown, remaining) in constraints.items():
+            for offset_x in range(-2, 3):
+                for offset_y in range(-2, 3):
+                    other = (x + offset_x, y + offset_y)
+
+                    if other == (x, y) or other not in frontier:
+                        continue
+
+                    if other not in cache:
+                        cache[other] = self.constraint(*other)
+
+                    other_unknown, other_remaining = cache[other]
+
+                    if patterns is None:
+                        found_safe, found_mines = compare_constraints(unknown, remaining, other_unknown,
+                                                                      other_remaining)
+                    else:
+                        shared = unknown & other_unknown
+                        if not shared:
+                            continue
+
+                        # The same key as pattern_key(). A number never needs more than 8 mines and a negative count,
+                        #   from a misplaced flag, makes a negative key that is never in the table.
+                        num_shared = len(shared)
+                        lookups += 1
+                        forced = patterns.get((len(unknown) - num_shared) | (num_shared << 4) |
+                                              ((len(other_unknown) - num_shared) << 8) | (remaining << 12) |
+                                              (other_remaining << 16))
+
+                        if forced:
+                            found_safe, found_mines = forced_groups(forced, unknown - shared, shared,
+                                                                    other_unknown - shared)
+                        elif forced is None:
+                            # Only numbers that contradict each other are missing from the table
+                            found_safe, found_mines = compare_constraints(unknown, remaining, other_unknown,
+                                                                          other_remaining)
+                        else:
+                            continue
+
+                    safe |= found_safe
+                    mines |= found_mines
+
+        self.lookups += lookups
+
+        if not safe and not mines:
+            return self.guess()
+
+        moves = [Move(self.minefield.flag_cell, x, y) for x, y in sorted(mines)]
+        moves += [Move(self.minefield.reveal_cell, x, y) for x, y in sorted(safe)]
+        return moves
+
+    def guess(self):
+        """
+        Called when nothing can be deduced from the frontier.
+
+        :return: A list of moves.
+        """
+        return [pick_guess(self.minefield, self.rng)]
+
+
+class ProbabilityEngine(FrontierEngine):
+    """
+    Extends FrontierEngine with a better way of guessing. Works out the chance of each unknown cell being a mine,
+    taking the number of mines left into account, and reveals the cell least likely to be one.
+    """
+    def __init__(self, minefield, rng=random, patterns=False):
+        super().__init__(minefield, rng, patterns)
+        self.cache = {}
+
+    def guess(self):
+        probabilities = mine_probabilities(self.minefield, self.rng, self.cache)
+
+        if probabilities is None:
+            return super().guess()
+
+        # The mine count can settle cells that the local reasoning couldn't
+        safe, mines = probabilities.certain_cells()
+
+        if safe or mines:
+            moves = [Move(self.minefield.flag_cell, x, y) for x, y in sorted(mines)]
+            moves += [Move(self.minefield.reveal_cell, x, y) for x, y in sorted(safe)]
+            return moves
+
+        lowest, candidates, interior_ties = probabilities.safest_cells()
+
+        if lowest is None:
+            return super().guess()
+
+        # Among equally risky cells prefer the corners since they are the most likely to open up an area of the board
+        corners = [(0, 0), (0, self.minefield.height - 1), (self.minefield.width - 1, 0),
+                   (self.minefield.width - 1, self.minefield.height - 1)]
+        corner_candidates = [cords for cords in corners
+                             if cords in candidates or (interior_ties and probabilities.is_interior(*cords))]
+
+        if corner_candidates:
+            x, y = self.rng.choice(corner_candidates)
+        elif interior_ties and self.rng.random() * (probabilities.interior_count + len(candidates)) >= len(candidates):
+            # Every interior cell is as good as the best frontier cells so pick uniformly among all of them
+            x, y = probabilities.random_interior_cell(self.rng)
+        else:
+            x, y = self.rng.choice(candidates)
+
+        return [Move(self.minefield.reveal_cell, x, y, guess=True)]
+
+
+def compare_constraints(unknown_a, remaining_a, unknown_b, remaining_b):
+    """
+    Applies subset/difference reasoning to a pair of constraints.
+
+    :return: A tuple of the set of cords that must be safe and the set of cords that must be mines.
+    """
+    only_a = unknown_a - unknown_b
+    only_b = unknown_b - unknown_a
+
+    if len(only_a) == len(unknown_a):
+        # The constraints don't overlap
+        return NO_CORDS, NO_CORDS
+
+    if remaining_b - remaining_a == len(only_b):
+        # B's extra cells hold every extra mine B needs, so they're all mines and A's extra cells are all safe
+        return only_a, only_b
+    elif remaining_a - remaining_b == len(only_a):
+        return only_b, only_a
+    elif remaining_a == remaining_b and not only_a:
+        # A is a subset of B with the same number of mines so B's extra cells are safe
+        return only_b, NO_CORDS
+    elif remaining_a == remaining_b and not only_b:
+        return only_a, NO_CORDS
+
+    return NO_CORDS, NO_CORDS
+
+
+ENGINES = {
+    "scan": ScanEngine,
+    "frontier": FrontierEngine,
+    "probability": ProbabilityEngine
+}
+
+
+class GameStats:
+    """
+    The outcome of one game played by the AI.
+    """
+    def __init__(self, state, moves, guesses, seconds, lookups=0):
+        self.state = state
+        self.moves = moves
+        self.guesses = guesses
+        self.seconds = seconds
+        self.lookups = lookups  # Pairs of numbers looked up in the pattern table
+        self.log = None         # The game in the move log format, if it was recorded
+
+    @property
+    def won(self):
+        return self.state == GameState.WON
+
+    def __repr__(self):
+        return "{}({}, {}, {}, {:.4f})".format(type(self).__name__, self.state.name, self.moves, self.guesses,
+                                               self.seconds)
+
+
+def play_moves(minefield, engine):
+    """
+    Lets the given engine play until the game is over, or until no unknown cell is left to play on. The latter only
+    happens without the beta rules on a board without mines, which is cleared by the first reveal but never won since
+    there is nothing to flag. Yields a tuple of each move and the list of cords it changed after the move has been
+    made.
+    """
+    while minefield.unknown_cells:
+        for move in engine.next_moves():
+            if minefield.get_state(move.x, move.y) != CellState.UNKNOWN:
+                # An earlier move in this batch already took care of this cell
+                continue
+
+            minefield.x = move.x
+            minefield.y = move.y
+
+            changed = move.func(move.x, move.y)
+            engine.update(changed)
+            yield move, changed
+
+            if minefield.state != GameState.IN_PROGRESS:
+                return
+
+
+def solve_headless(minefield, engine="probability", rng=random, patterns=False):
+    """
+    Runs the AI against the given minefield without rendering anything.
+
+    :param patterns: Set to True to compare pairs of numbers with the pattern table.
+    :return: A GameStats instance.
+    """
+    start = perf_counter()
     moves = 0
     guesses = 0
+    engine = ENGINES[engine](minefield, rng, patterns)
 
-    while True:
-        sleep(0.1)
+    for move, _ in play_moves(minefield, engine):
+        moves += 1
+        if move.guess:
+            guesses += 1
+
+    return GameStats(minefield.state, moves, guesses, perf_counter() - start, engine.lookups)
 
-        # Make a move
-        move = pick_move(minefield)
 
-        minefield.x = move.x
-        minefield.y = move.y
+def solve_game(minefield, engine="probability", render_func=render):
+    """
+    Runs the AI against the given minefield. Renders game after each turn. The engine arg selects one of the solvers in
+    ENGINES and render_func can be swapped for a renderer from make_renderer().
+    """
+    render_func(minefield)
+    sleep(0.1)
 
+    # Track some stats on the AI's attempt
+    moves = 0
+    guesses = 0
+
+    for move, changed in play_moves(minefield, ENGINES[engine](minefield)):
         moves += 1
         if move.guess:
             guesses += 1
 
-        move.func(move.x, move.y)
-
         # Render the updated game state
-        render(minefield)
+        render_func(minefield, changed)
 
-        if minefield.state != GameState.IN_PROGRESS:
-            # Print the stats info and return
-            message_format = "\n"
-            if guesses == 1:
-                message_format += "The AI made {} moves of which {} was a guess."
-            else:
-                message_format += "The AI made {} moves of which {} were guesses."
+        if minefield.state == GameState.IN_PROGRESS:
+            sleep(0.1)
+
+    # Print the stats info and return
+    message_format = "\n"
+    if guesses == 1:
+        message_format += "The AI made {} moves of which {} was a guess."
+    else:
+        message_format += "The AI made {} moves of which {} were guesses."
 
-            if move.guess and minefield.state == GameState.LOST:
-                message_format += " One of those guesses went poorly."
+    if moves and move.guess and minefield.state == GameState.LOST:
+        message_format += " One of those guesses went poorly."
 
-            echo(message_format.format(moves, guesses))
-            return
+    echo(message_format.format(moves, guesses))
@@ -2,9 +2,18 @@
 Entry point and CLI implementation for terminal-mines.
 """
 
+import os
+from random import Random
+
 import click
 
-from .game_logic import random_minefield, Minefield, GameState, input_loop, render, solve_game
+from .game_logic import profiling
+from .game_logic.game_model import random_minefield, load_mines, Minefield, GameState
+from .game_logic.renderer import make_renderer, DEFAULT_FPS
+from .game_logic.solver import solve_game, ENGINES
+
+# The modules used by only some of the modes, such as the ones pulling in asyncio or multiprocessing, are imported where
+#   they're needed so that starting the game, or a script running it headlessly, doesn't pay for them.
 
 DIFFICULTY_PRESETS = {
     "balanced": (35, 20, 15),
@@ -14,6 +23,10 @@ DIFFICULTY_PRESETS = {
     "expert": (99, 16, 30)
 }
 
+MAX_BOARD_SIDE = 10000
+MAX_CHUNKED_BOARD_SIDE = 1000000
+DEFAULT_HOST = "127.0.0.1"
+
 
 class DifficultyParamType(click.ParamType):
     """
@@ -32,8 +45,9 @@ class DifficultyParamType(click.ParamType):
                     raise ValueError
                 elif args[0] < 0 or args[1] < 0 or args[2] < 0:
                     raise ValueError
-                elif args[1] > 50 or args[2] > 50:
-                    self.fail("the game board cannot be larger than 50 cells on either side", param, ctx)
+                elif args[1] > MAX_CHUNKED_BOARD_SIDE or args[2] > MAX_CHUNKED_BOARD_SIDE:
+                    self.fail("the game board cannot be larger than {} cells on either side".format(
+                        MAX_CHUNKED_BOARD_SIDE), param, ctx)
                 elif args[0] > args[1] * args[2]:
                     self.fail("{} mines cannot fit in a board size of {} by {}".format(*args), param, ctx)
 
@@ -42,13 +56,71 @@ class DifficultyParamType(click.ParamType):
                 self.fail("a custom difficulty must be made of 3 positive integers separated by commas", param, ctx)
 
 
+class AddressParamType(click.ParamType):
+    """
+    Converts an address of the form "<host>:<port>" or just "<port>" into a (host, port) tuple.
+    """
+    name = "address"
+
+    def convert(self, value, param, ctx):
+        host, _, port = value.rpartition(":")
+
+        try:
+            port = int(port)
+
+            if not 0 <= port <= 65535:
+                raise ValueError
+        except ValueError:
+            self.fail("'{}' is not a valid address of the form <host>:<port> or <port>".format(value), param, ctx)
+
+        return host or DEFAULT_HOST, port
+
+
 @click.command()
 @click.pass_context
 @click.argument("difficulty", default="balanced", type=DifficultyParamType())
 @click.option("--solve", is_flag=True, help="Watch the included AI attempt to solve the minefield.")
+@click.option("--engine", type=click.Choice(sorted(ENGINES)), default="probability", show_default=True,
+              help="The solver engine used by --solve and --batch.")
+@click.option("--batch", type=click.IntRange(min=1), metavar="N",
+              help="Let the AI play N games without rendering them and print statistics on how it did.")
+@click.option("--analyze", type=click.IntRange(min=1), metavar="N",
+              help="Print the 3BV and openings of N random boards of the difficulty. Requires numpy.")
+@click.option("--patterns", is_flag=True, help="Make the AI played by --batch use its table of pattern deductions.")
+@click.option("--workers", type=click.IntRange(min=0), default=1, show_default=True,
+              help="Number of processes used by --batch. Use 0 for one per CPU.")
+@click.option("--seed", type=int, help="Seed the random number generator so games can be reproduced.")
 @click.option("mines_file", "--mines", type=click.File(), help="Provide a file containing custom mine placements.")
+@click.option("--chunked", is_flag=True,
+              help="Generate the board in chunks as it is played, which allows boards far larger than memory.")
+@click.option("record_file", "--record", type=click.File("ab"),
+              help="Append the game, or every game played by --batch, to the given move log.")
+@click.option("save_file", "--save", type=click.File("wb", lazy=True),
+              help="Save a snapshot of the game to the given file when it ends or you quit.")
+@click.option("load_file", "--load", type=click.File("rb"), help="Resume the game saved in the given snapshot.")
+@click.option("replay_file", "--replay", type=click.File("rb"), help="Replay the games in the given move log.")
+@click.option("--game", type=click.IntRange(min=0), metavar="N", help="With --replay, only replay the Nth game.")
+@click.option("--speed", type=click.FloatRange(min=0.001),
+              help="With --replay, draw the game at this multiple of the speed it was played at.")
+@click.option("--fps", type=click.IntRange(min=1), default=DEFAULT_FPS, show_default=True,
+              help="The most times per second the board is redrawn while playing.")
+@click.option("--full-redraw", is_flag=True,
+              help="Redraw the whole screen every frame. Use this if the board is drawn incorrectly.")
+@click.option("--profile", is_flag=True, help="Print timings for the game's hot paths on exit.")
+@click.option("--profile-output", type=click.Path(dir_okay=False, writable=True),
+              help="With --profile, also write cProfile stats for the session to the given file.")
+@click.option("--no-guess", is_flag=True,
+              help="Play a board that can be solved without guessing, starting from an opening revealed for you.")
+@click.option("pool_size", "--fill-pool", type=click.IntRange(min=1), metavar="N",
+              help="Generate N no-guess boards for the difficulty ahead of time so games using them start instantly.")
+@click.option("--serve", type=AddressParamType(), metavar="[HOST:]PORT",
+              help="Host a game of the difficulty for everyone who connects to the given address.")
+@click.option("--connect", type=AddressParamType(), metavar="[HOST:]PORT",
+              help="Play a game hosted by a server started with --serve.")
 @click.option("--beta", is_flag=True, help="Enable experimental features.")
-def main(ctx, difficulty, solve, mines_file, beta):
+def main(ctx, difficulty, solve, engine, batch, analyze, patterns, workers, seed, mines_file, chunked, record_file,
+         save_file, load_file, replay_file, game, speed, fps, full_redraw, profile, profile_output, no_guess, pool_size,
+         serve, connect, beta):
     """
     Terminal Mines
 
@@ -59,10 +131,14 @@ def main(ctx, difficulty, solve, mines_file, beta):
     - WASD or arrow keys to move the cursor
     - Enter or space to reveal the current cell
     - e or ' to place a flag
+    - u to undo and r to redo a move
+    - h for a hint
     - ESC to quit
 
     DIFFICULTY can either be one of the modes listed below or a custom difficulty of the form
     "<number of mines>,<width>,<height>". If no difficulty is specified, then Terminal Mines will default to balanced.
+    Boards can be up to 10000 cells on either side, or 1000000 with the chunked option. If the board doesn't fit in
+    the terminal, the view scrolls to follow the cursor.
 
     \b
     Terminal Mines difficulties:
@@ -75,47 +151,315 @@ def main(ctx, difficulty, solve, mines_file, beta):
     - intermediate: A 16x16 board with 40 mines
     - expert: A 16x30 board with 99 mines
 
-    Note that this version of Minesweeper does not guarantee that your first move will always be safe. Additionally, in
-    this version a "win" is defined as flagging all mines, not revealing all safe cells.
+    Note that this version of Minesweeper does not guarantee that your first move will always be safe unless the
+    no-guess option is used. Additionally, in this version a "win" is defined as flagging all mines, not revealing all
+    safe cells.
 
     The mines file (if provided) is used to control the placement of mines. It must be a CSV where each line is of the
     form "<x>,<y>". Both coordinates are 0-based and count from the top-left corner of the game board. If any of the
-    specified mines are outside the bounds of the game board they will be skipped. If a mines file is provided the
-    "number of mines" portion of the difficulty setting will be ignored.
+    specified mines are outside the bounds of the game board they will be skipped, while lines of any other form are
+    reported as an error. If a mines file is provided the "number of mines" portion of the difficulty setting will be
+    ignored.
+
+    The chunked option generates the mines of each 64x64 chunk of the board from the seed the first time the chunk is
+    played on, so only the explored part of the board is kept in memory. Each chunk holds the same share of the mines.
+
+    The record option appends every reveal and flag to a compact binary move log, along with the board they were made
+    on. The replay option plays back the games in a move log without drawing them and prints how each one ended. Add
+    the speed option to watch a game instead, picked with the game option and shown at the given multiple of its
+    original pace. The save and load options store and resume a game in a compact binary snapshot.
+
+    The no-guess option starts the game with an opening already revealed in the middle of the board, from which every
+    cell can be worked out without guessing. Making such a board can take a moment on large difficulties, so boards are
+    taken from a pool kept on disk when there are any. Use the fill-pool option to add boards to the pool for a
+    difficulty, spread across the processes given by the workers option. If the seed option is given the board is
+    generated from the seed instead.
+
+    The serve option hosts a separate game for every connection to the given address, using a simple line based
+    protocol, until it is interrupted. The host defaults to 127.0.0.1. The connect option plays a game on such a server
+    with the usual controls.
+
+    The batch option plays the given number of games with the AI as fast as possible and prints its win rate, the
+    average number of moves and guesses per game, and how many games were played per second. Use it with the seed
+    option to get reproducible results. The batch summary includes the time taken per move. Add the patterns option to
+    have the AI look up pairs of neighboring numbers in a table of precomputed deductions instead of comparing them, to
+    compare the time per move.
+
+    The analyze option generates the given number of random boards with NumPy and prints statistics on their 3BV, the
+    fewest clicks needed to clear a board, and on their openings, the areas that a single click reveals. It needs the
+    numpy extra, installed with "pip install terminal-mines[numpy]".
+
+    The profile option records how often the game's hot paths are called and how long they take, including latency
+    histograms for each keystroke and each move made by the AI, and prints a summary on exit. Setting the
+    TERMINAL_MINES_PROFILE environment variable to 1 does the same, while setting it to a file path also writes cProfile
+    stats to that file. Leaving it empty or setting it to 0 keeps profiling off.
     """
-    if mines_file:
-        mines = set(map(lambda line: line.strip(), mines_file))
+    if profile:
+        profiling.enable(profile_output)
+    else:
+        profiling.enable_from_env(os.environ)
+
+    if difficulty[1] > MAX_BOARD_SIDE or difficulty[2] > MAX_BOARD_SIDE:
+        if analyze:
+            # The analysis works on whole boards held in memory, whether or not the game itself would be chunked
+            raise click.BadParameter("boards larger than {0} by {0} cannot be analyzed".format(MAX_BOARD_SIDE), ctx,
+                                     param_hint="'--analyze'")
+        elif not chunked:
+            ctx.fail("boards larger than {0} by {0} need the --chunked option".format(MAX_BOARD_SIDE))
+
+    if chunked and (batch or mines_file or record_file or save_file or load_file):
+        ctx.fail("--chunked cannot be combined with --batch, a mines file, a move log or a snapshot")
+
+    if (no_guess or pool_size) and (chunked or batch or mines_file or load_file):
+        ctx.fail("--no-guess and --fill-pool cannot be combined with --chunked, --batch, a mines file or a snapshot")
+
+    if pool_size:
+        from .game_logic.no_guess import BoardPool, fill_pool
+
+        pool = BoardPool(*difficulty)
+
+        try:
+            fill_pool(pool, pool_size, seed, workers)
+        except ValueError as error:
+            ctx.fail("Cannot generate no-guess boards; {}".format(error))
+
+        click.echo("The pool for {} by {} boards with {} mines now holds {} boards".format(
+            pool.width, pool.height, pool.num_mines, len(pool)))
+        return
+
+    if (serve or connect) and (chunked or batch or mines_file or load_file or no_guess or record_file or save_file):
+        ctx.fail("--serve and --connect cannot be combined with --chunked, --batch, --no-guess, a mines file, a move "
+                 "log or a snapshot")
+
+    if serve:
+        from .game_logic.server import GameServer
+
+        click.echo("Hosting games of {} by {} boards with {} mines. Press Ctrl+C to stop.".format(
+            difficulty[1], difficulty[2], difficulty[0]))
+        GameServer(difficulty, seed).serve_forever(*serve, ready=lambda address: click.echo(
+            "Listening on {}:{}".format(*address[:2])))
+        return
+
+    if connect:
+        play_remote(ctx, connect, full_redraw)
+        return
+
+    if replay_file:
+        replay(ctx, replay_file, game, speed, full_redraw)
+        return
+
+    if analyze:
+        try:
+            from .game_logic.analytics import analyze_difficulty
+        except ImportError as error:
+            ctx.fail(str(error))
+
+        try:
+            click.echo(analyze_difficulty(analyze, difficulty, seed).format())
+        except MemoryError:
+            ctx.fail("Not enough memory to analyze boards of {} by {}".format(difficulty[1], difficulty[2]))
+        return
+
+    if batch:
+        if mines_file or save_file or load_file:
+            ctx.fail("--batch cannot be combined with a mines file or a snapshot")
+
+        from .game_logic.batch import run_batch
+
+        click.echo(run_batch(batch, difficulty, engine, seed, workers, record_file, patterns, beta).format())
+        return
+
+    if record_file or save_file or load_file:
+        from .game_logic.persistence import MoveLog, record_moves, save_snapshot, load_snapshot
+
+    if load_file:
+        try:
+            minefield = load_snapshot(load_file)
+        except ValueError as error:
+            ctx.fail("Snapshot is invalid; {}".format(error))
+    elif mines_file:
+        try:
+            mines = load_mines(mines_file, difficulty[1], difficulty[2])
+        except ValueError as error:
+            ctx.fail("Mines file is invalid; {}".format(error))
+
         minefield = Minefield(difficulty[1], difficulty[2], mines)
 
         if minefield.num_mines == 0:
             ctx.fail("Mines file did not contain any valid mines")
+    elif chunked:
+        from .game_logic.chunked import ChunkedMinefield
+
+        num_mines, width, height = difficulty
+        minefield = ChunkedMinefield(width, height, num_mines / (width * height) if width * height else 0, seed)
+    elif no_guess:
+        from .game_logic.no_guess import BoardPool, no_guess_minefield
+
+        board = None
+
+        if seed is None:
+            try:
+                board = BoardPool(*difficulty).take()
+            except (OSError, ValueError) as error:
+                click.echo("Ignoring the no-guess board pool; {}".format(error), err=True)
+
+        if board is None:
+            try:
+                board = no_guess_minefield(*difficulty, rng=Random(seed))
+            except ValueError as error:
+                ctx.fail("Cannot generate a no-guess board; {}".format(error))
+
+        minefield, first_click = board
     else:
-        minefield = random_minefield(*difficulty)
+        minefield = random_minefield(*difficulty, seed=seed)
 
     if beta:
         minefield.beta = beta
 
-    if solve:
-        solve_game(minefield)
+    if record_file:
+        log = MoveLog(record_file)
+        log.start_game(minefield)
+        record_moves(minefield, log)
+
+    if no_guess:
+        minefield.x, minefield.y = first_click
+        minefield.reveal_cell(*first_click)
+
+    try:
+        play(minefield, solve, engine, make_renderer(full_redraw), fps)
+    finally:
+        if save_file:
+            save_snapshot(minefield, save_file)
+
+
+def play(minefield, solve, engine, render, fps=DEFAULT_FPS):
+    """
+    Runs the game, either with the player at the keyboard or with the AI solving it.
+    """
+    if minefield.state != GameState.IN_PROGRESS:
+        # A saved game that had already ended
+        render(minefield)
+    elif solve:
+        minefield.journaling = False    # Nobody can undo the AI's moves
+        solve_game(minefield, engine, render)
     else:
         def handle_key(key):
-            if key == "w":
-                minefield.y = (minefield.y - 1) % minefield.height
-            elif key == "s":
-                minefield.y = (minefield.y + 1) % minefield.height
-            elif key == "a":
-                minefield.x = (minefield.x - 1) % minefield.width
-            elif key == "d":
-                minefield.x = (minefield.x + 1) % minefield.width
-            elif key == "e" or key == "'":
-                minefield.flag_cell(minefield.x, minefield.y)
+            changed = []
+
+            if key == "h":
+                hints.request()
+                return changed
+
+            hints.dismiss()
+
+            if key == "e" or key == "'":
+                changed = minefield.flag_cell(minefield.x, minefield.y)
             elif key == "\n" or key == " ":
-                minefield.reveal_cell(minefield.x, minefield.y)
+                changed = minefield.reveal_cell(minefield.x, minefield.y)
+            elif key == "u":
+                changed = minefield.undo()
+            elif key == "r":
+                changed = minefield.redo()
 
-            render(minefield)
+            if changed:
+                hints.board_changed()
 
             if minefield.state != GameState.IN_PROGRESS:
-                ctx.exit(0)
+                input_loop.stop()
+
+            return changed
+
+        def handle_move(dx, dy):
+            hints.dismiss()
+
+            # Held keys arrive as one move covering the whole burst
+            minefield.x = (minefield.x + dx) % minefield.width
+            minefield.y = (minefield.y + dy) % minefield.height
+            return []
 
+        # The first frame goes up before asyncio is loaded, which is most of the cost of starting the input loop
         render(minefield)
+
+        from .game_logic.async_input import AsyncInputLoop
+        from .game_logic.hints import HintEngine
+
+        hints = HintEngine(minefield)
+        input_loop = AsyncInputLoop(handle_key, handle_move, lambda changed: render(minefield, changed), fps)
+        input_loop.run(hints.run)
+
+
+def play_remote(ctx, address, full_redraw):
+    """
+    Plays a game hosted by a server. Every key is sent to the server and the cells it reports as changed are redrawn.
+    """
+    from .game_logic.async_input import MOVES
+    from .game_logic.client import RemoteGame
+    from .game_logic.keyboard_listener import input_loop
+
+    try:
+        game = RemoteGame(*address)
+    except (OSError, ValueError) as error:
+        ctx.fail("Cannot connect to {}:{}; {}".format(address[0], address[1], error))
+
+    board = game.board
+    render = make_renderer(full_redraw)
+
+    def handle_key(key):
+        changed = []
+
+        try:
+            if key in MOVES:
+                dx, dy = MOVES[key]
+                changed = game.command("move {} {}".format((board.x + dx) % board.width, (board.y + dy) % board.height))
+            elif key == "e" or key == "'":
+                changed = game.command("flag")
+            elif key == "\n" or key == " ":
+                changed = game.command("reveal")
+            elif key == "u":
+                changed = game.command("undo")
+            elif key == "r":
+                changed = game.command("redo")
+        except (OSError, ValueError) as error:
+            ctx.fail("Lost the game server; {}".format(error))
+
+        render(board, changed)
+
+        if board.state != GameState.IN_PROGRESS:
+            ctx.exit(0)
+
+    with game:
+        render(board)
         input_loop(handle_key)
+
+
+def replay(ctx, replay_file, game, speed, full_redraw):
+    """
+    Replays the games in a move log. Without a speed every game is replayed headlessly and its outcome printed.
+    """
+    from .game_logic.persistence import read_move_log, replay_game
+
+    try:
+        games = read_move_log(replay_file)
+    except ValueError as error:
+        ctx.fail("Move log is invalid; {}".format(error))
+
+    if game is not None and game >= len(games):
+        ctx.fail("the move log only holds {} games".format(len(games)))
+
+    if speed is not None:
+        replay_game(games[game or 0], make_renderer(full_redraw), speed)
+        return
+
+    outcomes = {state: 0 for state in GameState}
+
+    for index in range(len(games)) if game is None else [game]:
+        recorded = games[index]
+        minefield = replay_game(recorded)
+        outcomes[minefield.state] += 1
+
+        click.echo("Game {}: {}x{} with {} mines, {} moves, {}".format(
+            index, recorded.width, recorded.height, minefield.num_mines, len(recorded.moves),
+            minefield.state.name.lower().replace("_", " ")))
+
+    click.echo("Replayed {} games: {} won, {} lost, {} in progress".format(
+        sum(outcomes.values()), outcomes[GameState.WON], outcomes[GameState.LOST], outcomes[GameState.IN_PROGRESS]))
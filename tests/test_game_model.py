@@ -0,0 +1,47 @@
+"""
+Tests for the board model. Run from the repository root with: pytest tests
+"""
+
+import sys
+from io import StringIO
+
+import pytest
+
+from terminal_mines.game_logic.game_model import load_mines
+
+MINES_FILES = [
+    "0,0\n3,2\n",
+    "0,0\n\n  1, 1 \n3,2",
+    "-1,0\n4,0\n0,3\n2,1\n2,1\n",
+    "99999999999999999999,0\n1,1\n",
+]
+
+
+@pytest.fixture(params=["numpy", "pure"])
+def numpy_available(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        # Importing a module that maps to None raises ImportError
+        monkeypatch.setitem(sys.modules, "numpy", None)
+
+    return request.param
+
+
+@pytest.mark.parametrize("text", MINES_FILES)
+def test_load_mines(numpy_available, text):
+    expected = bytearray(4 * 3)
+    for line in text.split("\n"):
+        if line.strip():
+            x, y = map(int, line.split(","))
+            if 0 <= x < 4 and 0 <= y < 3:
+                expected[y * 4 + x] = 1
+
+    # A small chunk size splits lines across chunks
+    assert load_mines(StringIO(text), 4, 3, chunk_size=5) == expected
+
+
+@pytest.mark.parametrize("text, line_number", [("0,0\n1\n", 2), ("0,0\n1,1\n1-2,3\n", 3), ("a,b", 1)])
+def test_load_mines_reports_bad_lines(numpy_available, text, line_number):
+    with pytest.raises(ValueError, match="line {}:".format(line_number)):
+        load_mines(StringIO(text), 4, 3)
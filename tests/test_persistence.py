@@ -0,0 +1,58 @@
+"""
+Tests for snapshots and move logs. Run from the repository root with: pytest tests
+"""
+
+from terminal_mines.game_logic.game_model import Minefield, GameState, CellState, random_minefield
+from terminal_mines.game_logic.persistence import (MoveLog, record_moves, save_snapshot, load_snapshot, read_move_log,
+                                                   replay_game)
+
+
+def record(minefield, path, moves):
+    """
+    Records the given moves, each a (func name, x, y) tuple, made on minefield to a move log at path.
+
+    :return: The games read back from the log.
+    """
+    with open(str(path), "ab") as file:
+        log = MoveLog(file)
+        log.start_game(minefield)
+        record_moves(minefield, log)
+
+        for name, x, y in moves:
+            getattr(minefield, name)(x, y)
+
+    with open(str(path), "rb") as file:
+        return read_move_log(file)
+
+
+def test_resumed_game_replays_onto_the_loaded_board(tmp_path):
+    minefield = random_minefield(10, 8, 8, seed=3)
+    safe = [(x, y) for y in range(8) for x in range(8) if not minefield.get_cell(x, y).is_mine]
+    minefield.reveal_cell(*safe[0])
+    minefield.flag_cell(*next((x, y) for y in range(8) for x in range(8) if minefield.get_cell(x, y).is_mine))
+
+    with open(str(tmp_path / "save.bin"), "wb") as file:
+        save_snapshot(minefield, file)
+
+    with open(str(tmp_path / "save.bin"), "rb") as file:
+        resumed = load_snapshot(file)
+
+    moves = [("reveal_cell", x, y) for x, y in safe[-3:]]
+    games = record(resumed, tmp_path / "game.log", moves)
+    replayed = replay_game(games[0])
+
+    assert replayed.state_codes() == resumed.state_codes()
+    assert replayed.state == resumed.state
+
+
+def test_beta_game_replays_as_won(tmp_path):
+    minefield = Minefield(8, 8, [0, 9, 63])
+    minefield.beta = True
+
+    # Evaluated lazily so that cells opened by an earlier reveal are skipped
+    moves = (("reveal_cell", x, y) for y in range(8) for x in range(8)
+             if not minefield.get_cell(x, y).is_mine and minefield.get_state(x, y) == CellState.UNKNOWN)
+    games = record(minefield, tmp_path / "game.log", moves)
+
+    assert minefield.state == GameState.WON
+    assert replay_game(games[0]).state == GameState.WON
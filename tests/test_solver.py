@@ -0,0 +1,38 @@
+"""
+Tests for the solver engines. Run from the repository root with: pytest tests
+"""
+
+from random import Random
+
+from terminal_mines.game_logic.batch import run_batch
+from terminal_mines.game_logic.game_model import Minefield, GameState
+from terminal_mines.game_logic.no_guess import deduce
+from terminal_mines.game_logic.solver import solve_headless
+
+
+def enclosed_minefield():
+    """
+    :return: A 4x4 board with a 2x2 block of mines in the top left corner. The corner mine borders no number so once
+        the rest is revealed only the mine count says what it is.
+    """
+    return Minefield(4, 4, [0, 1, 4, 5])
+
+
+def test_probability_engine_flags_enclosed_mines():
+    minefield = enclosed_minefield()
+    minefield.reveal_cell(3, 3)
+
+    stats = solve_headless(minefield, "probability", Random(0))
+
+    assert stats.state == GameState.WON
+    assert stats.guesses == 0
+
+
+def test_deduction_solves_enclosed_mines():
+    assert deduce(enclosed_minefield(), 3, 3).state == GameState.WON
+
+
+def test_batch_ends_on_boards_without_mines():
+    for engine in ("scan", "frontier", "probability"):
+        assert run_batch(2, (0, 8, 8), engine, seed=0).wins == 0
+        assert run_batch(2, (0, 8, 8), engine, seed=0, beta=True).wins == 2